@@ -19,6 +19,11 @@ from werkzeug.security import generate_password_hash
 from db import db
 from dotenv import load_dotenv
 from utils import find_process_by_name
+from utils.warm_pool import start_warm_pool_builder
+from utils.commands import popen as popen_command
+from utils.activity_archive import start_retention_job
+from utils.dependency_cache import start_prune_job
+from utils.db_budget import database_uri, dispose_after_fork, engine_options, watch_connection_holds
 from routes.nginx import nginx_routes
 from decorators import auth_check, has_permission
 from routes.git import git_routes
@@ -29,18 +34,11 @@ load_dotenv()
 
 app = Flask(__name__)
 app.config["TEMPLATES_AUTO_RELOAD"] = True
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI')
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(os.getenv('DATABASE_URI'))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-# Database connection pool optimization for high concurrency
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_size': 20,              # Connection pool size (increased for 32 workers)
-    'max_overflow': 40,            # Additional connections when pool is exhausted
-    'pool_timeout': 30,            # Seconds to wait for connection from pool
-    'pool_recycle': 3600,          # Recycle connections after 1 hour
-    'pool_pre_ping': True,         # Verify connections before using them
-    'echo_pool': False,            # Disable pool logging in production
-}
+# Pools are sized so all workers together stay within MariaDB's max_connections
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(os.getenv('DATABASE_URI'))
 
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB
 app.secret_key = os.getenv('SECRET_KEY')
@@ -61,6 +59,10 @@ ENVIRONMENT = os.getenv("ENVIRONMENT")
 db.init_app(app)
 migrate = Migrate(app, db)
 
+with app.app_context():
+    dispose_after_fork(db.engine)
+    watch_connection_holds(db.engine)
+
 
 # Custom Jinja2 filters
 @app.template_filter('timestamp_to_date')
@@ -99,6 +101,47 @@ def create_admin_user():
         print("Admin user created successfully!")
 
 
+@app.cli.command("check-query-plans")
+def check_query_plans_command():
+    """Verify that the hot queries use their indexes (see utils/query_plans.py)."""
+    from utils.query_plans import check_query_plans
+
+    results = check_query_plans()
+    for result in results:
+        mark = "ok" if result["ok"] else "MISSING INDEX"
+        detail = result.get("error") or f"key={result['key']} type={result['type']} rows={result['rows']}"
+        print(f"[{mark}] {result['query']}: expects {result['index']} ({detail})")
+    if not all(result["ok"] for result in results):
+        sys.exit(1)
+
+
+@app.cli.command("activity-retention")
+def activity_retention_command():
+    """Add upcoming activity_logs partitions and archive expired ones (see utils/activity_archive.py)."""
+    from utils.activity_archive import run_retention
+
+    result = run_retention()
+    if not result["success"]:
+        print(f"[activity-retention] {result['error']}")
+        sys.exit(1)
+    print(f"[activity-retention] Added: {', '.join(result['added']) or 'none'}")
+    for name in result["dropped"]:
+        rows = result["archived"].get(name)
+        print(f"[activity-retention] Dropped {name}" + (f" ({rows} rows archived)" if rows is not None else ""))
+
+
+@app.cli.command("prune-dependency-caches")
+def prune_dependency_caches_command():
+    """Prune the shared dependency caches down to DEPENDENCY_CACHE_MAX_SIZE_MB (see utils/dependency_cache.py)."""
+    from utils.dependency_cache import prune_caches
+
+    result = prune_caches()
+    print(
+        f"[dependency-cache] Removed {result['removed']} entries ({result['freed_bytes'] // (1024 * 1024)} MB), "
+        f"{result['total_bytes'] // (1024 * 1024)} MB left"
+    )
+
+
 processed_events = {}
 processed_events_lock = threading.Lock()
 EVENT_EXPIRATION_TIME = 30
@@ -133,13 +176,20 @@ def handle_event(event):
 
 def start_listening_for_events():
     while True:
-        result = subprocess.run(["docker", "events", "--format", "{{json .}}"], capture_output=True, text=True, check=False)
-        for line in result.stdout.splitlines():
-            try:
-                event = json.loads(line)
-                handle_event(event)
-            except json.JSONDecodeError:
-                continue
+        try:
+            events = popen_command(["docker", "events", "--format", "{{json .}}"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        except Exception as e:
+            print(f"[events] Failed to follow docker events: {e}")
+            time.sleep(5)
+            continue
+        if events.stdout is not None:
+            for line in iter(events.stdout.readline, ""):
+                try:
+                    event = json.loads(line)
+                    handle_event(event)
+                except json.JSONDecodeError:
+                    continue
+        events.wait()
         time.sleep(1)
 
                     
@@ -181,9 +231,13 @@ if ENVIRONMENT == "production":
 
 
 with app.app_context():
+    # Tables first: the retention job checks how activity_logs was created
+    db.create_all()
     if ENVIRONMENT == "production" and first_worker:
         run_event_listener()
-    db.create_all()
+        start_warm_pool_builder()
+        start_retention_job(app)
+        start_prune_job()
     create_admin_user()
 
 BASE_DIR = os.path.dirname(__file__)
@@ -1,8 +1,7 @@
 import functools
+from typing import Optional
 from flask import session, redirect, request
-from models.process import Process
-from models.subuser import SubUser
-from models.user import User
+from utils.permissions import Permission, get_permission_resolver
 
 
 def auth_check():
@@ -30,16 +29,15 @@ def admin_required():
     return decorator
 
 
-def owner_or_subuser_required():
+def owner_or_subuser_required(permission: Optional[Permission] = None):
     def decorator(func):
         @functools.wraps(func)
         def decorated_auth_check(*args, **kwargs):
             if session.get("role") == "admin":
                 return func(*args, **kwargs)
 
-            user_id = session.get('user_id')
-            user = User.query.get(user_id)
-            if not user_id or not user:
+            resolver = get_permission_resolver()
+            if not resolver or not resolver.exists:
                 session.clear()
                 return redirect(f'/auth/login?redirect={request.path}')
             
@@ -47,17 +45,9 @@ def owner_or_subuser_required():
             if not process_name:
                 return redirect('/')
 
-            is_owner = Process.query.filter_by(name=process_name, owner_id=user_id).first()
-            if is_owner:
+            if resolver.has_permission(process_name, permission):
                 return func(*args, **kwargs)
 
-            subuser = SubUser.query.filter_by(email=user.email, process=process_name).first()
-            if subuser:
-                permissions = subuser.permissions or []
-                for permission in permissions:
-                    if permission in func.__name__:
-                        return func(*args, **kwargs)
-
             return redirect('/')
 
         return decorated_auth_check
@@ -71,13 +61,8 @@ def owner_required():
             if session.get("role") == "admin":
                 return func(*args, **kwargs)
 
-            user_id = session.get('user_id')
-            if not user_id:
-                session.clear()
-                return redirect(f'/auth/login?redirect={request.path}')
-
-            user = User.query.get(user_id)
-            if not user:
+            resolver = get_permission_resolver()
+            if not resolver or not resolver.exists:
                 session.clear()
                 return redirect(f'/auth/login?redirect={request.path}')
             
@@ -85,8 +70,7 @@ def owner_required():
             if not process_name:
                 return redirect('/')
 
-            is_owner = Process.query.filter_by(name=process_name, owner_id=user_id).first()
-            if not is_owner:
+            if not resolver.is_owner(process_name):
                 return redirect('/')
 
             return func(*args, **kwargs)
@@ -99,20 +83,8 @@ def has_permission(name: str, permission: str) -> bool:
     if session.get("role") == "admin":
         return True
 
-    user_id = session.get('user_id')
-    if not user_id:
-        return False
-
-    user = User.query.get(user_id)
-    if not user:
-        return False
-
-    is_owner = Process.query.filter_by(name=name, owner_id=user_id).first()
-    if is_owner:
-        return True
-
-    subuser = SubUser.query.filter_by(email=user.email).first()
-    if not subuser or not subuser.permissions:
+    resolver = get_permission_resolver()
+    if not resolver or not resolver.exists:
         return False
 
-    return permission in subuser.permissions
+    return resolver.has_permission(name, permission)
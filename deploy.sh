@@ -84,6 +84,7 @@ log_info "Running database migrations..."
 export FLASK_APP=app.py
 flask db upgrade 2>/dev/null || log_warning "No new migrations to apply"
 log_success "Database migrations completed"
+flask check-query-plans || log_warning "Some hot queries are not using their indexes"
 
 # Step 5: Clear old compiled Python files
 log_info "Cleaning up Python cache..."
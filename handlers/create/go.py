@@ -1,37 +1,48 @@
 from classes.result import Result
+from utils.dependency_cache import compose_cache_environment, compose_cache_volumes
+from utils.dockerfiles import write_dockerfile
+from utils.supervisor import install_supervisor
+from utils.warm_pool import compose_image_source
 import json
+import os
 
 def create_docker_file(process, dockerfile_path):
     try:
-        dockerfile_content = f"""FROM golang:latest
-WORKDIR /app
-COPY . /app
-RUN go mod init {process.name}
-RUN go mod tidy
-CMD ["sh", "-c", "$COMMAND"]
-"""
-        with open(dockerfile_path, "w") as f:
-            f.write(dockerfile_content)
+        go_mod_path = os.path.join(os.path.dirname(dockerfile_path), 'go.mod')
+        if not os.path.exists(go_mod_path):
+            with open(go_mod_path, "w") as f:
+                f.write(f"module {process.name}\n\ngo 1.22\n")
+
+        write_dockerfile("go", dockerfile_path)
         return Result(success=True, message="Dockerfile created successfully")
     except Exception as e:
         return Result(success=False, message=str(e))
 
 def create_docker_compose_file(process, compose_file_path):
     try:
+        install_supervisor(os.path.dirname(compose_file_path))
+
+        image_source, prepare_env = compose_image_source("go")
+
         with open(compose_file_path, 'w') as f:
             f.write(f"""services:
     {process.name}:
-        build:
-            context: .
-            dockerfile: Dockerfile
+{image_source}
         volumes:
             - .:/app
-        # Always keep container running - process will be controlled via docker exec
-        command: ["tail", "-f", "/dev/null"]
+            - ./.supervisor:/run/supervisor
+{compose_cache_volumes("go")}
+        # The supervisor keeps the container running and owns the main process
+        init: true
+        command: ["sh", "/run/supervisor/supervisor.sh"]
         ports:
             - "{8000 + process.port_id}:{8000 + process.port_id}"
         environment:
             - MAIN_COMMAND={json.dumps(process.command)}
+            - SM_NAME={process.name}
+            - SM_WORKDIR=/app
+{compose_cache_environment("go")}
+{prepare_env}
         restart: unless-stopped
         stdin_open: true
         tty: true
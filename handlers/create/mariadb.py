@@ -1,5 +1,7 @@
 from classes.result import Result
+from utils.supervisor import install_supervisor
 import json
+import os
 
 def create_docker_file(_process, dockerfile_path):
     try:
@@ -21,6 +23,8 @@ EXPOSE 3306
 
 def create_docker_compose_file(process, compose_file_path):
     try:
+        install_supervisor(os.path.dirname(compose_file_path))
+
         with open(compose_file_path, 'w') as f:
             f.write(f"""services:
     {process.name}:
@@ -29,12 +33,16 @@ def create_docker_compose_file(process, compose_file_path):
             dockerfile: Dockerfile
         volumes:
             - .:/app
-        # Always keep container running - process will be controlled via docker exec
-        command: [\"tail\", \"-f\", \"/dev/null\"]
+            - ./.supervisor:/run/supervisor
+        # The supervisor keeps the container running and owns the main process
+        init: true
+        command: ["sh", "/run/supervisor/supervisor.sh"]
         ports:
             - "{8000 + process.port_id}:3306"
         environment:
             - MAIN_COMMAND={json.dumps(process.command)}
+            - SM_NAME={process.name}
+            - SM_WORKDIR=/app
         restart: unless-stopped
         stdin_open: true
         tty: true
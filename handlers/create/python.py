@@ -1,4 +1,8 @@
 from classes.result import Result
+from utils.dependency_cache import compose_cache_environment, compose_cache_volumes
+from utils.dockerfiles import write_dockerfile
+from utils.supervisor import install_supervisor
+from utils.warm_pool import compose_image_source
 import json
 import os
 
@@ -15,14 +19,7 @@ def create_docker_file(process, dockerfile_path):
             for dep in dependencies:
                 f.write(f"{dep}\n")
 
-        dockerfile_content = """FROM python:3.13
-WORKDIR /app
-COPY . /app
-RUN pip install -r requirements.txt
-CMD ["sh", "-c", "python -u $MAIN_COMMAND"]
-"""
-        with open(dockerfile_path, "w") as f:
-            f.write(dockerfile_content)
+        write_dockerfile("python", dockerfile_path)
         return Result(success=True, message="Dockerfile created successfully")
     except Exception as e:
         return Result(success=False, message=str(e))
@@ -30,20 +27,29 @@ CMD ["sh", "-c", "python -u $MAIN_COMMAND"]
 
 def create_docker_compose_file(process, compose_file_path):
     try:
+        install_supervisor(os.path.dirname(compose_file_path))
+
+        image_source, prepare_env = compose_image_source("python")
+
         with open(compose_file_path, 'w') as f:
             f.write(f"""services:
     {process.name}:
-        build:
-            context: .
-            dockerfile: Dockerfile
+{image_source}
         volumes:
             - .:/app
-        # Always keep container running - process will be controlled via docker exec
-        command: ["tail", "-f", "/dev/null"]
+            - ./.supervisor:/run/supervisor
+{compose_cache_volumes("pip")}
+        # The supervisor keeps the container running and owns the main process
+        init: true
+        command: ["sh", "/run/supervisor/supervisor.sh"]
         ports:
             - "{8000 + process.port_id}:{8000 + process.port_id}"
         environment:
             - MAIN_COMMAND={json.dumps(process.command)}
+            - SM_NAME={process.name}
+            - SM_WORKDIR=/app
+{compose_cache_environment("pip")}
+{prepare_env}
         restart: unless-stopped
         stdin_open: true
         tty: true
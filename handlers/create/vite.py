@@ -1,47 +1,12 @@
 from classes.result import Result
+from utils.dependency_cache import compose_cache_environment, compose_cache_volumes
+from utils.dockerfiles import write_dockerfile
 import json
 
 
 def create_docker_file(_process, dockerfile_path):
     try:
-        dockerfile_content = """# Stage 1: Build the Vite project
-FROM node:18 AS build
-
-WORKDIR /app
-
-COPY package.json ./ 
-RUN npm install
-
-COPY . . 
-RUN npm run build
-
-# Stage 2: Serve using Apache
-FROM httpd:alpine
-
-RUN apk add --no-cache apache2-utils
-
-# Copy the build output to the Apache document root
-COPY --from=build /app/dist/ /usr/local/apache2/htdocs/
-
-# Copy .htaccess files
-COPY .htaccess /usr/local/apache2/htdocs/
-
-# Enable Apache mod_rewrite
-RUN echo "LoadModule rewrite_module modules/mod_rewrite.so" >> /usr/local/apache2/conf/httpd.conf
-
-# Configure Apache to allow .htaccess overrides and grant access
-RUN echo "<Directory /usr/local/apache2/htdocs>" >> /usr/local/apache2/conf/httpd.conf && \
-    echo "  AllowOverride All" >> /usr/local/apache2/conf/httpd.conf && \
-    echo "  Require all granted" >> /usr/local/apache2/conf/httpd.conf && \
-    echo "</Directory>" >> /usr/local/apache2/conf/httpd.conf
-
-# Set the server name to localhost
-RUN echo "ServerName localhost" >> /usr/local/apache2/conf/httpd.conf
-
-EXPOSE 80
-"""
-        with open(dockerfile_path, "w") as f:
-            f.write(dockerfile_content)
+        write_dockerfile("vite", dockerfile_path)
 
         return Result(success=True, message="Dockerfile for Vite created successfully")
     
@@ -65,11 +30,14 @@ def create_docker_compose_file(process, compose_file_path):
             - NODE_ENV=production
 
     build-vite:
-        image: node:18
+        image: node:lts-slim
         working_dir: /app
         command: ["tail", "-f", "/dev/null"]
         volumes:
             - .:/var/www/html
+{compose_cache_volumes("npm")}
+        environment:
+{compose_cache_environment("npm")}
         depends_on:
             - {process.name}
         restart: unless-stopped
@@ -0,0 +1,46 @@
+"""add activity_rollups with daily counts per action, user and target
+
+Revision ID: add_activity_rollups
+Revises: partition_activity_logs
+Create Date: 2026-10-19
+
+Backfilled from the rows currently in activity_logs; kept up to date by the
+activity log writer from then on.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_activity_rollups'
+down_revision = 'partition_activity_logs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() at startup already creates the table on fresh databases
+    if 'activity_rollups' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'activity_rollups',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('action', sa.String(length=100), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=100), nullable=False),
+            sa.Column('target', sa.String(length=255), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.UniqueConstraint('day', 'action', 'user_id', 'target', name='uq_activity_rollups_key'),
+        )
+        op.create_index('ix_activity_rollups_user_id_day', 'activity_rollups', ['user_id', 'day'])
+        op.create_index('ix_activity_rollups_action', 'activity_rollups', ['action'])
+
+    op.execute("DELETE FROM activity_rollups")
+    op.execute(
+        "INSERT INTO activity_rollups (day, action, user_id, username, target, count) "
+        "SELECT DATE(timestamp), action, user_id, MAX(username), COALESCE(target, ''), COUNT(*) "
+        "FROM activity_logs GROUP BY DATE(timestamp), action, user_id, COALESCE(target, '')"
+    )
+
+
+def downgrade():
+    op.drop_table('activity_rollups')
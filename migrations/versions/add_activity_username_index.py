@@ -0,0 +1,32 @@
+"""add username prefix index to activity_logs
+
+Revision ID: add_activity_username_index
+Revises: add_hot_path_indexes
+Create Date: 2026-10-19
+
+Serves the username prefix filter of the activity log API, newest first.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_activity_username_index'
+down_revision = 'add_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+INDEX = 'ix_activity_logs_username_timestamp'
+
+
+def _exists():
+    return INDEX in {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('activity_logs')}
+
+
+def upgrade():
+    if not _exists():
+        op.create_index(INDEX, 'activity_logs', ['username', 'timestamp'])
+
+
+def downgrade():
+    if _exists():
+        op.drop_index(INDEX, table_name='activity_logs')
@@ -0,0 +1,49 @@
+"""add indexes for hot query paths
+
+Revision ID: add_hot_path_indexes
+Revises: add_cloudflare_settings
+Create Date: 2026-10-19
+
+Verify with: flask check-query-plans
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_hot_path_indexes'
+down_revision = 'add_cloudflare_settings'
+branch_labels = None
+depends_on = None
+
+# (table, index name, columns); kept in sync with the models' __table_args__
+INDEXES = [
+    # Permission resolver and visibility query: grants of a user, sub-users of a process
+    ('sub_users', 'ix_sub_users_email_process', ['email', 'process']),
+    ('sub_users', 'ix_sub_users_process', ['process']),
+    # Owned process names (covering), domain uniqueness check
+    ('processes', 'ix_processes_owner_id_name', ['owner_id', 'name']),
+    ('processes', 'ix_processes_domain', ['domain']),
+    # Activity log listing: newest first, per user or per action
+    ('activity_logs', 'ix_activity_logs_timestamp', ['timestamp']),
+    ('activity_logs', 'ix_activity_logs_user_id_timestamp', ['user_id', 'timestamp']),
+    ('activity_logs', 'ix_activity_logs_action_timestamp', ['action', 'timestamp']),
+    ('git_integrations', 'ix_git_integrations_process_name', ['process_name']),
+    ('users', 'ix_users_reset_token', ['reset_token']),
+]
+
+
+def _existing_indexes(table):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    # db.create_all() at startup already creates these on fresh databases
+    for table, name, columns in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for table, name, columns in reversed(INDEXES):
+        if name in _existing_indexes(table):
+            op.drop_index(name, table_name=table)
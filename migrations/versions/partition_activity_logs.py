@@ -0,0 +1,75 @@
+"""partition activity_logs by month
+
+Revision ID: partition_activity_logs
+Revises: add_activity_username_index
+Create Date: 2026-10-19
+
+MariaDB requires the partitioning column in every unique key and does not
+allow foreign keys on partitioned tables, so the primary key becomes
+(id, timestamp) and the user_id foreign key is dropped (the ORM relationship
+declares the join itself). Future partitions are added and old ones archived
+by utils/activity_archive.py.
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'partition_activity_logs'
+down_revision = 'add_activity_username_index'
+branch_labels = None
+depends_on = None
+
+# Months of empty partitions created ahead of the current one
+MONTHS_AHEAD = 2
+
+
+def _next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def _partition_clause(first, last):
+    partitions = []
+    month = date(first.year, first.month, 1)
+    while month <= last:
+        upper = _next_month(month)
+        partitions.append(f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{upper:%Y-%m-%d}')")
+        month = upper
+    partitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    return ",\n    ".join(partitions)
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    # Tables created by db.create_all() are partitioned already (models/activity_log.py)
+    partitioned = bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.PARTITIONS WHERE TABLE_SCHEMA = DATABASE() "
+        "AND TABLE_NAME = 'activity_logs' AND PARTITION_NAME IS NOT NULL"
+    )).scalar()
+    if partitioned:
+        return
+
+    for foreign_key in sa.inspect(bind).get_foreign_keys('activity_logs'):
+        if foreign_key['constrained_columns'] == ['user_id']:
+            op.drop_constraint(foreign_key['name'], 'activity_logs', type_='foreignkey')
+
+    op.execute("ALTER TABLE activity_logs DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)")
+
+    oldest = bind.execute(sa.text("SELECT MIN(timestamp) FROM activity_logs")).scalar()
+    today = date.today()
+    last = today
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+    op.execute(
+        "ALTER TABLE activity_logs PARTITION BY RANGE COLUMNS(timestamp) (\n    "
+        + _partition_clause(oldest.date() if oldest else today, last)
+        + "\n)"
+    )
+
+
+def downgrade():
+    op.execute("ALTER TABLE activity_logs REMOVE PARTITIONING")
+    op.execute("ALTER TABLE activity_logs DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+    op.create_foreign_key('activity_logs_ibfk_1', 'activity_logs', 'users', ['user_id'], ['id'])
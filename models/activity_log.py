@@ -1,12 +1,20 @@
 from db import db
 from datetime import datetime
+from sqlalchemy import event
 
 
 class ActivityLog(db.Model):
     __tablename__ = 'activity_logs'
+    __table_args__ = (
+        db.Index('ix_activity_logs_timestamp', 'timestamp'),
+        db.Index('ix_activity_logs_user_id_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_activity_logs_action_timestamp', 'action', 'timestamp'),
+        db.Index('ix_activity_logs_username_timestamp', 'username', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # No foreign key: partitioned tables can't have one (see migrations/versions/partition_activity_logs.py)
+    user_id = db.Column(db.Integer, nullable=False)
     username = db.Column(db.String(100), nullable=False)
     action = db.Column(db.String(100), nullable=False)  # e.g., "started_process", "deleted_file", "updated_settings"
     target = db.Column(db.String(255))  # e.g., process name, file name
@@ -16,7 +24,7 @@ class ActivityLog(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
     # Relationship
-    user = db.Relationship('User', backref='activity_logs')
+    user = db.Relationship('User', primaryjoin='foreign(ActivityLog.user_id) == User.id', backref='activity_logs')
     
     def to_dict(self):
         return {
@@ -32,7 +40,15 @@ class ActivityLog(db.Model):
     
     @staticmethod
     def log_activity(user_id, username, action, target=None, details=None, request_obj=None):
-        """Helper method to log an activity"""
+        """
+        Helper method to log an activity.
+
+        The entry is queued and written in a batch by the background writer
+        (utils/activity_writer.py), so the request never waits on the insert.
+        """
+        from flask import current_app
+        from utils.activity_writer import activity_writer
+
         ip_address = None
         user_agent = None
         
@@ -40,16 +56,24 @@ class ActivityLog(db.Model):
             ip_address = request_obj.remote_addr
             user_agent = request_obj.headers.get('User-Agent', '')[:255]
         
-        activity = ActivityLog(
-            user_id=user_id,
-            username=username,
-            action=action,
-            target=target,
-            details=details,
-            ip_address=ip_address,
-            user_agent=user_agent
-        )
-        
-        db.session.add(activity)
-        db.session.commit()
-        return activity
+        entry = {
+            'user_id': user_id,
+            'username': username,
+            'action': action,
+            'target': target,
+            'details': details,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'timestamp': datetime.utcnow().isoformat(),
+        }
+
+        activity_writer.enqueue(entry, current_app._get_current_object())
+        return entry
+
+
+@event.listens_for(ActivityLog.__table__, "after_create")
+def partition_created_table(target, connection, **kw):
+    """db.create_all() on a fresh database: partition the table like the migrations do."""
+    if connection.dialect.name in ("mysql", "mariadb"):
+        from utils.activity_archive import partition_new_table
+        partition_new_table(connection)
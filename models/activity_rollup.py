@@ -0,0 +1,36 @@
+from db import db
+
+
+class ActivityRollup(db.Model):
+    """
+    Daily activity counts per (day, action, user, target).
+
+    Maintained by the activity log writer in the same transaction as the
+    inserted rows (utils/activity_writer.py), so filters and charts never
+    need to scan activity_logs. Rollups are kept when old activity_logs
+    partitions are archived.
+    """
+    __tablename__ = 'activity_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'action', 'user_id', 'target', name='uq_activity_rollups_key'),
+        db.Index('ix_activity_rollups_user_id_day', 'user_id', 'day'),
+        db.Index('ix_activity_rollups_action', 'action'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    action = db.Column(db.String(100), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    username = db.Column(db.String(100), nullable=False)
+    target = db.Column(db.String(255), nullable=False, default='')  # '' when the entry has no target
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat(),
+            'action': self.action,
+            'user_id': self.user_id,
+            'username': self.username,
+            'target': self.target or None,
+            'count': self.count
+        }
@@ -5,6 +5,9 @@ import tempfile
 
 class GitIntegration(db.Model):
     __tablename__ = 'git_integrations'
+    __table_args__ = (
+        db.Index('ix_git_integrations_process_name', 'process_name'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     repository_url = db.Column(db.String(255), nullable=False)
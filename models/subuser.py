@@ -4,6 +4,10 @@ from models.base_model import BaseModel
 
 class SubUser(BaseModel):
     __tablename__ = 'sub_users'
+    __table_args__ = (
+        db.Index('ix_sub_users_email_process', 'email', 'process'),
+        db.Index('ix_sub_users_process', 'process'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     email = db.Column(db.String(50), db.ForeignKey('users.email'), primary_key=True)
@@ -5,6 +5,9 @@ from typing import Optional
 
 class User(BaseModel):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_reset_token', 'reset_token'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     username = db.Column(db.String(100), nullable=False, unique=True)
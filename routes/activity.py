@@ -1,9 +1,17 @@
-from flask import Blueprint, render_template, jsonify, request, session
+import base64
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, render_template, jsonify, request, session
 from models.activity_log import ActivityLog
-from models.user import User
+from models.activity_rollup import ActivityRollup
 from decorators import owner_or_subuser_required
-from sqlalchemy import desc
+from sqlalchemy import and_, desc, func, or_, text
 from db import db
+from utils.cache import TieredCache, typed_key
+from utils.db_budget import background_engine
 
 activity_routes = Blueprint('activity', __name__, url_prefix='/activity')
 
@@ -15,17 +23,42 @@ def activity_log():
     return render_template('activity/index.html', page_title="Activity Log")
 
 
-@activity_routes.route('/api/logs', methods=['GET'])
-@owner_or_subuser_required()
-def get_activity_logs():
-    """API endpoint to fetch activity logs"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 50, type=int)
-    action_filter = request.args.get('action', None)
-    user_filter = request.args.get('user', None)
-    
+# Filtered totals are counted up to this many rows and cached
+COUNT_LIMIT = 10000
+COUNT_CACHE_TIMEOUT = 60
+count_cache = TieredCache('activity_count', ttl=COUNT_CACHE_TIMEOUT)
+MAX_PER_PAGE = 200
+
+
+def _encode_cursor(log):
+    raw = f"{log.timestamp.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    """(timestamp, id) of a cursor, or None when it is malformed."""
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _starts_with(column, prefix):
+    """LIKE 'prefix%' with the wildcards in prefix escaped."""
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return column.like(f'{escaped}%', escape='\\')
+
+
+def _filtered_query(action_filter, user_filter):
+    """
+    Activity logs matching the filters and visible to the current user.
+
+    Returns:
+        (query, filters) where filters is a tuple of the applied filters,
+        None when unfiltered
+    """
     user_id = session.get('user_id')
-    user = User.query.get(user_id)
     
     # Build query
     query = ActivityLog.query
@@ -35,36 +68,295 @@ def get_activity_logs():
         query = query.filter(ActivityLog.action == action_filter)
     
     if user_filter:
-        query = query.filter(ActivityLog.username.ilike(f'%{user_filter}%'))
+        # Prefix match so the username index can be used
+        query = query.filter(_starts_with(ActivityLog.username, user_filter))
     
     # Non-admin users can only see their own logs
-    if user.role != 'admin':
+    if session.get('role') != 'admin':
         query = query.filter(ActivityLog.user_id == user_id)
+
+    filters = None
+    if action_filter or user_filter or session.get('role') != 'admin':
+        filters = (None if session.get('role') == 'admin' else user_id, action_filter, user_filter)
+    return query, filters
+
+
+def _approximate_total(query, filters):
+    """
+    Total for the page footer without a full COUNT(*).
+
+    Unfiltered listings use the table statistics; filtered ones count up to
+    COUNT_LIMIT matching rows and cache the result briefly.
+
+    Args:
+        query: Filtered query
+        filters: Tuple of the applied filters, None when unfiltered
+
+    Returns:
+        (total, approximate)
+    """
+    if filters is None:
+        row = db.session.execute(text(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'activity_logs'"
+        )).first()
+        if row and row[0] is not None:
+            return int(row[0]), True
+
+    def count():
+        capped = query.order_by(None).with_entities(ActivityLog.id).limit(COUNT_LIMIT + 1).subquery()
+        return db.session.query(func.count()).select_from(capped).scalar()
+
+    # filters is None for the unfiltered listing when the table statistics are missing
+    total = count_cache.get_or_compute(typed_key(filters), count)
+    return min(total, COUNT_LIMIT), total > COUNT_LIMIT
+
+
+@activity_routes.route('/api/logs', methods=['GET'])
+@owner_or_subuser_required()
+def get_activity_logs():
+    """
+    API endpoint to fetch activity logs, newest first.
+
+    Uses keyset pagination on (timestamp, id): pass the returned next_cursor
+    as `cursor` to get the following page. `user` filters on a username
+    prefix. The total is approximate (see _approximate_total).
+    """
+    per_page = max(1, min(request.args.get('per_page', 50, type=int), MAX_PER_PAGE))
+    cursor = request.args.get('cursor')
+    action_filter = request.args.get('action', None)
+    user_filter = request.args.get('user', None)
+    
+    query, filters = _filtered_query(action_filter, user_filter)
+    total, approximate = _approximate_total(query, filters)
+
+    if cursor:
+        position = _decode_cursor(cursor)
+        if position is None:
+            return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+        timestamp, log_id = position
+        query = query.filter(or_(
+            ActivityLog.timestamp < timestamp,
+            and_(ActivityLog.timestamp == timestamp, ActivityLog.id < log_id),
+        ))
     
     # Order by most recent first
-    query = query.order_by(desc(ActivityLog.timestamp))
+    query = query.order_by(desc(ActivityLog.timestamp), desc(ActivityLog.id))
     
-    # Paginate
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # One extra row tells whether there is a next page
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
     
-    logs = [log.to_dict() for log in pagination.items]
+    logs = [log.to_dict() for log in rows]
     
     return jsonify({
         'success': True,
         'logs': logs,
-        'total': pagination.total,
-        'page': page,
-        'pages': pagination.pages,
+        'next_cursor': _encode_cursor(rows[-1]) if has_more else None,
+        'has_more': has_more,
+        'total': total,
+        'total_approximate': approximate,
         'per_page': per_page
     })
 
 
+# Rows fetched from the server-side cursor at a time, and bytes buffered
+# before a chunk is compressed and sent
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+EXPORT_COLUMNS = ('id', 'timestamp', 'user_id', 'username', 'action', 'target', 'details', 'ip_address')
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def _export_rows(engine, statement, export_format, compress):
+    """
+    Encode the rows of statement as CSV or JSON lines, in chunks.
+
+    Runs on its own connection with a server-side cursor, so only
+    EXPORT_BATCH_SIZE rows are in memory at a time and the request's
+    session is not held while the response is being sent.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # 31: gzip container
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == 'csv':
+        writer.writerow(EXPORT_COLUMNS)
+
+    def flush():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    from utils.db_budget import mark_long_lived
+
+    with engine.connect() as connection:
+        mark_long_lived(connection)
+        result = connection.execution_options(yield_per=EXPORT_BATCH_SIZE).execute(statement)
+        for row in result.mappings():
+            entry = {column: row[column] for column in EXPORT_COLUMNS}
+            entry['timestamp'] = entry['timestamp'].isoformat()
+            if export_format == 'csv':
+                writer.writerow(entry.values())
+            else:
+                buffer.write(json.dumps(entry) + '\n')
+            if buffer.tell() >= EXPORT_CHUNK_SIZE:
+                chunk = flush()
+                if chunk:
+                    yield chunk
+
+    chunk = flush()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+
+@activity_routes.route('/api/export', methods=['GET'])
+@owner_or_subuser_required()
+def export_activity_logs():
+    """
+    Download the matching activity logs as CSV or JSON lines, newest first.
+
+    `format` is csv (default) or jsonl, `compress=0` turns off gzip, and
+    `action`, `user`, `start` and `end` (YYYY-MM-DD, end inclusive) filter
+    the rows. The response is streamed, so exports of any size use constant
+    memory.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_MIMETYPES:
+        return jsonify({'success': False, 'error': 'format must be csv or jsonl'}), 400
+    compress = request.args.get('compress', '1') != '0'
+
+    query, _ = _filtered_query(request.args.get('action'), request.args.get('user'))
+    try:
+        if request.args.get('start'):
+            query = query.filter(ActivityLog.timestamp >= datetime.strptime(request.args['start'], '%Y-%m-%d'))
+        if request.args.get('end'):
+            end = datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1)
+            query = query.filter(ActivityLog.timestamp < end)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'start and end must be dates (YYYY-MM-DD)'}), 400
+
+    statement = query.with_entities(*(getattr(ActivityLog, column) for column in EXPORT_COLUMNS)) \
+        .order_by(desc(ActivityLog.timestamp), desc(ActivityLog.id)).statement
+
+    filename = f"activity-{datetime.utcnow():%Y%m%d-%H%M%S}.{export_format}"
+    if compress:
+        filename += '.gz'
+    return Response(
+        _export_rows(background_engine(), statement, export_format, compress),
+        mimetype='application/gzip' if compress else EXPORT_MIMETYPES[export_format],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Accel-Buffering': 'no'  # for Nginx
+        }
+    )
+
+
 @activity_routes.route('/api/actions', methods=['GET'])
 @owner_or_subuser_required()
 def get_available_actions():
-    """Get list of all available action types for filtering"""
-    actions = db.session.query(ActivityLog.action).distinct().all()
+    """Get list of all available action types for filtering (from the rollups)"""
+    query = db.session.query(ActivityRollup.action).distinct()
+    if session.get('role') != 'admin':
+        query = query.filter(ActivityRollup.user_id == session.get('user_id'))
+    return jsonify({
+        'success': True,
+        'actions': sorted(action for (action,) in query.all())
+    })
+
+
+TREND_GROUPS = {
+    'action': ActivityRollup.action,
+    'user': ActivityRollup.username,
+    'target': ActivityRollup.target,
+}
+MAX_TREND_DAYS = 366
+
+
+@activity_routes.route('/api/trends', methods=['GET'])
+@owner_or_subuser_required()
+def get_activity_trends():
+    """
+    Daily activity counts from the rollups, for charts and summaries.
+
+    `days` is the number of days back (default 30), `group` one of action,
+    user or target to split the counts per day, and `action`, `target` and
+    `user` (username prefix) filter like /api/logs.
+    """
+    days = max(1, min(request.args.get('days', 30, type=int), MAX_TREND_DAYS))
+    group = request.args.get('group')
+    if group and group not in TREND_GROUPS:
+        return jsonify({'success': False, 'error': f"group must be one of: {', '.join(TREND_GROUPS)}"}), 400
+
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    columns = [ActivityRollup.day]
+    if group:
+        columns.append(TREND_GROUPS[group])
+    query = db.session.query(*columns, func.sum(ActivityRollup.count)).filter(ActivityRollup.day >= since)
+
+    if request.args.get('action'):
+        query = query.filter(ActivityRollup.action == request.args['action'])
+    if request.args.get('target'):
+        query = query.filter(ActivityRollup.target == request.args['target'])
+    if request.args.get('user'):
+        query = query.filter(_starts_with(ActivityRollup.username, request.args['user']))
+    if session.get('role') != 'admin':
+        query = query.filter(ActivityRollup.user_id == session.get('user_id'))
+
+    series = []
+    totals = {}
+    for row in query.group_by(*columns).order_by(*columns).all():
+        key = (row[1] or None) if group else None
+        count = int(row[-1])
+        series.append({'day': row[0].isoformat(), 'key': key, 'count': count})
+        totals[key or ''] = totals.get(key or '', 0) + count
+
+    return jsonify({
+        'success': True,
+        'since': since.isoformat(),
+        'group': group,
+        'series': series,
+        'totals': totals
+    })
+
+
+@activity_routes.route('/api/archive', methods=['GET'])
+@owner_or_subuser_required()
+def get_archived_logs():
+    """
+    Search activity logs that were moved out of the database by the
+    retention job (see utils/activity_archive.py).
+
+    `start` and `end` are dates (YYYY-MM-DD, end inclusive); `action` and
+    `user` filter like /api/logs.
+    """
+    from utils.activity_archive import archived_months, read_archive
+
+    try:
+        start = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d')
+        end = datetime.strptime(request.args.get('end', ''), '%Y-%m-%d') + timedelta(days=1)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'start and end must be dates (YYYY-MM-DD)'}), 400
+    if end <= start:
+        return jsonify({'success': False, 'error': 'end must not be before start'}), 400
+
+    limit = max(1, min(request.args.get('limit', 500, type=int), 1000))
+    user_id = None if session.get('role') == 'admin' else session.get('user_id')
+
+    logs = read_archive(
+        start,
+        end,
+        user_id=user_id,
+        action=request.args.get('action') or None,
+        username=request.args.get('user') or None,
+        limit=limit,
+    )
     return jsonify({
         'success': True,
-        'actions': [action[0] for action in actions]
+        'logs': logs,
+        'months': archived_months(),
+        'limit': limit
     })
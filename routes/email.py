@@ -1,22 +1,22 @@
 from flask import Blueprint, render_template, request, jsonify
-import subprocess
 from decorators import owner_or_subuser_required
+from utils.permissions import Permission
 from utils import find_process_by_name
+from utils.commands import docker
 
 email_routes = Blueprint('email', __name__)
 
+# Seconds account changes in the mailserver container may take (listing uses the probe timeout)
+MAILSERVER_TIMEOUT = 30
+
 
 @email_routes.route('<name>', methods=['GET'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.EMAIL)
 def email(name):
     process = find_process_by_name(name)
     users = []
 
-    list_result = subprocess.run(
-        ["docker", "exec", "mailserver", "setup", "email", "list"],
-        capture_output=True,
-        text=True, check=False
-    )
+    list_result = docker("exec", "mailserver", "setup", "email", "list")
 
     if list_result.returncode == 0:
         users = []
@@ -31,7 +31,7 @@ def email(name):
 
 
 @email_routes.route('<name>/create', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.EMAIL)
 def create_email(name):
     data = request.get_json()
     email = data.get('email')
@@ -40,12 +40,7 @@ def create_email(name):
     if not email or not password:
         return jsonify({"error": "Email and password are required"}), 400
 
-    result = subprocess.run(
-        ["docker", "exec", "mailserver", "setup", "email", "add", email, password],
-        capture_output=True,
-        text=True,
-        check=False
-    )
+    result = docker("exec", "mailserver", "setup", "email", "add", email, password, timeout=MAILSERVER_TIMEOUT)
 
     if result.returncode == 0:
         return jsonify({"message": f"Email {email} created successfully"}), 200
@@ -54,18 +49,14 @@ def create_email(name):
 
 
 @email_routes.route('<name>/delete', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.EMAIL)
 def delete_email(name):
     email = request.json.get('email')
 
     if not email:
         return jsonify({"error": "Email is required"}), 400
 
-    result = subprocess.run(
-        ["docker", "exec", "mailserver", "setup", "email", "del", email],
-        capture_output=True,
-        text=True, check=False
-    )
+    result = docker("exec", "mailserver", "setup", "email", "del", email, timeout=MAILSERVER_TIMEOUT)
 
     if result.returncode == 0:
         return jsonify({"message": f"Email {email} deleted successfully"}), 200
@@ -74,7 +65,7 @@ def delete_email(name):
 
 
 @email_routes.route('<name>/update-password', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.EMAIL)
 def update_email_password(name):
     data = request.get_json()
     email = data.get('email')
@@ -83,12 +74,7 @@ def update_email_password(name):
     if not email or not password:
         return jsonify({"error": "Email and password are required"}), 400
 
-    result = subprocess.run(
-        ["docker", "exec", "mailserver", "setup", "email", "update", email, password],
-        capture_output=True,
-        text=True,
-        check=False
-    )
+    result = docker("exec", "mailserver", "setup", "email", "update", email, password, timeout=MAILSERVER_TIMEOUT)
 
     if result.returncode == 0:
         return jsonify({"message": f"Password updated successfully for {email}"}), 200
@@ -3,6 +3,7 @@ import zipfile
 import shutil
 import time
 from decorators import owner_or_subuser_required
+from utils.permissions import Permission
 from flask import Blueprint, render_template, jsonify, request, send_file, send_from_directory, redirect, url_for, flash, session
 from utils import find_process_by_name
 from models.activity_log import ActivityLog
@@ -22,7 +23,7 @@ def sanitize_path(base, target):
 
 
 @file_manager_routes.route('/manage/<name>', methods=['GET', 'POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.FILE)
 def file_manager(name):
     process = find_process_by_name(name)
     location_param = request.args.get('location', name)
@@ -87,7 +88,7 @@ def file_manager(name):
 
 
 @file_manager_routes.route('/<name>/file-manager/delete', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.FILE)
 def delete_file(name):
     process = find_process_by_name(name)
     filename = request.form.get('filename', "").replace("\\", "/")
@@ -176,7 +177,7 @@ def delete_file(name):
 
 
 @file_manager_routes.route('/<name>/files/delete', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.FILE)
 def delete_files(name):
     filename = request.form.get('filename', "").replace("\\", "/")
     permanent = request.args.get('permanent', 'false').lower() == 'true'
@@ -202,7 +203,7 @@ def delete_files(name):
 
 
 @file_manager_routes.route('/<name>/file-manager/download/<path:relative_path>', methods=['GET'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.FILE)
 def download_file(name, relative_path):
     try:
         process_path = sanitize_path(ACTIVE_SERVERS_DIR, name)
@@ -229,7 +230,7 @@ def download_file(name, relative_path):
 
 
 @file_manager_routes.route('/<name>/new/file', methods=['GET', 'POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.FILE)
 def create_file(name):
     process = find_process_by_name(name)
     location = request.args.get('location', '')
@@ -255,7 +256,7 @@ def create_file(name):
 
 
 @file_manager_routes.route('/<name>/new/dir', methods=['GET', 'POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.FILE)
 def create_directory_file(name):
     process = find_process_by_name(name)
     current_location = request.args.get('location', '')
@@ -327,7 +328,7 @@ def upload_file():
 
 
 @file_manager_routes.route('/<name>/file-manager/preview', methods=['GET'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.FILE)
 def preview_file_content(name):
     """API endpoint to get file content for preview"""
     process = find_process_by_name(name)
@@ -376,7 +377,7 @@ def preview_file_content(name):
 
 
 @file_manager_routes.route('/<name>/edit', methods=['GET', 'POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.FILE)
 def edit_file(name):
     process = find_process_by_name(name)
     file_path_param = request.args.get('file', '')
@@ -430,7 +431,7 @@ def edit_file(name):
 
 
 @file_manager_routes.route('/unzip/<name>', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.FILE)
 def unzip_file(name):
     zip_path = request.form.get('zip_path')
     if not zip_path or not zip_path.endswith('.zip'):
@@ -465,7 +466,7 @@ def sanitize_path2(base_path, relative_path):
 
 
 @file_manager_routes.route('/move_files/<name>', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.FILE)
 def move_files(name):
     try:
         data = request.get_json()
@@ -502,7 +503,7 @@ def move_files(name):
 
 
 @file_manager_routes.route('/<name>/file-manager/rename', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.FILE)
 def rename_file(name):
     """
     Rename a file or directory.
@@ -574,7 +575,7 @@ def rename_file(name):
 
 
 @file_manager_routes.route('/<name>/file-manager/restore', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.FILE)
 def restore_file(name):
     """
     Restore a deleted file from trash.
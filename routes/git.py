@@ -2,13 +2,14 @@ from flask import Blueprint, jsonify, request, render_template, url_for, redirec
 from models.git import GitIntegration
 from utils import find_process_by_name
 from decorators import owner_or_subuser_required
+from utils.permissions import Permission
 from db import db
 
 git_routes = Blueprint('git', __name__)
 
 
 @git_routes.route('/<name>', methods=['GET'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.GIT)
 def git(name):
     process = find_process_by_name(name)
     integrations = GitIntegration.query.filter_by(process_name=name).all()
@@ -19,7 +20,7 @@ def git(name):
 
 
 @git_routes.route('/<name>/api/git-data', methods=['GET'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.GIT)
 def git_data_api(name):
     """API endpoint to fetch git repository data asynchronously"""
     try:
@@ -53,14 +54,14 @@ def git_data_api(name):
 
 
 @git_routes.route('/<name>/add_form', methods=['GET'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.GIT)
 def add_git_form(name):
     process = find_process_by_name(name)
     return render_template('git/add_form.html', page_title="Add Git", process=process)
 
 
 @git_routes.route('/<name>/add_git_integration', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.GIT)
 def add_git_integration(name):
     data = request.form
     repository_url = data.get('repository_url')
@@ -79,7 +80,7 @@ def add_git_integration(name):
 
 
 @git_routes.route('/<name>/pull_latest/<int:integration_id>', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.GIT)
 def pull_latest_git(name, integration_id):
     git_integration = GitIntegration.query.get(integration_id)
     if not git_integration:
@@ -90,7 +91,7 @@ def pull_latest_git(name, integration_id):
 
 
 @git_routes.route('/<name>/remove_git_integration/<int:integration_id>', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.GIT)
 def remove_git_integration(name, integration_id):
     git_integration = GitIntegration.query.get(integration_id)
     if not git_integration:
@@ -4,13 +4,14 @@ import subprocess
 from flask import Blueprint, redirect, request, render_template
 import os
 from decorators import owner_or_subuser_required
+from utils.permissions import Permission
 from utils import find_process_by_name
 
 nginx_routes = Blueprint('nginx', __name__)
 
 
 @nginx_routes.route('/<name>', methods=['GET', 'POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.NGINX)
 def nginx(name):
     from utils import get_domain_status
     
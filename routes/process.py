@@ -4,8 +4,7 @@ import shutil
 import threading
 import time, yaml
 import subprocess
-from flask import stream_with_context
-from flask import Blueprint, jsonify, redirect, request, render_template, Response, url_for, flash, session
+from flask import Blueprint, current_app, jsonify, redirect, request, render_template, url_for, flash, session
 import os, json, re, pytz
 import shlex
 import sys
@@ -17,7 +16,18 @@ from models.subuser import SubUser
 from models.activity_log import ActivityLog
 from decorators import owner_or_subuser_required, owner_required
 from models.user import User
-from utils import find_process_by_name, find_types, get_process_status, generate_random_string, send_email, execute_handler, is_always_running_container, start_process_in_container, stop_process_in_container, execute_command_in_container, execute_interactive_command_in_container, get_server_ip
+from utils import find_process_by_name, find_types, get_process_status, generate_random_string, send_email, execute_handler, is_always_running_container, start_process_in_container, stop_process_in_container, execute_command_in_container, execute_interactive_command_in_container, get_server_ip, get_process_port
+from utils.commands import compose, compose_popen, popen as popen_command, run as run_command
+from utils.cache import TieredCache, invalidate_tags, typed_key
+from utils.docker_health import forget_status
+from utils.performance import PRIORITY_POLLING, docker_priority
+from utils.permissions import PERMISSIONS_TAG, Permission, compile_permissions, get_permission_resolver, invalidate_permissions
+from utils.readiness import wait_for_ready
+from utils.rebuild import buildkit_env, format_build_event, rebuild_process_image
+from utils.status import owner_tag, process_tag, status_engine
+from utils.streaming import event_stream
+from utils.supervisor import is_supervised
+from utils.visibility import MAX_PER_PAGE, visible_processes
 from utils.cloudflare import (
     extract_zone_name,
     get_zone_id,
@@ -36,33 +46,37 @@ PROCESS_DIRECTORY = 'active-servers'
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 ACTIVE_SERVERS_DIR = os.path.join(BASE_DIR, 'active-servers')
 
-# Lightweight in-memory cache to avoid repeated docker status calls during rapid page loads
-PROCESS_STATUS_CACHE = {}
+# Process listings with their statuses, to avoid repeated docker status calls during
+# rapid page loads. Entries are tagged with every listed process and owner, so a
+# power action only invalidates the listings that contain the process.
 PROCESS_STATUS_CACHE_TTL = 5  # seconds
+process_status_cache = TieredCache("process_status", ttl=PROCESS_STATUS_CACHE_TTL)
 
 
-def _make_process_cache_key(user_id, role):
-    return f"{role or 'user'}:{user_id or 'anon'}"
-
+def invalidate_process_cache(name=None, owner_id=None):
+    """
+    Invalidate cached process statuses in every worker.
 
-def invalidate_process_cache(cache_key=None):
-    """Invalidate cached process status results."""
-    if cache_key:
-        PROCESS_STATUS_CACHE.pop(cache_key, None)
+    Args:
+        name: Process whose status changed (listings containing it, and its
+            status engine entry)
+        owner_id: Owner whose set of processes changed
+    """
+    tags = []
+    if name:
+        tags.append(process_tag(name))
+    if owner_id:
+        tags.append(owner_tag(owner_id))
+    if tags:
+        invalidate_tags(*tags)
     else:
-        PROCESS_STATUS_CACHE.clear()
+        process_status_cache.clear()
+        status_engine.invalidate()
 
 
 def get_container_id(process_name):
-    process_dir = os.path.join(ACTIVE_SERVERS_DIR, process_name)
     try:
-        result = subprocess.run(
-            ['docker-compose', 'ps', '-q', process_name],
-            capture_output=True,
-            text=True,
-            check=True,
-            cwd=process_dir
-        )
+        result = compose(process_name, 'ps', '-q', process_name, check=True)
         container_id = result.stdout.strip()
         return container_id or None
     except subprocess.CalledProcessError as e:
@@ -74,7 +88,7 @@ def get_container_id(process_name):
 
 def get_main_command_for_container(container_id, fallback_command=""):
     try:
-        result = subprocess.run(
+        result = run_command(
             ['docker', 'inspect', '--format', '{{range .Config.Env}}{{println .}}{{end}}', container_id],
             capture_output=True,
             text=True
@@ -99,7 +113,7 @@ def get_process_pid_in_container(container_id, command):
     )
 
     try:
-        result = subprocess.run(
+        result = run_command(
             ['docker', 'exec', container_id, 'sh', '-c', shell_cmd],
             capture_output=True,
             text=True
@@ -196,31 +210,48 @@ def calculate_uptime(startup_date):
     return uptime_str.strip()
 
 
-def load_process():
-    process_dict = {}
+def load_process(search=None, process_type=None, sort="name", order="asc", page=None, per_page=None):
+    """
+    Processes visible to the logged in user with their status, keyed by name.
 
+    Filtering, sorting and pagination run in the database (see
+    utils.visibility.visible_processes); only the returned page is probed.
+
+    Returns:
+        (process_dict, total)
+    """
     user_id = session.get('user_id')
     if not user_id:
-        return process_dict
-
-    cache_key = _make_process_cache_key(user_id, session.get("role"))
-    now = time.time()
-    cached_entry = PROCESS_STATUS_CACHE.get(cache_key)
-    if cached_entry and now - cached_entry.get("timestamp", 0) < PROCESS_STATUS_CACHE_TTL:
-        # Return a shallow copy to avoid accidental mutation of cached data
-        return dict(cached_entry.get("data", {}))
-    
-    user = User.query.filter_by(id=user_id).first()
+        return {}, 0
+
+    is_admin = session.get("role") == "admin"
+    cached = process_status_cache.get_or_compute(
+        typed_key(session.get("role") or "user", user_id, search, process_type, sort, order, page, per_page),
+        lambda: _load_process_statuses(user_id, is_admin, search, process_type, sort, order, page, per_page),
+        # Grant and ownership changes change what is visible (see invalidate_permissions)
+        tags=[PERMISSIONS_TAG],
+        tags_of=lambda entry: [process_tag(name) for name in entry["data"]] + [owner_tag(owner) for owner in entry["owners"]],
+    )
+    # Return a shallow copy to avoid accidental mutation of cached data
+    return dict(cached["data"]), cached["total"]
 
-    owned_processes = Process.query.filter_by(owner_id=user_id).all()
-    sub_user_processes = Process.query.join(SubUser, Process.name == SubUser.process).filter(SubUser.email == user.email).all()
 
-    processes = owned_processes + sub_user_processes
+def _load_process_statuses(user_id, is_admin, search, process_type, sort, order, page, per_page):
+    """One page of visible processes with their probed statuses (see load_process)."""
+    process_dict = {}
 
-    if session.get("role") == "admin":
-        processes = Process.query.all()
+    rows, total = visible_processes(
+        user_id,
+        is_admin=is_admin,
+        search=search,
+        process_type=process_type,
+        sort=sort,
+        order=order,
+        page=page,
+        per_page=per_page,
+    )
 
-    for process in processes:
+    for process in rows:
         response = get_process_status(process.name)
 
         if "error" in response:
@@ -241,17 +272,41 @@ def load_process():
                 "file_location": process.file_location,
                 "name": process.name,
                 "status": status,
-                "created_at": process.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+                "stale": response.get("stale", False),
+                "created_at": process.created_at.isoformat(sep=" ", timespec="seconds"),
             }
 
-    PROCESS_STATUS_CACHE[cache_key] = {"timestamp": now, "data": process_dict}
-    return process_dict
+    return {"data": process_dict, "total": total, "owners": sorted({process.owner_id for process in rows})}
 
 
 @process_routes.route('/', methods=['GET'])
+@docker_priority(PRIORITY_POLLING)
 def get_process():
-    processes = load_process()
-    return jsonify(processes)
+    """
+    Visible processes keyed by name.
+
+    Query parameters (all optional): search (name prefix), type, sort
+    (name|type|created), order (asc|desc), page and per_page. With a page
+    the response is {"processes": {...}, "total", "page", "per_page"}.
+    """
+    page = request.args.get('page', type=int)
+    per_page = max(1, min(request.args.get('per_page', 25, type=int), MAX_PER_PAGE))
+    processes, total = load_process(
+        search=request.args.get('search') or None,
+        process_type=request.args.get('type') or None,
+        sort=request.args.get('sort', 'name'),
+        order=request.args.get('order', 'asc'),
+        page=page,
+        per_page=per_page,
+    )
+    if page is None:
+        return jsonify(processes)
+    return jsonify({
+        "processes": processes,
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+    })
 
 
 @process_routes.route('/create', methods=['GET', 'POST'])
@@ -273,7 +328,7 @@ def add_process():
     command = data.get("command", "").strip()
     dependencies = [dep.strip() for dep in data.get("dependencies", "").split(",")]
 
-    if not process_name or process_name in load_process():
+    if not process_name or process_name in load_process()[0]:
         return jsonify({"error": "Invalid or duplicate process name"}), 400
 
     process_dir = os.path.join(ACTIVE_SERVERS_DIR, process_name)
@@ -296,6 +351,7 @@ def add_process():
 
         db.session.add(new_process)
         db.session.commit()
+        invalidate_permissions()
 
         compose_file_path = os.path.join(process_dir, "docker-compose.yml")
         dockerfile_path = os.path.join(process_dir, "Dockerfile")
@@ -306,8 +362,7 @@ def add_process():
         if not compose_result.success or not docker_result.success:
             return jsonify({"error": compose_result.message if not compose_result.success else docker_result.message}), 400
 
-        os.chdir(process_dir)
-        subprocess.run(['docker-compose', 'up', '-d'], check=True)
+        compose(new_process.name, 'up', '-d', check=True, capture_output=False, env=buildkit_env())
 
         update_process_runtime_metadata(new_process)
 
@@ -347,8 +402,7 @@ def settings_delete(name):
         process_dir = os.path.join(ACTIVE_SERVERS_DIR, name)
         if os.path.exists(process_dir):
             try:
-                os.chdir(process_dir)
-                subprocess.run(['docker-compose', 'down'], check=True)
+                compose(name, 'down', check=True)
                 print(f"Process {name} stopped and removed successfully via docker-compose")
             except subprocess.CalledProcessError as e:
                 print(f"Error stopping process {name}: {e}")
@@ -356,8 +410,13 @@ def settings_delete(name):
             shutil.rmtree(process_dir)
             print(f"Process directory {process_dir} removed successfully")
 
+        owner_id = process.owner_id
         db.session.delete(process)
         db.session.commit()
+        forget_status(name)
+        # Other pages of the owner's listings shift as well
+        invalidate_process_cache(name, owner_id=owner_id)
+        invalidate_permissions()
 
         # Log activity
         try:
@@ -380,7 +439,7 @@ def settings_delete(name):
 
 
 @process_routes.route('/start/<string:name>', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.CONSOLE)
 def start_process_console(name):
     process = find_process_by_name(name)
     if not process:
@@ -396,7 +455,7 @@ def start_process_console(name):
             result = start_process_in_container(name)
             if result["success"]:
                 update_process_runtime_metadata(process)
-                invalidate_process_cache()
+                invalidate_process_cache(name)
                 return jsonify({
                     "message": result["message"], 
                     "status": get_process_status(process.name), 
@@ -423,14 +482,20 @@ def start_process_console(name):
                     "ok": False
                 }), 404
             
-            os.chdir(process_dir)
-            
-            subprocess.run(['docker-compose', 'up', '-d'], check=True, capture_output=True, text=True)
+            compose(name, 'up', '-d', check=True, env=buildkit_env())
 
-            time.sleep(2)
+            container_id = get_container_id(name)
+            if container_id:
+                readiness = wait_for_ready(container_id, port=get_process_port(process))
+                if not readiness["ready"]:
+                    invalidate_process_cache(name)
+                    return jsonify({
+                        "error": f"Process '{name}' failed to start: {readiness['reason']}. Check the console logs for details.",
+                        "ok": False
+                    }), 500
 
             update_process_runtime_metadata(process)
-            invalidate_process_cache()
+            invalidate_process_cache(name)
 
             # Log activity
             try:
@@ -492,7 +557,7 @@ def start_process_console(name):
 
 
 @process_routes.route('/stop/<string:name>', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.CONSOLE)
 def stop_process_console(name):
     process = find_process_by_name(name)
     if not process:
@@ -511,13 +576,13 @@ def stop_process_console(name):
                 except Exception as db_err:
                     db.session.rollback()
                     print(f"[process_metadata] Failed to clear PID for {name}: {db_err}")
+                invalidate_process_cache(name)
                 return jsonify({"message": result["message"]})
             else:
                 return jsonify({"error": result["error"]}), 500
         else:
             # Use traditional container-level control
-            os.chdir(os.path.join(ACTIVE_SERVERS_DIR, name))
-            os.system('docker-compose stop')
+            compose(name, 'stop')
 
             process.process_pid = None
             try:
@@ -540,7 +605,7 @@ def stop_process_console(name):
             except Exception as log_error:
                 print(f"Failed to log activity: {log_error}")
 
-            invalidate_process_cache()
+            invalidate_process_cache(name)
 
             # Send Discord notification
             try:
@@ -566,7 +631,7 @@ def stop_process_console(name):
 
 
 @process_routes.route('/console/<string:name>', methods=['GET'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.CONSOLE)
 def console(name):
     process = find_process_by_name(name)
     
@@ -584,23 +649,20 @@ def console(name):
 
 
 @process_routes.route('/console/<name>/uptime')
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.CONSOLE)
+@docker_priority(PRIORITY_POLLING)
 def get_console_uptime(name):
     process = find_process_by_name(name)
     if not process:
         return jsonify({'error': 'Process not found'}), 404
 
     try:
-        process_dir = os.path.join(ACTIVE_SERVERS_DIR, name)
-        os.chdir(process_dir)
-
-        result = subprocess.run(['docker-compose', 'ps', '-q'], capture_output=True, text=True, check=True)
-        container_id = result.stdout.strip()
+        container_id = compose(name, 'ps', '-q', check=True).stdout.strip()
 
         if not container_id:
             return jsonify({'uptime': '0w 0d 0h 0m 0s', 'error': 'Process is not running.'})
 
-        result = subprocess.run(['docker', 'inspect', '--format', '{{.State.StartedAt}}', container_id],
+        result = run_command(['docker', 'inspect', '--format', '{{.State.StartedAt}}', container_id],
                                 capture_output=True, text=True, check=True)
         startup_date = result.stdout.strip()
 
@@ -617,14 +679,12 @@ live_log_streams = defaultdict(Queue)
 
 
 @process_routes.route('/console/<string:name>/logs', methods=['GET'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.CONSOLE)
 def console_stream_logs(name):
     process = find_process_by_name(name)
     if not process:
         return jsonify({"error": "Process not found"}), 404
 
-    process_dir = os.path.join(ACTIVE_SERVERS_DIR, name)
-
     def generate():
         try:
             # Check if this is an always-running container
@@ -634,17 +694,14 @@ def console_stream_logs(name):
                 # For always-running containers, stream both container logs and process logs
                 container_id = None
                 try:
-                    result = subprocess.run(['docker-compose', 'ps', '-q', name], 
-                                          capture_output=True, text=True, check=True, cwd=process_dir)
-                    container_id = result.stdout.strip()
+                    container_id = compose(name, 'ps', '-q', name, check=True).stdout.strip()
                 except Exception:
                     print("[DEBUG] Failed to get container ID")
                 
                 # Stream existing container logs first (last 20 lines)
                 if container_id:
                     try:
-                        container_logs = subprocess.run(['docker-compose', 'logs', '--tail', '150', '--timestamps', '--no-log-prefix'], 
-                                                      capture_output=True, text=True, cwd=process_dir)
+                        container_logs = compose(name, 'logs', '--tail', '150', '--timestamps', '--no-log-prefix')
                         if container_logs.stdout:
                             for line in container_logs.stdout.split('\n'):
                                 if line.strip():
@@ -656,7 +713,7 @@ def console_stream_logs(name):
                 if container_id:
                     log_file = f"/tmp/{name}_process.log"
                     try:
-                        log_result = subprocess.run(['docker', 'exec', container_id, 'tail', '-150', log_file], 
+                        log_result = run_command(['docker', 'exec', container_id, 'tail', '-150', log_file], 
                                                   capture_output=True, text=True)
                         if log_result.returncode == 0 and log_result.stdout:
                             for line in log_result.stdout.split('\n'):
@@ -672,7 +729,7 @@ def console_stream_logs(name):
                 if container_id:
                     try:
                         log_file = f"/tmp/{name}_process.log"
-                        log_streaming_process = subprocess.Popen(
+                        log_streaming_process = popen_command(
                             ['docker', 'exec', container_id, 'tail', '-n', '150', '-f', log_file],
                             stdout=subprocess.PIPE,
                             stderr=subprocess.PIPE,
@@ -707,13 +764,13 @@ def console_stream_logs(name):
                             try:
                                 log_file = f"/tmp/{name}_process.log"
                                 # Get file size first
-                                size_result = subprocess.run(['docker', 'exec', container_id, 'wc', '-c', log_file], 
+                                size_result = run_command(['docker', 'exec', container_id, 'wc', '-c', log_file], 
                                                            capture_output=True, text=True, timeout=2)
                                 if size_result.returncode == 0:
                                     current_size = int(size_result.stdout.strip().split()[0])
                                     if current_size > last_log_position:
                                         # Get new content since last position
-                                        tail_result = subprocess.run(
+                                        tail_result = run_command(
                                             ['docker', 'exec', container_id, 'tail', '-n', '150', log_file], 
                                             capture_output=True, text=True, timeout=2
                                         )
@@ -763,10 +820,8 @@ def console_stream_logs(name):
             
             else:
                 # Traditional container log streaming (existing behavior)
-                logs_command = ['docker-compose', 'logs', '--tail', '50', '--timestamps', '--no-log-prefix']
-                docker_logs = subprocess.Popen(
-                    logs_command,
-                    cwd=process_dir,
+                docker_logs = compose_popen(
+                    name, 'logs', '--tail', '50', '--timestamps', '--no-log-prefix',
                     stdout=subprocess.PIPE,
                     stderr=subprocess.PIPE,
                     text=True,
@@ -791,18 +846,12 @@ def console_stream_logs(name):
         except Exception as e:
             yield f"data: [stream error] {str(e)}\n\n"
 
-    return Response(
-        stream_with_context(generate()),
-        mimetype="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "X-Accel-Buffering": "no"  # for Nginx
-        }
-    )
+    # Everything from the database is resolved above; the stream runs without a connection
+    return event_stream(generate())
 
 
 @process_routes.route('/execute/<string:name>', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.CONSOLE)
 def execute_command(name):
     """Execute a command inside the container"""
     process = find_process_by_name(name)
@@ -887,7 +936,7 @@ def execute_command(name):
 
 
 @process_routes.route('/execute/<string:name>/interactive', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.CONSOLE)
 def start_interactive_command(name):
     """Start an interactive command inside the container"""
     process = find_process_by_name(name)
@@ -931,7 +980,7 @@ def start_interactive_command(name):
 
 
 @process_routes.route('/execute/<string:name>/shell', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.CONSOLE)
 def open_shell(name):
     """Open a shell session inside the container"""
     process = find_process_by_name(name)
@@ -971,7 +1020,7 @@ def open_shell(name):
 
 
 @process_routes.route('/clear-logs/<string:name>', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.CONSOLE)
 def clear_logs(name):
     """Clear the persistent log file for a process"""
     process = find_process_by_name(name)
@@ -979,19 +1028,15 @@ def clear_logs(name):
         return jsonify({"error": "Process not found"}), 404
 
     try:
-        process_dir = os.path.join(ACTIVE_SERVERS_DIR, name)
-        os.chdir(process_dir)
-
         # Get container ID
-        result = subprocess.run(['docker-compose', 'ps', '-q', name], capture_output=True, text=True, check=True)
-        container_id = result.stdout.strip()
+        container_id = compose(name, 'ps', '-q', name, check=True).stdout.strip()
 
         if not container_id:
             return jsonify({"error": "Container is not running"}), 400
 
         # Clear the log file
         log_file = f"/tmp/{name}_process.log"
-        result = subprocess.run(['docker', 'exec', container_id, 'sh', '-c', f'> {log_file}'], 
+        result = run_command(['docker', 'exec', container_id, 'sh', '-c', f'> {log_file}'], 
                               capture_output=True, text=True)
         
         if result.returncode == 0:
@@ -1024,7 +1069,7 @@ def ansi_to_html(ansi_code):
 
 
 @process_routes.route('/settings/<string:name>', methods=['GET', 'POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.SETTINGS)
 def settings(name):
     process = find_process_by_name(name)
     types = find_types()
@@ -1090,6 +1135,8 @@ def settings(name):
         try:
             db.session.add(process)
             db.session.commit()
+            if old_name != new_name:
+                invalidate_permissions()
             if domain:
                 flash(f"Settings saved successfully. Domain '{domain}' configured.", "success")
             else:
@@ -1117,7 +1164,7 @@ def settings(name):
 
 
 @process_routes.route('/cloudflare/<string:name>', methods=['GET'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.SETTINGS)
 def cloudflare(name):
     process = find_process_by_name(name)
     if not process:
@@ -1148,7 +1195,19 @@ def update_compose_file(compose_path, process_name, command):
     if process_name not in compose_data.get('services', {}):
         return False
 
-    compose_data['services'][process_name]['command'] = command.split()
+    service = compose_data['services'][process_name]
+    if is_supervised(os.path.dirname(compose_path)):
+        # The supervisor runs as the container command and starts MAIN_COMMAND itself
+        environment = service.get('environment') or []
+        if isinstance(environment, dict):
+            environment['MAIN_COMMAND'] = command
+        else:
+            environment = [f"MAIN_COMMAND={json.dumps(command)}"] + [
+                entry for entry in environment if not str(entry).startswith('MAIN_COMMAND=')
+            ]
+        service['environment'] = environment
+    else:
+        service['command'] = command.split()
 
     with open(compose_path, 'w') as compose_file:
         yaml.safe_dump(compose_data, compose_file, default_flow_style=False)
@@ -1176,7 +1235,7 @@ def update_dockerfile(dockerfile_path, command):
 
 
 @process_routes.route('/cloudflare/<string:name>/create', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.SETTINGS)
 def cloudflare_create(name):
     process = find_process_by_name(name)
     if not process:
@@ -1220,7 +1279,7 @@ def cloudflare_create(name):
 
 
 @process_routes.route('/cloudflare/<string:name>/delete', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.SETTINGS)
 def cloudflare_delete(name):
     process = find_process_by_name(name)
     if not process:
@@ -1261,7 +1320,7 @@ def cloudflare_delete(name):
 
 
 @process_routes.route('/cloudflare/<string:name>/update', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.SETTINGS)
 def cloudflare_update(name):
     process = find_process_by_name(name)
     if not process:
@@ -1302,7 +1361,7 @@ def cloudflare_update(name):
 
 
 @process_routes.route('/cloudflare/<string:name>/records', methods=['GET'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.SETTINGS)
 def cloudflare_records(name):
     process = find_process_by_name(name)
     if not process:
@@ -1330,31 +1389,25 @@ def cloudflare_records(name):
     return jsonify({"success": True, "records": records})
 
 
-def rebuild_process(project_dir, name):
-    try:
-        subprocess.run(['docker-compose', 'down'], cwd=project_dir, check=True)
+def rebuild_process(app, name):
+    def emit(event):
+        colored = colorize_log(format_build_event(event))
+        print(colored)
+        live_log_streams[name].put(colored)
 
-        process = subprocess.Popen(
-            ['docker-compose', 'build'],
-            cwd=project_dir,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
-        )
-        if process.stdout is not None:
-            with process.stdout:
-                for line in iter(process.stdout.readline, ''):
-                    formatted = format_timestamp(line.strip())
-                    colored = colorize_log(formatted)
-                    print(colored)
-                    live_log_streams[name].put(colored)
+    with app.app_context():
+        try:
+            was_running = get_process_status(name).get('status') == 'Running'
 
-        process.wait()
-        live_log_streams[name].put('[rebuild] Build process finished.')
+            def restart_main_process():
+                # The swapped-in container only runs the keep-alive command, start the process again
+                if was_running and is_always_running_container(name):
+                    start_process_in_container(name)
 
-    except Exception as e:
-        live_log_streams[name].put(f'[rebuild error] {str(e)}')
+            rebuild_process_image(name, emit, after_swap=restart_main_process)
+            invalidate_process_cache(name)
+        except Exception as e:
+            live_log_streams[name].put(f'[rebuild error] {str(e)}')
 
 
 
@@ -1370,7 +1423,7 @@ def settings_rebuild(name):
     if not os.path.isdir(project_dir):
         return jsonify({"error": "Project directory not found"}), 404
 
-    threading.Thread(target=rebuild_process, args=(project_dir, process.name)).start()
+    threading.Thread(target=rebuild_process, args=(current_app._get_current_object(), process.name)).start()
 
     # Log activity
     try:
@@ -1389,7 +1442,7 @@ def settings_rebuild(name):
 
 
 @process_routes.route('/subusers/<string:name>', methods=['GET'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.SUB_USERS)
 def subusers(name):
     process = find_process_by_name(name)
     users = SubUser.query.filter_by(process=name).all()
@@ -1397,7 +1450,7 @@ def subusers(name):
 
 
 @process_routes.route('/subusers/<string:name>/invite', methods=['GET', 'POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.SUB_USERS)
 def invite_subuser(name):
     if request.method == 'POST':
         email = request.form.get('email')
@@ -1407,6 +1460,14 @@ def invite_subuser(name):
             flash('Please provide an email and select at least one permission.', 'danger')
             return redirect(url_for('process_routes.invite_subuser', name=name))
 
+        # A sub-user can only hand out permissions they have themselves
+        if session.get('role') != 'admin':
+            resolver = get_permission_resolver()
+            delegable = resolver.delegable(name) if resolver else 0
+            if compile_permissions(permissions) & ~delegable:
+                flash('You can only grant permissions you have yourself.', 'danger')
+                return redirect(url_for('process.subusers', name=name))
+
         existing_user = User.query.filter_by(email=email).first()
 
         if existing_user:
@@ -1420,6 +1481,7 @@ def invite_subuser(name):
             )
             db.session.add(sub_user)
             db.session.commit()
+            invalidate_permissions()
 
             subject = "You have been added to the project"
             body = f"""
@@ -1510,6 +1572,7 @@ def invite_subuser(name):
             )
             db.session.add(sub_user)
             db.session.commit()
+            invalidate_permissions()
 
             subject = "Create Your Account"
             body = f"""
@@ -1599,36 +1662,37 @@ def invite_subuser(name):
 
 
 @process_routes.route('/subusers/<string:name>/delete/<int:user_id>', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.SUB_USERS)
 def delete_subuser(name, user_id):
-    sub_user = SubUser.query.filter_by(id=user_id).first()
-    if sub_user:
-        subuser_email = sub_user.email  # Store email before deletion
-        db.session.delete(sub_user)
-        db.session.commit()
-        
-        # Log activity
-        try:
-            ActivityLog.log_activity(
-                user_id=session.get('user_id'),
-                username=session.get('username'),
-                action='deleted_subuser',
-                target=name,
-                details=f"Removed subuser: {subuser_email}",
-                request_obj=request
-            )
-        except Exception as log_error:
-            print(f"Failed to log activity: {log_error}")
-        
-        flash(f"Sub-user with email {subuser_email} has been removed.", "success")
-    else:
+    sub_user = SubUser.query.filter_by(id=user_id, process=name).first()
+    if not sub_user:
         flash("Sub-user not found.", "danger")
-    
+        return redirect(url_for('process.subusers', name=name))
+
+    subuser_email = sub_user.email  # Store email before deletion
+    db.session.delete(sub_user)
+    db.session.commit()
+    invalidate_permissions()
+
+    # Log activity
+    try:
+        ActivityLog.log_activity(
+            user_id=session.get('user_id'),
+            username=session.get('username'),
+            action='deleted_subuser',
+            target=name,
+            details=f"Removed subuser: {subuser_email}",
+            request_obj=request
+        )
+    except Exception as log_error:
+        print(f"Failed to log activity: {log_error}")
+
+    flash(f"Sub-user with email {subuser_email} has been removed.", "success")
     return redirect(url_for('process.subusers', name=name))
 
 
 @process_routes.route('/schedule/<string:name>', methods=['GET', 'POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.SCHEDULE)
 def schedule(name):
     process = find_process_by_name(name)
     if not process:
@@ -1712,7 +1776,7 @@ def get_current_cron_jobs(process_name):
 
 
 @process_routes.route('/schedule/<string:name>/delete', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.SCHEDULE)
 def delete_cron_job(name):
     """
     This route handles the deletion of a specific cron job related to a process.
@@ -1747,7 +1811,8 @@ def delete_cron_job(name):
 
 
 @process_routes.route('/metrics/<string:name>', methods=['GET'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.CONSOLE)
+@docker_priority(PRIORITY_POLLING)
 def get_process_metrics(name):
     """
     Get real-time CPU and memory metrics for a process.
@@ -1768,7 +1833,7 @@ def get_process_metrics(name):
             })
 
         # Get container stats using docker stats
-        result = subprocess.run(
+        result = run_command(
             ['docker', 'stats', '--no-stream', '--format', 
              '{{.CPUPerc}}|{{.MemPerc}}|{{.MemUsage}}', container_id],
             capture_output=True,
@@ -1837,7 +1902,7 @@ def get_process_metrics(name):
 
 
 @process_routes.route('/env-vars/<string:name>', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.SETTINGS)
 def save_env_vars(name):
     """
     Save environment variables for a process.
@@ -1899,7 +1964,7 @@ def save_env_vars(name):
 
 
 @process_routes.route('/validate-domain/<string:name>', methods=['POST'])
-@owner_or_subuser_required()
+@owner_or_subuser_required(Permission.SETTINGS)
 def validate_domain(name):
     """
     Validate domain and get comprehensive status including DNS, SSL, and uniqueness checks.
@@ -2,6 +2,8 @@ import subprocess
 from flask import Blueprint, jsonify, render_template, request, session
 from decorators import admin_required, auth_check
 from models.user_settings import UserSettings
+from utils.dependency_cache import get_cache_usage, prune_caches
+from utils.performance import get_metrics
 
 settings_routes = Blueprint('settings', __name__)
 
@@ -104,3 +106,33 @@ def git_pull():
         return jsonify({'message': result})
     except subprocess.CalledProcessError as e:
         return jsonify({'message': e.output.decode('utf-8')}), 500
+
+
+@settings_routes.route('dependency-cache', methods=['GET'])
+@admin_required()
+def dependency_cache_usage():
+    try:
+        return jsonify(get_cache_usage())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@settings_routes.route('dependency-cache/prune', methods=['POST'])
+@admin_required()
+def dependency_cache_prune():
+    max_size_mb = request.form.get('max_size_mb') or (request.get_json(silent=True) or {}).get('max_size_mb')
+    try:
+        max_bytes = int(max_size_mb) * 1024 * 1024 if max_size_mb is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_size_mb must be a number'}), 400
+
+    try:
+        return jsonify(prune_caches(max_bytes))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@settings_routes.route('performance/metrics', methods=['GET'])
+@admin_required()
+def performance_metrics():
+    return jsonify(get_metrics())
@@ -3,7 +3,6 @@ from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
 import base64
-import psutil
 import smtplib
 from flask import current_app
 import os
@@ -15,10 +14,21 @@ import textwrap
 import re
 import socket
 import dns.resolver
+import time
 from datetime import datetime
 from collections import defaultdict
 from queue import Queue
 from models.process import Process
+from utils.commands import compose, get_container_id, popen as popen_command, run as run_command
+from utils.process_registry import process_registry
+from utils.readiness import wait_for_ready
+from utils.status import status_engine
+from utils.supervisor import (
+    is_supervised,
+    supervisor_alive,
+    get_supervisor_state,
+    send_supervisor_command,
+)
 
 # Import the live_log_streams from routes/process.py
 live_log_streams = defaultdict(Queue)
@@ -32,90 +42,20 @@ def get_process_status(name):
     if not process:
         return {"error": "Process not found"}
 
-    # Check if this is an always-running container
-    if is_always_running_container(name):
-        # For python processes, just check container status since they are always running
-        if process.type == 'python':
-            try:
-                process_dir = os.path.join(ACTIVE_SERVERS_DIR, name)
-                os.chdir(process_dir)
+    return status_engine.get(name, process.type)
 
-                result = subprocess.run(
-                    ["docker-compose", "ps", "-q", name],
-                    capture_output=True,
-                    text=True,
-                    check=True,
-                )
-                container_id = result.stdout.strip()
-
-                if not container_id:
-                    return {"process": name, "status": "Exited"}
-
-                result = subprocess.run(
-                    ["docker", "inspect", "--format", "{{.State.Status}}", container_id],
-                    capture_output=True,
-                    text=True,
-                )
-
-                if result.returncode != 0:
-                    return {"error": "Failed to get process status from docker inspect."}
-
-                container_status = result.stdout.strip()
-
-                if container_status == "running":
-                    return {"process": name, "status": "Running"}
-
-                return {"process": name, "status": "Exited"}
-
-            except subprocess.CalledProcessError as e:
-                return {"error": f"Failed to get process status: {e.stderr}"}
-            except Exception as e:
-                return {"error": str(e)}
-        else:
-            # Use the new process-aware status checking for other types
-            return check_process_running_in_container(name)
-    else:
-        # Use traditional container status checking for legacy containers
-        try:
-            process_dir = os.path.join(ACTIVE_SERVERS_DIR, name)
-            os.chdir(process_dir)
-
-            result = subprocess.run(
-                ["docker-compose", "ps", "-q", name],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-            container_id = result.stdout.strip()
-
-            if not container_id:
-                return {"process": name, "status": "Exited"}
-
-            result = subprocess.run(
-                ["docker", "inspect", "--format", "{{.State.Status}}", container_id],
-                capture_output=True,
-                text=True,
-            )
-
-            if result.returncode != 0:
-                return {"error": "Failed to get process status from docker inspect."}
 
-            container_status = result.stdout.strip()
-
-            if container_status == "running":
-                return {"process": name, "status": "Running"}
-
-            return {"process": name, "status": "Exited"}
-
-        except subprocess.CalledProcessError as e:
-            return {"error": f"Failed to get process status: {e.stderr}"}
-        except Exception as e:
-            return {"error": str(e)}
+def get_process_port(process):
+    """Return the published host port of a process, or None if it has none."""
+    if not process or not getattr(process, "port_id", None):
+        return None
+    if process.type == "minecraft":
+        return 25565 + process.port_id
+    return 8000 + process.port_id
 
 
 def find_process_by_name(name):
-    with current_app.app_context():
-        return Process.query.filter_by(name=name).first()
+    return process_registry.get(name)
 
 
 def find_process_by_id(process_id):
@@ -163,183 +103,88 @@ def generate_random_string(length: int) -> str:
 
 
 def check_process_running_in_container(name):
-    """Check if the main process is running inside the container"""
-    try:
-        process_dir = os.path.join(ACTIVE_SERVERS_DIR, name)
-        os.chdir(process_dir)
-
-        # Get container ID
-        result = subprocess.run(
-            ["docker-compose", "ps", "-q", name],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        container_id = result.stdout.strip()
-
-        if not container_id:
-            return {"status": "Container Not Running", "container_running": False}
-
-        # Check if container is running
-        result = subprocess.run(
-            ["docker", "inspect", "--format", "{{.State.Status}}", container_id],
-            capture_output=True,
-            text=True,
-        )
+    """Check if the main process is running inside the container (always probes)"""
+    return status_engine.get(name, max_age=0, liveness=True)
 
-        container_status = result.stdout.strip()
 
-        if result.returncode != 0 or container_status != "running":
-            return {"status": "Container Not Running", "container_running": False}
+# Seconds a warm pool container may spend installing dependencies before its first start
+PROCESS_PREPARE_TIMEOUT = int(os.getenv("PROCESS_PREPARE_TIMEOUT", "600"))
 
-        # Get the main command from environment variable
-        result = subprocess.run(
-            [
-                "docker",
-                "inspect",
-                "--format",
-                "{{range .Config.Env}}{{println .}}{{end}}",
-                container_id,
-            ],
-            capture_output=True,
-            text=True,
-        )
-
-        main_command = None
-        for line in result.stdout.split("\n"):
-            if line.startswith("MAIN_COMMAND="):
-                main_command = line.split("=", 1)[1].strip('"')
-                break
 
-        if not main_command:
-            return {
-                "status": "Running",
-                "container_running": True,
-                "process_running": True,
-            }
+def start_supervised_process(name, process_dir):
+    """Start a supervised process through its supervisor's control FIFO"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        # Check if the main process is running inside the container
-        result = subprocess.run(
-            ["docker", "exec", container_id, "ps", "aux"],
-            capture_output=True,
-            text=True,
-        )
+    if not supervisor_alive(process_dir):
+        # Container is down, bring it up and give the supervisor a moment to open its FIFO
+        compose(name, "up", "-d", check=True)
+        deadline = time.monotonic() + 10
+        while not supervisor_alive(process_dir):
+            if time.monotonic() >= deadline:
+                return {"success": False, "error": "Supervisor did not come up after starting the container"}
+            time.sleep(0.1)
+
+    live_log_streams[name].put(f"[{timestamp}] ===== PROCESS RESTART =====")
+    live_log_streams[name].put(f"[{timestamp}] Process start initiated")
+
+    result = send_supervisor_command(process_dir, "start", wait_for={"preparing", "running", "crashed", "exited"}, timeout=10)
+    if not result["success"]:
+        return {"success": False, "error": result["error"]}
+
+    if result["state"].get("state") == "preparing":
+        # Warm pool containers install their dependencies before the first start
+        live_log_streams[name].put(f"[{timestamp}] Installing dependencies...")
+        deadline = time.monotonic() + PROCESS_PREPARE_TIMEOUT
+        while (get_supervisor_state(process_dir) or {}).get("state") == "preparing":
+            if time.monotonic() >= deadline:
+                return {"success": False, "error": f"Installing dependencies did not finish within {PROCESS_PREPARE_TIMEOUT}s"}
+            time.sleep(0.5)
+        result["state"] = get_supervisor_state(process_dir) or {}
+
+    if result["state"].get("state") != "running":
+        return {
+            "success": False,
+            "error": f"Process exited immediately with code {result['state'].get('exit_code')}. Check logs for details.",
+        }
 
-        if result.returncode != 0:
-            return {
-                "status": "Process Stopped",
-                "container_running": True,
-                "process_running": False,
-            }
+    container_id = get_container_id(name)
 
-        # Parse process list to find our main command
-        processes = result.stdout
-        command_parts = main_command.split()
-
-        # Define process name mappings for common web servers
-        # These map the MAIN_COMMAND to the actual process names that run
-        process_name_mappings = {
-            "apache2-foreground": ["apache2", "httpd"],
-            "php-fpm": ["php-fpm"],
-            "nginx": ["nginx"],
-            "vite": ["node", "vite"],
-            "npm": ["node", "npm"],
-            "node": ["node"],
-            "nodejs": ["node", "npm"],
-            "minecraft": ["java"],
-            "java": ["java"],
-            "python": ["python", "python3"],
-            "python3": ["python3"],
-        }
+    readiness = wait_for_ready(
+        container_id,
+        port=get_process_port(find_process_by_name(name)),
+        is_alive=lambda: (get_supervisor_state(process_dir) or {}).get("state") == "running",
+    )
 
-        # Determine what processes to look for
-        search_terms = []
-        for cmd_part in command_parts:
-            if cmd_part in process_name_mappings:
-                search_terms.extend(process_name_mappings[cmd_part])
-            elif len(cmd_part) > 2:  # Only use meaningful parts
-                search_terms.append(cmd_part)
-
-        # If no specific search terms, use original command parts
-        if not search_terms:
-            search_terms = [part for part in command_parts if len(part) > 2]
-
-        # Look for the main command in the process list (exclude zombie processes and ps/grep itself)
-        process_running = False
-        matching_processes = []
-        for line in processes.split("\n")[1:]:  # Skip header
-            if line.strip():
-                # Skip ps aux and grep commands themselves
-                if "ps aux" in line or "grep" in line:
-                    continue
-
-                # Check if this is a zombie process (contains <defunct> or Z state)
-                if "<defunct>" in line or " Z " in line:
-                    continue
-
-                # Check if any search term appears in the process line
-                for term in search_terms:
-                    if term in line:
-                        process_running = True
-                        matching_processes.append(line.strip())
-                        break
-
-        if process_running:
-            return {
-                "status": "Running",
-                "container_running": True,
-                "process_running": True,
-            }
-        else:
-            return {
-                "status": "Process Stopped",
-                "container_running": True,
-                "process_running": False,
-            }
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if not readiness["ready"]:
+        live_log_streams[name].put(f"[{timestamp}] Process failed to start or crashed: {readiness['reason']}")
+        return {"success": False, "error": f"Process started but crashed immediately: {readiness['reason']}"}
 
-    except subprocess.CalledProcessError as e:
-        return {
-            "status": "Error",
-            "error": f"Failed to check process status: {e.stderr}",
-        }
-    except Exception as e:
-        return {"status": "Error", "error": str(e)}
+    live_log_streams[name].put(
+        f"[{timestamp}] Process started successfully ({readiness['reason']}, {readiness['elapsed']}s)"
+    )
+    return {"success": True, "message": "Process started successfully"}
 
 
 def start_process_in_container(name):
     """Start the main process inside an already running container with proper log streaming"""
     try:
         process_dir = os.path.join(ACTIVE_SERVERS_DIR, name)
-        os.chdir(process_dir)
+        if is_supervised(process_dir):
+            return start_supervised_process(name, process_dir)
 
-        # Get container ID
-        result = subprocess.run(
-            ["docker-compose", "ps", "-q", name],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        container_id = result.stdout.strip()
+        container_id = get_container_id(name, check=True)
 
         if not container_id:
             # Container not running, start it first
-            subprocess.run(["docker-compose", "up", "-d"], check=True)
-            # Wait for container to be ready
-            import time
-
-            time.sleep(2)
+            # `up -d` returns once the container is started, no extra wait needed
+            compose(name, "up", "-d", check=True)
 
             # Get new container ID
-            result = subprocess.run(
-                ["docker-compose", "ps", "-q", name],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-            container_id = result.stdout.strip()
+            container_id = get_container_id(name, check=True)
 
         # Get the main command from environment
-        result = subprocess.run(
+        result = run_command(
             [
                 "docker",
                 "inspect",
@@ -368,19 +213,22 @@ def start_process_in_container(name):
 
         # Clear the old log file and create a fresh one
         log_file = f"/tmp/{name}_process.log"
-        subprocess.run(
+        run_command(
             ["docker", "exec", container_id, "sh", "-c", f"> {log_file}"],
             capture_output=True,
             text=True,
         )
 
         # Create a wrapper script that logs both stdout and stderr
+        # The script runs as its own process group leader (see setsid below) and records
+        # the PGID so stop can signal the whole tree with a single exec
         wrapper_script = """#!/bin/bash
+cut -d' ' -f5 /proc/$$/stat > {pgid_file}
 cd /app
 which npm | tee -a {log_file} 2>&1 || echo "npm not found" | tee -a {log_file}
 which node | tee -a {log_file} 2>&1 || echo "node not found" | tee -a {log_file}
 exec {main_command} 2>&1 | tee -a {log_file}
-""".format(log_file=log_file, main_command=main_command)
+""".format(log_file=log_file, main_command=main_command, pgid_file=process_pgid_file(name))
 
         # First, create the script content in a temporary file and copy it to container
         wrapper_script.encode("utf-8")
@@ -391,7 +239,7 @@ exec {main_command} 2>&1 | tee -a {log_file}
 EOF
 chmod +x /tmp/start_process.sh"""
 
-        script_result = subprocess.run(
+        script_result = run_command(
             ["docker", "exec", container_id, "sh", "-c", script_creation_command],
             capture_output=True,
             text=True,
@@ -404,7 +252,7 @@ chmod +x /tmp/start_process.sh"""
             }
 
         # Verify the script was created successfully
-        verify_result = subprocess.run(
+        verify_result = run_command(
             ["docker", "exec", container_id, "test", "-f", "/tmp/start_process.sh"],
             capture_output=True,
             text=True,
@@ -416,18 +264,13 @@ chmod +x /tmp/start_process.sh"""
             }
 
         # Start the process using the wrapper script in background
-        result = subprocess.run(
-            ["docker", "exec", "-d", container_id, "/tmp/start_process.sh"],
+        result = run_command(
+            ["docker", "exec", "-d", container_id, "sh", "-c", START_IN_OWN_GROUP_COMMAND],
             capture_output=True,
             text=True,
         )
 
         if result.returncode == 0:
-            # Wait a moment and check if the process is actually running
-            import time
-
-            time.sleep(2)
-
             # Add a message to the live log stream to indicate process started
             from datetime import datetime
 
@@ -438,21 +281,26 @@ chmod +x /tmp/start_process.sh"""
                 f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Process start initiated"
             )
 
-            # Check if process started successfully
-            status_check = check_process_running_in_container(name)
+            # Wait until the process accepts connections or exits, instead of a fixed sleep
+            process = find_process_by_name(name)
+            readiness = wait_for_ready(
+                container_id,
+                port=get_process_port(process),
+                is_alive=lambda: check_process_running_in_container(name).get("process_running", False),
+            )
 
-            if status_check.get("process_running"):
+            if readiness["ready"]:
                 live_log_streams[name].put(
-                    f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Process started successfully"
+                    f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Process started successfully ({readiness['reason']}, {readiness['elapsed']}s)"
                 )
                 return {"success": True, "message": "Process started successfully"}
             else:
                 # Process failed to start or crashed immediately
                 live_log_streams[name].put(
-                    f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Process failed to start or crashed"
+                    f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Process failed to start or crashed: {readiness['reason']}"
                 )
                 # Get recent logs to see what went wrong
-                log_result = subprocess.run(
+                log_result = run_command(
                     [
                         "docker",
                         "exec",
@@ -488,299 +336,138 @@ chmod +x /tmp/start_process.sh"""
         return {"success": False, "error": str(e)}
 
 
-def kill_process_tree(pid, inside_container=False, container_id=None):
+def process_pgid_file(name):
+    """Path (inside the container) of the file holding the main process group ID"""
+    return f"/tmp/{name}_process.pgid"
+
+
+# Launch the wrapper in a new session so the main command and all of its children
+# share one process group, independent of the container's PID 1
+START_IN_OWN_GROUP_COMMAND = (
+    "if command -v setsid >/dev/null 2>&1; then exec setsid /tmp/start_process.sh; "
+    "else exec /tmp/start_process.sh; fi"
+)
+
+# Grace period between SIGTERM and SIGKILL when stopping a process group
+PROCESS_STOP_GRACE = int(os.getenv("PROCESS_STOP_GRACE", "10"))
+
+# Runs inside the container as a single exec. Signals the recorded process group with
+# SIGTERM, escalates to SIGKILL after the grace period, and falls back to matching
+# MAIN_COMMAND for processes started before PGIDs were recorded.
+STOP_PROCESS_GROUP_SCRIPT = textwrap.dedent(
     """
-    Kill a process and all its children.
-    If inside_container is True, kill processes inside the specified container using docker exec.
-    Otherwise, kill processes on the host (use with caution).
+    PGID_FILE="$1"
+    GRACE="$2"
+    INIT_PGID=$(cut -d' ' -f5 /proc/1/stat 2>/dev/null)
+    PGID=$(cat "$PGID_FILE" 2>/dev/null)
+    rm -f "$PGID_FILE"
+
+    if [ -n "$PGID" ] && [ "$PGID" != "$INIT_PGID" ] && kill -0 -"$PGID" 2>/dev/null; then
+        TARGETS="-$PGID"
+    else
+        TARGETS=""
+        for dir in /proc/[0-9]*; do
+            pid=${dir#/proc/}
+            [ "$pid" = 1 ] || [ "$pid" = $$ ] && continue
+            cmdline=$(tr '\000' ' ' < "$dir/cmdline" 2>/dev/null)
+            case "$cmdline" in
+                *start_process.sh*) TARGETS="$TARGETS $pid" ;;
+                *"$MAIN_COMMAND"*) [ -n "$MAIN_COMMAND" ] && TARGETS="$TARGETS $pid" ;;
+            esac
+        done
+    fi
+
+    if [ -z "$TARGETS" ]; then
+        echo "not-running"
+        exit 0
+    fi
+
+    # kill -0 with several targets fails as soon as one is gone; wait for all of them
+    any_alive() {
+        for target in $TARGETS; do
+            kill -0 "$target" 2>/dev/null && return 0
+        done
+        return 1
+    }
+
+    kill -TERM $TARGETS 2>/dev/null
+    waited=0
+    while any_alive; do
+        if [ "$waited" -ge $((GRACE * 5)) ]; then
+            kill -KILL $TARGETS 2>/dev/null
+            echo "killed"
+            exit 0
+        fi
+        sleep 0.2
+        waited=$((waited + 1))
+    done
+    echo "terminated"
     """
-    if inside_container and container_id:
-        try:
-            # Get child PIDs inside the container
-            ps_result = subprocess.run(
-                [
-                    "docker",
-                    "exec",
-                    container_id,
-                    "ps",
-                    "-o",
-                    "pid,ppid",
-                    "--no-headers",
-                ],
-                capture_output=True,
-                text=True,
-            )
-            if ps_result.returncode != 0:
-                return {
-                    "success": False,
-                    "message": "Failed to get process tree inside container.",
-                }
-            pid_map = {}
-            for line in ps_result.stdout.split("\n"):
-                parts = line.split()
-                if len(parts) == 2:
-                    pid_map[parts[0]] = parts[1]
-
-            # Find all children recursively
-            def get_children(target_pid):
-                children = [p for p, parent in pid_map.items() if parent == target_pid]
-                all_children = []
-                for child in children:
-                    all_children.append(child)
-                    all_children.extend(get_children(child))
-                return all_children
-
-            all_pids = [pid] + get_children(pid)
-            # Kill all processes inside the container
-            for p in all_pids:
-                subprocess.run(
-                    ["docker", "exec", container_id, "kill", "-TERM", p],
-                    capture_output=True,
-                    text=True,
-                )
-            return {
-                "success": True,
-                "message": f"Killed process tree for PID {pid} inside container.",
-            }
-        except Exception as e:
-            return {
-                "success": False,
-                "message": f"Failed to kill process tree inside container: {e}",
-            }
-    else:
-        # Host process tree kill (use with caution)
-        try:
-            parent = psutil.Process(pid)
-            children = parent.children(recursive=True)
-            for child in children:
-                child.kill()
-            parent.kill()
-            return {
-                "success": True,
-                "message": f"Process tree for PID {pid} killed on host.",
-            }
-        except Exception as e:
-            return {"success": False, "message": f"Failed to kill process tree: {e}"}
+)
+
 
+def stop_process_in_container(name, grace=None):
+    """
+    Stop the main process inside the container without stopping the container.
 
-def stop_process_in_container(name):
-    """Stop the main process inside the container without stopping the container"""
+    Sends one signal to the process group recorded by the start wrapper, escalating
+    SIGTERM to SIGKILL after the grace period, using a single docker exec.
+    """
+    grace = PROCESS_STOP_GRACE if grace is None else grace
     try:
         process_dir = os.path.join(ACTIVE_SERVERS_DIR, name)
-        os.chdir(process_dir)
+
+        if is_supervised(process_dir):
+            if not supervisor_alive(process_dir):
+                return {"success": True, "message": "Container not running"}
+            result = send_supervisor_command(
+                process_dir, "stop", wait_for={"stopped", "exited", "crashed"}, timeout=grace + 5
+            )
+            if not result["success"]:
+                return {"success": False, "error": result["error"]}
+            return {"success": True, "message": "Process stopped"}
 
         # Get container ID
-        result = subprocess.run(
-            ["docker-compose", "ps", "-q", name],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        container_id = result.stdout.strip()
+        container_id = get_container_id(name, check=True)
 
         if not container_id:
             return {"success": True, "message": "Container not running"}
 
-        # Get the main command from environment
-        result = subprocess.run(
+        result = run_command(
             [
                 "docker",
-                "inspect",
-                "--format",
-                "{{range .Config.Env}}{{println .}}{{end}}",
+                "exec",
                 container_id,
+                "sh",
+                "-c",
+                STOP_PROCESS_GROUP_SCRIPT,
+                "stop_process",
+                process_pgid_file(name),
+                str(grace),
             ],
             capture_output=True,
             text=True,
+            timeout=grace + 15,
         )
 
-        main_command = None
-        for line in result.stdout.split("\n"):
-            if line.startswith("MAIN_COMMAND="):
-                main_command = line.split("=", 1)[1].strip('"')
-                break
-
-        if not main_command:
+        if result.returncode != 0:
             return {
                 "success": False,
-                "error": "No MAIN_COMMAND found in container environment",
+                "error": f"Failed to stop process: {result.stderr.strip() or result.stdout.strip()}",
             }
 
-        # Get the process port for additional cleanup
-        process = find_process_by_name(name)
-        process_port = None
-        if process and hasattr(process, "port_id") and process.port_id:
-            process_port = 8000 + process.port_id
-
-        # Kill processes matching the main command
-        command_parts = main_command.split()
-
-        # Get process list
-        result = subprocess.run(
-            ["docker", "exec", container_id, "ps", "aux"],
-            capture_output=True,
-            text=True,
-        )
-
-        if result.returncode != 0:
-            return {"success": False, "error": "Failed to get process list"}
-
-        # Find and kill matching processes (including zombie cleanup)
-        processes_killed = 0
-        processes_to_kill = []
-        zombie_processes = []
-        port_processes = []
-
-        for line in result.stdout.split("\n")[1:]:  # Skip header
-            if line.strip():
-                # Extract PID (second column)
-                parts = line.split()
-                if len(parts) >= 2:
-                    pid = parts[1]
-                    # Check if this process matches our command
-                    if any(part in line for part in command_parts if len(part) > 2):
-                        if "<defunct>" in line or " Z " in line:
-                            zombie_processes.append((pid, line.strip()))
-                        else:
-                            processes_to_kill.append((pid, line.strip()))
-
-        # Also check for processes listening on the process port
-        if process_port:
-            try:
-                # Check for processes listening on the port using netstat
-                netstat_result = subprocess.run(
-                    ["docker", "exec", container_id, "netstat", "-tlnp"],
-                    capture_output=True,
-                    text=True,
-                )
-                if netstat_result.returncode == 0:
-                    for line in netstat_result.stdout.split("\n"):
-                        if f":{process_port}" in line and "LISTEN" in line:
-                            # Extract PID from netstat output (format: pid/program_name)
-                            parts = line.split()
-                            if len(parts) >= 7:
-                                pid_program = parts[6]
-                                if "/" in pid_program:
-                                    port_pid = pid_program.split("/")[0]
-                                    if port_pid.isdigit() and port_pid not in [
-                                        p[0] for p in processes_to_kill
-                                    ]:
-                                        port_processes.append(
-                                            (
-                                                port_pid,
-                                                f"Process listening on port {process_port}",
-                                            )
-                                        )
-                else:
-                    # Fallback: try using lsof if netstat fails
-                    lsof_result = subprocess.run(
-                        [
-                            "docker",
-                            "exec",
-                            container_id,
-                            "lsof",
-                            "-ti",
-                            f":{process_port}",
-                        ],
-                        capture_output=True,
-                        text=True,
-                    )
-                    if lsof_result.returncode == 0:
-                        for pid in lsof_result.stdout.strip().split("\n"):
-                            if pid.strip() and pid.strip().isdigit():
-                                if pid.strip() not in [p[0] for p in processes_to_kill]:
-                                    port_processes.append(
-                                        (
-                                            pid.strip(),
-                                            f"Process listening on port {process_port}",
-                                        )
-                                    )
-            except Exception:
-                pass
-
-        # Also check for processes listening on the process port (host OS)
-        if process_port:
-            try:
-                # Use netstat to find host processes listening on the port
-                netstat_result = subprocess.run(
-                    ["netstat", "-ano"], capture_output=True, text=True
-                )
-                if netstat_result.returncode == 0:
-                    for line in netstat_result.stdout.split("\n"):
-                        if f":{process_port} " in line and "LISTENING" in line:
-                            parts = line.split()
-                            if len(parts) >= 5:
-                                host_pid = parts[-1]
-                                if host_pid.isdigit():
-                                    # Try to kill the process
-                                    subprocess.run(
-                                        ["taskkill", "/PID", host_pid, "/F"],
-                                        capture_output=True,
-                                        text=True,
-                                    )
-            except Exception:
-                pass
-
-        # Kill active processes first
-        all_processes_to_kill = processes_to_kill + port_processes
-        for pid, process_description in all_processes_to_kill:
-            kill_result = kill_process_tree(
-                pid, inside_container=True, container_id=container_id
-            )
-            if kill_result.get("success"):
-                processes_killed += 1
-
-        # Clean up zombie processes (they're already dead, just need parent to reap them)
-        if zombie_processes:
-            # Try to find and signal their parent processes
-            for zombie_pid, zombie_line in zombie_processes:
-                # Zombies are already dead, they just need to be reaped by parent
-                # Let's try to get their parent PID and signal it
-                ppid_result = subprocess.run(
-                    [
-                        "docker",
-                        "exec",
-                        container_id,
-                        "ps",
-                        "-o",
-                        "pid,ppid",
-                        "--no-headers",
-                    ],
-                    capture_output=True,
-                    text=True,
-                )
-                if ppid_result.returncode == 0:
-                    for line in ppid_result.stdout.split("\n"):
-                        if line.strip() and zombie_pid in line.split():
-                            parts = line.split()
-                            if len(parts) >= 2 and parts[0] == zombie_pid:
-                                parent_pid = parts[1]
-                                # Send SIGCHLD to parent to force reaping
-                                subprocess.run(
-                                    [
-                                        "docker",
-                                        "exec",
-                                        container_id,
-                                        "kill",
-                                        "-CHLD",
-                                        parent_pid,
-                                    ],
-                                    capture_output=True,
-                                    text=True,
-                                )
-
-        if processes_killed > 0 or zombie_processes:
-            message = f"Stopped {processes_killed} process(es)"
-            if len(port_processes) > 0:
-                message += (
-                    f" (including {len(port_processes)} port-listening process(es))"
-                )
-            if zombie_processes:
-                message += f" and cleaned {len(zombie_processes)} zombie process(es)"
-            return {"success": True, "message": message}
-        else:
-            return {"success": True, "message": "No matching processes found to stop"}
+        outcome = result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ""
+        if outcome == "terminated":
+            return {"success": True, "message": "Process stopped"}
+        if outcome == "killed":
+            return {
+                "success": True,
+                "message": f"Process did not exit within {grace}s and was killed",
+            }
+        return {"success": True, "message": "No matching processes found to stop"}
 
+    except subprocess.TimeoutExpired:
+        return {"success": False, "error": "Timed out while stopping process"}
     except subprocess.CalledProcessError as e:
         return {"success": False, "error": f"Failed to stop process: {e.stderr}"}
     except Exception as e:
@@ -789,43 +476,7 @@ def stop_process_in_container(name):
 
 def is_always_running_container(name):
     """Check if this is an always-running container (has MAIN_COMMAND environment variable)"""
-    try:
-        process_dir = os.path.join(ACTIVE_SERVERS_DIR, name)
-        os.chdir(process_dir)
-
-        # Get container ID
-        result = subprocess.run(
-            ["docker-compose", "ps", "-q", name],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        container_id = result.stdout.strip()
-
-        if not container_id:
-            return False
-
-        # Check for MAIN_COMMAND in environment
-        result = subprocess.run(
-            [
-                "docker",
-                "inspect",
-                "--format",
-                "{{range .Config.Env}}{{println .}}{{end}}",
-                container_id,
-            ],
-            capture_output=True,
-            text=True,
-        )
-
-        for line in result.stdout.split("\n"):
-            if line.startswith("MAIN_COMMAND="):
-                return True
-
-        return False
-
-    except Exception:
-        return False
+    return status_engine.is_always_running(name)
 
 
 def generate_reset_email_body(reset_url):
@@ -936,7 +587,7 @@ def _send_command_to_minecraft_console(container_id, process_name, command, time
         """
     )
 
-    result = subprocess.run(
+    result = run_command(
         ["docker", "exec", container_id, "/bin/sh", "-c", shell_script],
         capture_output=True,
         text=True,
@@ -972,23 +623,13 @@ def _send_command_to_minecraft_console(container_id, process_name, command, time
 def execute_command_in_container(name, command, working_dir="/app", timeout=30):
     """Execute a command inside the container and return the result"""
     try:
-        process_dir = os.path.join(ACTIVE_SERVERS_DIR, name)
-        os.chdir(process_dir)
-
-        # Get container ID
-        result = subprocess.run(
-            ["docker-compose", "ps", "-q", name],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        container_id = result.stdout.strip()
+        container_id = get_container_id(name, check=True)
 
         if not container_id:
             return {"success": False, "error": "Container is not running"}
 
         # Check if container is actually running
-        result = subprocess.run(
+        result = run_command(
             ["docker", "inspect", "--format", "{{.State.Status}}", container_id],
             capture_output=True,
             text=True,
@@ -1020,7 +661,7 @@ def execute_command_in_container(name, command, working_dir="/app", timeout=30):
             f"echo \"[$(date -u +'%Y-%m-%d %H:%M:%S')] $line\" >> {log_file}; "
             f"done"
         )
-        result = subprocess.run(
+        result = run_command(
             ["docker", "exec", container_id, "sh", "-c", full_command],
             capture_output=True,
             text=True,
@@ -1055,17 +696,7 @@ def execute_command_in_container(name, command, working_dir="/app", timeout=30):
 def execute_interactive_command_in_container(name, command, working_dir="/app"):
     """Execute an interactive command inside the container (returns process handle for real-time interaction)"""
     try:
-        process_dir = os.path.join(ACTIVE_SERVERS_DIR, name)
-        os.chdir(process_dir)
-
-        # Get container ID
-        result = subprocess.run(
-            ["docker-compose", "ps", "-q", name],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        container_id = result.stdout.strip()
+        container_id = get_container_id(name, check=True)
 
         if not container_id:
             return {
@@ -1075,7 +706,7 @@ def execute_interactive_command_in_container(name, command, working_dir="/app"):
             }
 
         # Check if container is actually running
-        result = subprocess.run(
+        result = run_command(
             ["docker", "inspect", "--format", "{{.State.Status}}", container_id],
             capture_output=True,
             text=True,
@@ -1092,7 +723,7 @@ def execute_interactive_command_in_container(name, command, working_dir="/app"):
         full_command = f"cd {working_dir} && {command}"
 
         # Start the process in interactive mode
-        process = subprocess.Popen(
+        process = popen_command(
             ["docker", "exec", "-it", container_id, "sh", "-c", full_command],
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
@@ -1532,16 +1163,12 @@ def check_domain_uniqueness(domain, current_process_name=None):
     if not domain:
         return {"unique": True, "conflicts": []}
 
-    with current_app.app_context():
-        from models.process import Process
-
-        # Query all processes with this domain
-        processes = Process.query.filter(Process.domain == domain).all()
+    processes = process_registry.by_domain(domain)
 
-        # Filter out current process if specified
-        conflicts = [p.name for p in processes if p.name != current_process_name]
+    # Filter out current process if specified
+    conflicts = [p.name for p in processes if p.name != current_process_name]
 
-        return {"unique": len(conflicts) == 0, "conflicts": conflicts}
+    return {"unique": len(conflicts) == 0, "conflicts": conflicts}
 
 
 def get_domain_status(domain, process_name=None):
@@ -0,0 +1,258 @@
+"""
+Activity log retention and archive.
+
+``activity_logs`` is partitioned by month (RANGE COLUMNS on timestamp, see
+migrations/versions/partition_activity_logs.py, or :func:`partition_new_table`
+when ``db.create_all()`` creates it), with a catch-all ``pmax`` partition at
+the end. The retention job keeps the hot table at roughly
+ACTIVITY_LOG_RETENTION_MONTHS months:
+
+- empty partitions are split off ``pmax`` ahead of time, so rows always
+  land in their own month
+- partitions older than the retention window are exported to
+  ``<ACTIVITY_LOG_ARCHIVE_DIR>/activity-YYYY-MM.jsonl.gz`` (unless
+  ACTIVITY_LOG_ARCHIVE=drop) and then dropped, which is a metadata
+  operation instead of a large DELETE
+
+:func:`read_archive` reads archived months back for the activity page.
+"""
+
+import gzip
+import heapq
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, datetime
+from typing import Iterator, List, Optional
+
+from sqlalchemy import text
+
+from db import db
+from utils.db_budget import background_engine
+
+ACTIVITY_LOG_RETENTION_MONTHS = int(os.getenv("ACTIVITY_LOG_RETENTION_MONTHS", "6"))
+ACTIVITY_LOG_ARCHIVE_DIR = os.getenv("ACTIVITY_LOG_ARCHIVE_DIR", "/var/lib/server-manager/activity-archive")
+# export: write old partitions to the archive before dropping them; drop: just drop
+ACTIVITY_LOG_ARCHIVE = os.getenv("ACTIVITY_LOG_ARCHIVE", "export")
+# Seconds between retention runs
+ACTIVITY_LOG_RETENTION_INTERVAL = int(os.getenv("ACTIVITY_LOG_RETENTION_INTERVAL", "86400"))
+
+# Empty monthly partitions kept ahead of the current month
+MONTHS_AHEAD = 2
+
+PARTITION_NAME = re.compile(r"^p(\d{4})(\d{2})$")
+
+ARCHIVE_COLUMNS = ("id", "user_id", "username", "action", "target", "details", "ip_address", "user_agent", "timestamp")
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _month_of(name: str) -> Optional[date]:
+    match = PARTITION_NAME.match(name or "")
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def archive_path(month: date) -> str:
+    return os.path.join(ACTIVITY_LOG_ARCHIVE_DIR, f"activity-{month:%Y-%m}.jsonl.gz")
+
+
+def _month_clauses(first: date, last: date) -> List[str]:
+    """Partition clauses for the months first..last followed by pmax."""
+    clauses = []
+    month = first
+    while month <= last:
+        clauses.append(f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{_add_months(month, 1):%Y-%m-%d}')")
+        month = _add_months(month, 1)
+    clauses.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    return clauses
+
+
+def partition_new_table(connection):
+    """
+    Partition a freshly created, empty activity_logs table by month, as the
+    partition_activity_logs migration does for existing installs.
+    """
+    current = date.today().replace(day=1)
+    clauses = _month_clauses(current, _add_months(current, MONTHS_AHEAD))
+    connection.execute(text("ALTER TABLE activity_logs DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)"))
+    connection.execute(text(f"ALTER TABLE activity_logs PARTITION BY RANGE COLUMNS(timestamp) ({', '.join(clauses)})"))
+
+
+def list_partitions() -> List[dict]:
+    """Partitions of activity_logs with their month (None for pmax) and row estimate."""
+    rows = db.session.execute(text(
+        "SELECT PARTITION_NAME, TABLE_ROWS FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'activity_logs' "
+        "AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION"
+    )).all()
+    return [{"name": name, "month": _month_of(name), "rows": table_rows} for name, table_rows in rows]
+
+
+def ensure_future_partitions(partitions: List[dict]) -> List[str]:
+    """Split monthly partitions off pmax up to MONTHS_AHEAD months from now."""
+    months = [p["month"] for p in partitions if p["month"]]
+    if not months or not any(p["name"] == "pmax" for p in partitions):
+        return []
+
+    first = _add_months(max(months), 1)
+    last = _add_months(date.today().replace(day=1), MONTHS_AHEAD)
+    if first > last:
+        return []
+    clauses = _month_clauses(first, last)
+    db.session.execute(text(f"ALTER TABLE activity_logs REORGANIZE PARTITION pmax INTO ({', '.join(clauses)})"))
+    return [clause.split()[1] for clause in clauses[:-1]]
+
+
+def export_partition(name: str, month: date) -> int:
+    """
+    Write the rows of one partition to its gzip JSONL archive.
+
+    The file is written under a temporary name and renamed when complete, so
+    a crash never leaves a truncated archive behind. A partition holds the
+    whole month, so a rerun after a failed drop simply rewrites the file.
+
+    Returns:
+        Number of exported rows
+    """
+    os.makedirs(ACTIVITY_LOG_ARCHIVE_DIR, exist_ok=True)
+    path = archive_path(month)
+    tmp_path = f"{path}.tmp"
+    count = 0
+
+    columns = ", ".join(ARCHIVE_COLUMNS)
+    with background_engine().connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(
+            text(f"SELECT {columns} FROM activity_logs PARTITION ({name}) ORDER BY timestamp, id")
+        )
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as archive:
+            for row in result:
+                entry = dict(row._mapping)
+                entry["timestamp"] = entry["timestamp"].isoformat()
+                archive.write(json.dumps(entry) + "\n")
+                count += 1
+
+    os.replace(tmp_path, path)
+    return count
+
+
+def run_retention(mode: str = ACTIVITY_LOG_ARCHIVE, months: int = ACTIVITY_LOG_RETENTION_MONTHS) -> dict:
+    """
+    Add upcoming partitions and archive/drop the expired ones.
+
+    Returns:
+        dict with 'success', 'added', 'archived' ({partition: rows}) and
+        'dropped', or 'success': False and 'error'
+    """
+    try:
+        partitions = list_partitions()
+        if not partitions:
+            return {"success": False, "error": "activity_logs is not partitioned, run the migrations first"}
+
+        added = ensure_future_partitions(partitions)
+
+        cutoff = _add_months(date.today().replace(day=1), -months)
+        archived = {}
+        dropped = []
+        for partition in partitions:
+            month = partition["month"]
+            if month is None or month >= cutoff:
+                continue
+            if mode == "export":
+                archived[partition["name"]] = export_partition(partition["name"], month)
+            db.session.execute(text(f"ALTER TABLE activity_logs DROP PARTITION {partition['name']}"))
+            dropped.append(partition["name"])
+
+        if added or dropped:
+            print(f"[activity-retention] Added {added}, dropped {dropped}")
+        return {"success": True, "added": added, "archived": archived, "dropped": dropped}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def start_retention_job(app):
+    """
+    Run the retention job periodically in a background thread (one worker).
+    Nothing runs while activity_logs is not partitioned.
+    """
+    def loop():
+        while True:
+            with app.app_context():
+                if not list_partitions():
+                    print("[activity-retention] activity_logs is not partitioned, retention disabled until 'flask db upgrade' ran")
+                    return
+                result = run_retention()
+                if not result["success"]:
+                    print(f"[activity-retention] {result['error']}")
+            time.sleep(ACTIVITY_LOG_RETENTION_INTERVAL)
+
+    threading.Thread(target=loop, daemon=True).start()
+
+
+def archived_months() -> List[str]:
+    """Months (YYYY-MM) that have an archive file."""
+    if not os.path.isdir(ACTIVITY_LOG_ARCHIVE_DIR):
+        return []
+    months = []
+    for filename in os.listdir(ACTIVITY_LOG_ARCHIVE_DIR):
+        match = re.match(r"^activity-(\d{4}-\d{2})\.jsonl\.gz$", filename)
+        if match:
+            months.append(match.group(1))
+    return sorted(months)
+
+
+def _iter_month(month: date) -> Iterator[dict]:
+    path = archive_path(month)
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        for line in archive:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_archive(
+    start: datetime,
+    end: datetime,
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    username: Optional[str] = None,
+    limit: int = 500,
+) -> List[dict]:
+    """
+    Archived entries in [start, end), newest first.
+
+    Args:
+        start: Inclusive lower bound
+        end: Exclusive upper bound
+        user_id: Only entries of this user
+        action: Only this action
+        username: Username prefix
+        limit: Maximum number of entries returned
+
+    Returns:
+        list of entries shaped like ActivityLog.to_dict()
+    """
+    def matching():
+        month = start.date().replace(day=1)
+        while datetime.combine(month, datetime.min.time()) < end:
+            for entry in _iter_month(month):
+                timestamp = datetime.fromisoformat(entry["timestamp"])
+                if not start <= timestamp < end:
+                    continue
+                if user_id is not None and entry.get("user_id") != user_id:
+                    continue
+                if action and entry.get("action") != action:
+                    continue
+                if username and not (entry.get("username") or "").startswith(username):
+                    continue
+                entry.pop("user_agent", None)
+                yield entry
+            month = _add_months(month, 1)
+
+    # Only `limit` entries are kept in memory, however large the range
+    return heapq.nlargest(limit, matching(), key=lambda entry: (entry["timestamp"], entry["id"]))
@@ -0,0 +1,342 @@
+"""
+Asynchronous, batched activity log writer.
+
+``ActivityLog.log_activity`` used to add and commit a row inside the
+request, which cost a round-trip and a transaction per start, stop, upload
+or edit, and committed whatever else was pending in the request session.
+Entries are now queued and written by a background writer in multi-row
+INSERTs, every ACTIVITY_LOG_FLUSH_INTERVAL seconds or as soon as
+ACTIVITY_LOG_BATCH_SIZE entries are waiting.
+
+With Redis the queue is the list ``activity_logs:queue``, so entries outlive
+the worker that produced them. A writer claims a batch by moving it to its
+own in-flight list in one Lua call and deletes that list once the INSERT
+committed; in-flight lists of workers that died on this host are pushed back
+onto the queue. Delivery is at least once: a worker killed between the
+INSERT and the delete can cause a batch to be written twice.
+
+Without Redis entries are buffered in the worker and flushed on exit.
+
+Entries are cut to the column lengths when they are queued. A batch that
+still fails ACTIVITY_LOG_MAX_ATTEMPTS times in a row is written row by row,
+and rows the database rejects are moved to the dead-letter list
+``activity_logs:dead`` (or dropped with a log line without Redis), so one
+bad entry can't hold up the queue.
+
+Each batch also bumps the daily counters in ``activity_rollups`` within the
+same transaction (see :func:`rollup_counts`). A batch written twice is
+counted twice as well.
+"""
+
+import atexit
+import collections
+import functools
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+
+from utils.redis_client import get_redis
+
+ACTIVITY_LOG_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_LOG_FLUSH_INTERVAL", "0.5"))
+ACTIVITY_LOG_BATCH_SIZE = int(os.getenv("ACTIVITY_LOG_BATCH_SIZE", "200"))
+# Failed attempts at a batch before it is written row by row
+ACTIVITY_LOG_MAX_ATTEMPTS = int(os.getenv("ACTIVITY_LOG_MAX_ATTEMPTS", "3"))
+
+REDIS_QUEUE_KEY = "activity_logs:queue"
+REDIS_INFLIGHT_PREFIX = "activity_logs:inflight"
+REDIS_DEAD_LETTER_KEY = "activity_logs:dead"
+
+# Rejected entries kept in the dead-letter list
+DEAD_LETTER_MAX = 1000
+
+# Seconds between scans for in-flight batches of dead workers
+RECOVERY_INTERVAL = 60
+
+# Atomically move up to ARGV[1] entries from the queue to the in-flight list
+CLAIM_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #items > 0 then
+    redis.call('LTRIM', KEYS[1], #items, -1)
+    redis.call('RPUSH', KEYS[2], unpack(items))
+end
+return items
+"""
+
+# Push an in-flight list back onto the queue
+REQUEUE_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, -1)
+if #items > 0 then
+    redis.call('RPUSH', KEYS[2], unpack(items))
+end
+redis.call('DEL', KEYS[1])
+return #items
+"""
+
+
+def rollup_counts(rows: list) -> list:
+    """Aggregate inserted rows into activity_rollups rows (one per day, action, user, target)."""
+    counts = {}
+    for row in rows:
+        key = (row["timestamp"].date(), row["action"], row["user_id"], row.get("target") or "")
+        if key in counts:
+            counts[key]["count"] += 1
+            counts[key]["username"] = row["username"]
+        else:
+            counts[key] = {
+                "day": key[0],
+                "action": key[1],
+                "user_id": key[2],
+                "target": key[3][:255],
+                "username": row["username"],
+                "count": 1,
+            }
+    return list(counts.values())
+
+
+@functools.lru_cache(maxsize=None)
+def _column_lengths() -> dict:
+    from models.activity_log import ActivityLog
+
+    return {
+        column.name: column.type.length
+        for column in ActivityLog.__table__.columns
+        if getattr(column.type, "length", None)
+    }
+
+
+def fit_columns(entry: dict) -> dict:
+    """Cut string values to the length of their activity_logs column."""
+    for name, length in _column_lengths().items():
+        value = entry.get(name)
+        if isinstance(value, str) and len(value) > length:
+            entry[name] = value[:length]
+    return entry
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ActivityLogWriter:
+    """Queues activity log entries and writes them in batches."""
+
+    def __init__(self):
+        self._local = collections.deque()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._app = None
+        self._pid = None
+        self._recovered_at = 0.0
+        self._attempts = 0
+        self._stats = {"queued": 0, "written": 0, "batches": 0, "failures": 0, "dead_lettered": 0}
+
+    @property
+    def _inflight_key(self) -> str:
+        return f"{REDIS_INFLIGHT_PREFIX}:{socket.gethostname()}:{os.getpid()}"
+
+    def _ensure_started(self, app):
+        # Started lazily in every worker: threads don't survive gunicorn's fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._app = app
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, daemon=True).start()
+            atexit.register(self.flush)
+
+    def enqueue(self, entry: dict, app):
+        """
+        Queue one entry (column values of ActivityLog, timestamp as ISO string).
+
+        Args:
+            entry: Row to insert
+            app: Flask app the writer uses for its database connection
+        """
+        self._ensure_started(app)
+        payload = json.dumps(fit_columns(entry))
+        self._stats["queued"] += 1
+
+        client = get_redis()
+        if client is not None:
+            try:
+                if client.rpush(REDIS_QUEUE_KEY, payload) >= ACTIVITY_LOG_BATCH_SIZE:
+                    self._wake.set()
+                return
+            except Exception as e:
+                print(f"[activity-log] Redis queue unavailable, buffering locally: {e}")
+
+        self._local.append(payload)
+        if len(self._local) >= ACTIVITY_LOG_BATCH_SIZE:
+            self._wake.set()
+
+    # Writing
+
+    def _insert(self, payloads: list):
+        from sqlalchemy.dialects.mysql import insert
+        from models.activity_log import ActivityLog
+        from models.activity_rollup import ActivityRollup
+        from utils.db_budget import background_engine
+
+        rows = []
+        for payload in payloads:
+            entry = json.loads(payload)
+            entry["timestamp"] = datetime.fromisoformat(entry["timestamp"])
+            rows.append(entry)
+
+        # Own connection (from the background pool) and transaction, independent of any request session
+        with self._app.app_context():
+            with background_engine().begin() as connection:
+                connection.execute(ActivityLog.__table__.insert(), rows)
+                upsert = insert(ActivityRollup.__table__)
+                connection.execute(upsert.on_duplicate_key_update(
+                    count=ActivityRollup.__table__.c.count + upsert.inserted.count,
+                    username=upsert.inserted.username,
+                ), rollup_counts(rows))
+
+        self._stats["written"] += len(rows)
+        self._stats["batches"] += 1
+
+    def _dead_letter(self, payload: str, error: Exception):
+        self._stats["dead_lettered"] += 1
+        client = get_redis()
+        if client is not None:
+            try:
+                client.lpush(REDIS_DEAD_LETTER_KEY, json.dumps({
+                    "entry": payload,
+                    "error": str(error)[:500],
+                    "failed_at": datetime.utcnow().isoformat(),
+                }))
+                client.ltrim(REDIS_DEAD_LETTER_KEY, 0, DEAD_LETTER_MAX - 1)
+                print(f"[activity-log] Moved rejected entry to {REDIS_DEAD_LETTER_KEY}: {error}")
+                return
+            except Exception:
+                pass
+        print(f"[activity-log] Dropped rejected entry {payload[:200]}: {error}")
+
+    def _write(self, batch: list, forget):
+        """
+        Insert a batch, isolating rejected rows once it failed too often.
+
+        Args:
+            batch: Queued payloads
+            forget: Called with each payload that is done (written or
+                dead-lettered) while the batch is written row by row
+        """
+        from sqlalchemy.exc import InterfaceError, OperationalError
+
+        try:
+            self._insert(batch)
+            self._attempts = 0
+            return
+        except Exception:
+            self._attempts += 1
+            if self._attempts < ACTIVITY_LOG_MAX_ATTEMPTS:
+                raise
+
+        print(f"[activity-log] Batch failed {self._attempts} times, writing its {len(batch)} entries one by one")
+        for payload in batch:
+            try:
+                self._insert([payload])
+            except (OperationalError, InterfaceError):
+                # The database is unreachable, the row may be fine: retry later
+                raise
+            except Exception as e:
+                self._dead_letter(payload, e)
+            forget(payload)
+        self._attempts = 0
+
+    def _flush_redis(self, client) -> int:
+        # Retry a batch left over from a failed INSERT first
+        batch = client.lrange(self._inflight_key, 0, -1)
+        if not batch:
+            batch = client.eval(CLAIM_SCRIPT, 2, REDIS_QUEUE_KEY, self._inflight_key, ACTIVITY_LOG_BATCH_SIZE)
+        if not batch:
+            return 0
+        self._write(batch, lambda payload: client.lrem(self._inflight_key, 1, payload))
+        client.delete(self._inflight_key)
+        return len(batch)
+
+    def _flush_local(self) -> int:
+        batch = []
+        while self._local and len(batch) < ACTIVITY_LOG_BATCH_SIZE:
+            batch.append(self._local.popleft())
+        if not batch:
+            return 0
+        pending = list(batch)
+        try:
+            self._write(batch, pending.remove)
+        except Exception:
+            self._local.extendleft(reversed(pending))
+            raise
+        return len(batch)
+
+    def flush_once(self) -> int:
+        """Write one batch; returns the number of entries written."""
+        if self._local:
+            return self._flush_local()
+        client = get_redis()
+        if client is None:
+            return 0
+        return self._flush_redis(client)
+
+    def flush(self):
+        """Write everything queued (called at exit)."""
+        try:
+            while self.flush_once():
+                pass
+        except Exception as e:
+            print(f"[activity-log] Final flush failed: {e}")
+
+    def _recover(self, client):
+        """Requeue in-flight batches of dead workers on this host."""
+        prefix = f"{REDIS_INFLIGHT_PREFIX}:{socket.gethostname()}:"
+        for key in client.scan_iter(match=f"{prefix}*"):
+            try:
+                pid = int(key[len(prefix):])
+            except ValueError:
+                continue
+            if pid != os.getpid() and not _pid_alive(pid):
+                count = client.eval(REQUEUE_SCRIPT, 2, key, REDIS_QUEUE_KEY)
+                if count:
+                    print(f"[activity-log] Requeued {count} entries of stopped worker {pid}")
+
+    def _run(self):
+        while True:
+            self._wake.wait(ACTIVITY_LOG_FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                client = get_redis()
+                if client is not None and time.monotonic() - self._recovered_at >= RECOVERY_INTERVAL:
+                    self._recovered_at = time.monotonic()
+                    self._recover(client)
+                while self.flush_once() >= ACTIVITY_LOG_BATCH_SIZE:
+                    pass
+            except Exception as e:
+                self._stats["failures"] += 1
+                print(f"[activity-log] Flush failed, retrying: {e}")
+                time.sleep(min(ACTIVITY_LOG_FLUSH_INTERVAL * 10, 30))
+
+    def metrics(self) -> dict:
+        metrics = dict(self._stats, local_buffer=len(self._local))
+        client = get_redis()
+        if client is not None:
+            try:
+                metrics["redis_queue"] = client.llen(REDIS_QUEUE_KEY)
+                metrics["dead_letter"] = client.llen(REDIS_DEAD_LETTER_KEY)
+            except Exception:
+                pass
+        return metrics
+
+
+activity_writer = ActivityLogWriter()
@@ -0,0 +1,564 @@
+"""
+Two-tier cache: a small per-worker LRU (L1) in front of Redis (L2).
+
+Replaces the Flask-Caching based ``timed_cache``/``memoize_with_user``,
+which built keys from ``str(args)``, could not cache falsy results and let
+every request that found a cold key recompute it.
+
+- Keys are built by :func:`typed_key` (type-tagged, so ``1`` and ``"1"``
+  differ) or by a ``key`` function per cache.
+- Any value is cached, including ``0``, ``[]`` and ``False``. ``None``
+  results are negative entries kept for ``negative_ttl`` seconds.
+- Stampedes: a worker recomputes a warm entry early with a probability that
+  grows towards its expiry (probabilistic early expiration, weighted by how
+  long the value took to compute), so it rarely expires for everyone at
+  once. A cold key is computed once per worker, and across workers by
+  whoever holds a short Redis lock while the others wait for its result.
+- Tags: entries carry tags (e.g. ``process:<name>``, ``owner:<id>``);
+  :func:`invalidate_tags` makes every entry with one of them stale in all
+  caches and all workers. L2 checks a version counter per tag, L1 entries
+  are dropped through pub/sub.
+- :func:`cache_metrics` reports hits and misses per cache.
+
+Values are stored in Redis as JSON; values that are not JSON serializable
+are kept in L1 only. Without Redis the cache is per worker, and L1 is not
+used while Redis is up but the invalidation channel is not subscribed, so a
+worker never serves an entry another worker invalidated.
+"""
+
+import collections
+import functools
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from utils.redis_client import get_pubsub, get_redis
+
+CACHE_L1_SIZE = int(os.getenv("CACHE_L1_SIZE", "256"))
+# Upper bound for how long an entry lives in L1
+CACHE_L1_TTL = float(os.getenv("CACHE_L1_TTL", "30"))
+
+REDIS_PREFIX = "cache"
+REDIS_CHANNEL = "cache:invalidate"
+
+# Longer keys are hashed
+MAX_KEY_LENGTH = 200
+
+# Seconds before retrying the subscription after it failed
+RESUBSCRIBE_INTERVAL = 30
+
+# Seconds between checks for a result while another worker computes it
+LOCK_POLL_INTERVAL = 0.05
+
+_caches = {}
+_local_tag_versions = collections.defaultdict(int)
+_tag_callbacks = []
+
+
+def typed_key(*args, **kwargs) -> str:
+    """
+    Cache key of call arguments.
+
+    Only str, int, float, bool, None and tuples/lists of them are accepted;
+    pass a ``key`` function to the cache for anything else.
+
+    Example:
+        typed_key("web", 3) == "s:web|i:3"
+    """
+    def part(value) -> str:
+        if value is None:
+            return "n"
+        if isinstance(value, bool):
+            return f"b:{int(value)}"
+        if isinstance(value, int):
+            return f"i:{value}"
+        if isinstance(value, float):
+            return f"f:{value!r}"
+        if isinstance(value, str):
+            return "s:" + value.replace("\\", "\\\\").replace("|", "\\|")
+        if isinstance(value, (tuple, list)):
+            return "(" + ",".join(part(item) for item in value) + ")"
+        raise TypeError(f"Can't build a cache key from {type(value).__name__}, pass key=")
+
+    parts = [part(arg) for arg in args]
+    parts.extend(f"{name}={part(value)}" for name, value in sorted(kwargs.items()))
+    return "|".join(parts)
+
+
+def _tag_key(tag: str) -> str:
+    return f"{REDIS_PREFIX}:tag:{tag}"
+
+
+def _publish(message: dict):
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.publish(REDIS_CHANNEL, json.dumps(message))
+    except Exception as e:
+        print(f"[cache] Could not publish invalidation: {e}")
+
+
+def on_invalidate(callback: Callable):
+    """
+    Call callback(tags) whenever tags are invalidated, in this or another
+    worker, so state outside the caches can follow. tags is None when
+    invalidations may have been missed (subscription started or lost).
+    Call :func:`ensure_subscribed` where the state is read to receive
+    invalidations from other workers.
+    """
+    _tag_callbacks.append(callback)
+
+
+def _notify(tags: Optional[list]):
+    for callback in _tag_callbacks:
+        try:
+            callback(tags)
+        except Exception as e:
+            print(f"[cache] Invalidation callback failed: {e}")
+
+
+def ensure_subscribed() -> bool:
+    """Subscribe this worker to invalidations; False when it can't (see module docstring)."""
+    return get_redis() is None or _listener.listening()
+
+
+def invalidate_tags(*tags: str):
+    """Make every cached entry with one of these tags stale, in all workers."""
+    tags = [tag for tag in tags if tag]
+    if not tags:
+        return
+    for tag in tags:
+        _local_tag_versions[tag] += 1
+    client = get_redis()
+    if client is not None:
+        try:
+            pipeline = client.pipeline(transaction=False)
+            for tag in tags:
+                pipeline.incr(_tag_key(tag))
+            pipeline.execute()
+        except Exception as e:
+            print(f"[cache] Could not invalidate tags {tags}: {e}")
+    for cache in list(_caches.values()):
+        cache._drop_local(tags=tags)
+    _notify(tags)
+    _publish({"tags": tags})
+
+
+class _InvalidationListener:
+    """Applies invalidations published by other workers to this worker's L1."""
+
+    def __init__(self):
+        self._pid = None
+        self._failed_at = 0.0
+        self._lock = threading.Lock()
+
+    def _listen(self, pubsub, pid):
+        try:
+            for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    data = json.loads(message["data"])
+                except ValueError:
+                    continue
+                if data.get("cache") in _caches:
+                    _caches[data["cache"]]._drop_local(keys=data.get("keys"))
+                elif data.get("tags"):
+                    for cache in list(_caches.values()):
+                        cache._drop_local(tags=data["tags"])
+                    _notify(data["tags"])
+        except Exception as e:
+            print(f"[cache] Invalidation channel lost, bypassing L1: {e}")
+        with self._lock:
+            if self._pid == pid:
+                self._pid = None
+                self._failed_at = time.monotonic()
+                # Anything could have been invalidated in the meantime
+                for cache in list(_caches.values()):
+                    cache._drop_local()
+                _notify(None)
+
+    def listening(self) -> bool:
+        """Subscribe in this worker if needed; False when L1 can't be trusted."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return True
+        if self._failed_at and time.monotonic() - self._failed_at < RESUBSCRIBE_INTERVAL:
+            return False
+        with self._lock:
+            if self._pid == pid:
+                return True
+            pubsub = get_pubsub()
+            if pubsub is None:
+                self._failed_at = time.monotonic()
+                return False
+            try:
+                pubsub.subscribe(REDIS_CHANNEL)
+            except Exception as e:
+                print(f"[cache] Could not subscribe, bypassing L1: {e}")
+                self._failed_at = time.monotonic()
+                return False
+            # Entries inherited over fork or cached while unsubscribed may be stale
+            for cache in list(_caches.values()):
+                cache._drop_local()
+            _notify(None)
+            self._pid = pid
+            threading.Thread(target=self._listen, args=(pubsub, pid), daemon=True).start()
+            return True
+
+
+_listener = _InvalidationListener()
+
+
+class TieredCache:
+    """
+    One named cache with its own TTLs and metrics.
+
+    Example:
+        cache = TieredCache("server_stats", ttl=5)
+        stats = cache.get_or_compute("all", compute_stats)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float = 60,
+        negative_ttl: Optional[float] = None,
+        l1_size: int = CACHE_L1_SIZE,
+        l1_ttl: float = CACHE_L1_TTL,
+        beta: float = 1.0,
+        lock_timeout: float = 5.0,
+    ):
+        """
+        Args:
+            name: Unique name, part of the Redis keys
+            ttl: Seconds an entry is valid
+            negative_ttl: Seconds a None result is cached (default: ttl, max 10), 0 to not cache None
+            l1_size: Entries kept in this worker's LRU
+            l1_ttl: Upper bound for the age of L1 entries
+            beta: Eagerness of early recomputation (0 disables it)
+            lock_timeout: Seconds to wait for another worker computing a cold key
+        """
+        if name in _caches:
+            raise ValueError(f"Cache '{name}' already exists")
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = min(ttl, 10) if negative_ttl is None else negative_ttl
+        self.l1_size = l1_size
+        self.l1_ttl = l1_ttl
+        self.beta = beta
+        self.lock_timeout = lock_timeout
+        self._l1 = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        # Bumped on every local invalidation, so a result read or computed
+        # before an invalidation is not put into L1 after it
+        self._epoch = 0
+        self._stats = collections.Counter()
+        _caches[name] = self
+
+    # Keys and entries
+
+    def _redis_key(self, key: str) -> str:
+        if len(key) > MAX_KEY_LENGTH:
+            key = hashlib.sha1(key.encode()).hexdigest()
+        return f"{REDIS_PREFIX}:{self.name}:{key}"
+
+    def _tags(self, tags: Iterable[str]) -> list:
+        # Every entry also carries the cache's own tag, which clear() bumps
+        return [f"cache:{self.name}", *tags]
+
+    def _fresh(self, entry: dict, versions: dict) -> bool:
+        """Not expired (early for some callers) and none of its tags invalidated."""
+        if any(entry["t"].get(tag, 0) != version for tag, version in versions.items()):
+            return False
+        remaining = entry["e"] - time.time()
+        if remaining <= 0:
+            return False
+        if self.beta and entry["d"] > 0:
+            # Probabilistic early expiration: likelier the closer the expiry and the slower the compute
+            if entry["d"] * self.beta * -math.log(1.0 - random.random()) >= remaining:
+                self._stats["early_recomputes"] += 1
+                return False
+        return True
+
+    def _drop_local(self, keys: Optional[list] = None, tags: Optional[list] = None):
+        with self._lock:
+            self._epoch += 1
+            if keys is None and tags is None:
+                self._l1.clear()
+            elif keys is not None:
+                for key in keys:
+                    self._l1.pop(key, None)
+            else:
+                stale = [key for key, entry in self._l1.items() if any(tag in entry["t"] for tag in tags)]
+                for key in stale:
+                    del self._l1[key]
+
+    def _l1_get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            if entry["l1"] <= time.monotonic():
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+            return entry
+
+    def _l1_set(self, key: str, entry: dict, epoch: int):
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            self._l1[key] = dict(entry, l1=time.monotonic() + min(self.l1_ttl, entry["e"] - time.time()))
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_size:
+                self._l1.popitem(last=False)
+
+    def _versions(self, client, tags: Iterable[str]) -> dict:
+        tags = list(tags)
+        if client is None or not tags:
+            return {tag: _local_tag_versions[tag] for tag in tags}
+        try:
+            values = client.mget([_tag_key(tag) for tag in tags])
+        except Exception as e:
+            # Local versions never match Redis ones, so the entry is treated as stale
+            self._stats["errors"] += 1
+            print(f"[cache] {self.name}: Redis tag read failed: {e}")
+            return {tag: -1 for tag in tags}
+        return {tag: int(value or 0) for tag, value in zip(tags, values)}
+
+    # Public API
+
+    def get_or_compute(
+        self,
+        key: str,
+        compute: Callable,
+        tags: Iterable[str] = (),
+        tags_of: Optional[Callable] = None,
+    ):
+        """
+        Cached value of key, computing and storing it on a miss.
+
+        Args:
+            key: Key within this cache (see typed_key)
+            compute: Called without arguments on a miss
+            tags: Tags to invalidate the entry by
+            tags_of: Returns further tags from the computed value (e.g. one
+                per process in a listing); their versions are read after
+                computing, so only L1 catches an invalidation in between
+        """
+        tags = self._tags(tags)
+        client = get_redis()
+        use_l1 = client is None or _listener.listening()
+        epoch = self._epoch
+
+        if use_l1:
+            entry = self._l1_get(key)
+            if entry is not None:
+                # With Redis, pub/sub drops invalidated L1 entries
+                versions = entry["t"] if client is not None else self._versions(None, entry["t"])
+                if self._fresh(entry, versions):
+                    self._stats["l1_hits"] += 1
+                    if entry["v"] is None:
+                        self._stats["negative_hits"] += 1
+                    return entry["v"]
+
+        versions = None
+        if client is not None:
+            try:
+                raw = client.get(self._redis_key(key))
+                versions = self._versions(client, tags)
+                if raw is not None:
+                    entry = json.loads(raw)
+                    if self._fresh(entry, self._versions(client, entry["t"])):
+                        self._stats["l2_hits"] += 1
+                        if entry["v"] is None:
+                            self._stats["negative_hits"] += 1
+                        if use_l1:
+                            self._l1_set(key, entry, epoch)
+                        return entry["v"]
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"[cache] {self.name}: Redis read failed: {e}")
+                client = None
+        if versions is None:
+            versions = self._versions(None, tags)
+
+        self._stats["misses"] += 1
+        return self._compute(key, compute, versions, tags_of, client, epoch if use_l1 else None)
+
+    def _compute(self, key: str, compute: Callable, versions: dict, tags_of, client, epoch: Optional[int]):
+        # One computation per key in this worker, the others wait for it
+        with self._lock:
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                waiter = self._inflight[key] = {"event": threading.Event()}
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            self._stats["inflight_waits"] += 1
+            if waiter["event"].wait(self.lock_timeout) and "value" in waiter:
+                return waiter["value"]
+            return compute()
+
+        try:
+            value = self._compute_locked(key, compute, versions, tags_of, client, epoch)
+            waiter["value"] = value
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            waiter["event"].set()
+
+    def _compute_locked(self, key: str, compute: Callable, versions: dict, tags_of, client, epoch: Optional[int]):
+        redis_key = self._redis_key(key)
+        lock_key = f"{redis_key}:lock"
+        locked = False
+        if client is not None:
+            try:
+                locked = bool(client.set(lock_key, "1", nx=True, px=int(self.lock_timeout * 1000)))
+                if not locked:
+                    # Another worker computes it: wait for its result
+                    self._stats["lock_waits"] += 1
+                    deadline = time.monotonic() + self.lock_timeout
+                    while time.monotonic() < deadline:
+                        time.sleep(LOCK_POLL_INTERVAL)
+                        raw = client.get(redis_key)
+                        if raw is not None:
+                            entry = json.loads(raw)
+                            if entry["e"] > time.time() and all(entry["t"].get(tag) == version for tag, version in versions.items()):
+                                if epoch is not None:
+                                    self._l1_set(key, entry, epoch)
+                                return entry["v"]
+                        if not client.exists(lock_key):
+                            break
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"[cache] {self.name}: Redis lock failed: {e}")
+                client = None
+
+        try:
+            started = time.monotonic()
+            value = compute()
+            self._stats["computes"] += 1
+            if tags_of is not None:
+                extra = [tag for tag in tags_of(value) if tag not in versions]
+                versions = dict(versions, **self._versions(client, extra)) if extra else versions
+            self._store(key, value, versions, time.monotonic() - started, client, epoch)
+            return value
+        finally:
+            if locked and client is not None:
+                try:
+                    client.delete(lock_key)
+                except Exception:
+                    pass
+
+    def _store(self, key: str, value, versions: dict, delta: float, client, epoch: Optional[int]):
+        ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0:
+            return
+        entry = {"v": value, "e": time.time() + ttl, "d": delta, "t": versions}
+        if epoch is not None:
+            self._l1_set(key, entry, epoch)
+        if client is None:
+            return
+        try:
+            payload = json.dumps(entry)
+        except (TypeError, ValueError):
+            self._stats["l2_unserializable"] += 1
+            return
+        try:
+            client.set(self._redis_key(key), payload, px=int(ttl * 1000))
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"[cache] {self.name}: Redis write failed: {e}")
+
+    def invalidate(self, *keys: str):
+        """Drop these keys in L2 and in every worker's L1."""
+        self._drop_local(keys=list(keys))
+        client = get_redis()
+        if client is not None and keys:
+            try:
+                client.delete(*[self._redis_key(key) for key in keys])
+            except Exception as e:
+                print(f"[cache] {self.name}: Redis delete failed: {e}")
+        _publish({"cache": self.name, "keys": list(keys)})
+
+    def clear(self):
+        """Make every entry of this cache stale."""
+        invalidate_tags(f"cache:{self.name}")
+
+    def metrics(self) -> dict:
+        hits = self._stats["l1_hits"] + self._stats["l2_hits"]
+        lookups = hits + self._stats["misses"]
+        return dict(
+            self._stats,
+            l1_size=len(self._l1),
+            hit_rate=round(hits / lookups, 3) if lookups else None,
+        )
+
+
+def cached(
+    name: Optional[str] = None,
+    ttl: float = 60,
+    key: Optional[Callable] = None,
+    tags: Optional[Callable] = None,
+    per_user: bool = False,
+    **options,
+):
+    """
+    Decorator caching a function in a :class:`TieredCache`.
+
+    Args:
+        name: Cache name (default: module and function name)
+        ttl: Seconds a result is valid
+        key: Builds the key from the call arguments (default: typed_key)
+        tags: Returns the tags of a result from the call arguments
+        per_user: Include the session's user_id in the key
+        **options: Passed to TieredCache
+
+    The wrapper has ``cache`` and ``invalidate(*args, **kwargs)`` attributes.
+
+    Example:
+        @cached(ttl=30, tags=lambda name: [f"process:{name}"])
+        def process_summary(name):
+            ...
+    """
+    def decorator(func: Callable) -> Callable:
+        cache = TieredCache(name or f"{func.__module__}.{func.__qualname__}", ttl=ttl, **options)
+        build_key = key or typed_key
+
+        def key_of(args, kwargs) -> str:
+            result = build_key(*args, **kwargs)
+            if not isinstance(result, str):
+                result = typed_key(*result) if isinstance(result, tuple) else typed_key(result)
+            if per_user:
+                from flask import session
+                result = f"user={session.get('user_id', 'anonymous')}|{result}"
+            return result
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return cache.get_or_compute(
+                key_of(args, kwargs),
+                lambda: func(*args, **kwargs),
+                tags=tags(*args, **kwargs) if tags else (),
+            )
+
+        wrapper.cache = cache
+        wrapper.invalidate = lambda *args, **kwargs: cache.invalidate(key_of(args, kwargs))
+        return wrapper
+    return decorator
+
+
+def cache_metrics() -> dict:
+    """Hit/miss counters of every cache in this worker."""
+    return {name: cache.metrics() for name, cache in sorted(_caches.items())}
@@ -0,0 +1,124 @@
+"""
+Subprocess execution layer for docker and docker-compose.
+
+The docker helpers used to ``os.chdir`` into the process directory before
+running ``docker-compose``. The working directory is shared by every
+greenlet in a worker, so under gevent two requests could interleave and run
+compose against the wrong project. Every command here gets an explicit
+``cwd`` and compose is additionally given ``--project-directory`` and
+``-f``, so nothing depends on (or changes) the worker's working directory.
+
+Docker and docker-compose commands run through the daemon circuit breaker
+(:data:`utils.docker_health.docker_breaker`) and the node-wide Docker
+scheduler (:data:`utils.performance.docker_pool`); status probes get a
+default timeout. Long-lived streams (:func:`popen`) only pass the breaker:
+they would hold a scheduler slot for as long as a console is open.
+"""
+
+import os
+import subprocess
+from typing import Optional
+
+from extra import get_project_root
+from utils.docker_health import DOCKER_PROBE_TIMEOUT, docker_breaker, is_probe
+from utils.performance import docker_pool
+
+ACTIVE_SERVERS_DIR = os.path.join(get_project_root(), "active-servers")
+
+DOCKER_BINARIES = ("docker", "docker-compose")
+
+
+def process_dir(name: str) -> str:
+    """Host directory of a process."""
+    return os.path.join(ACTIVE_SERVERS_DIR, name)
+
+
+def run(args: list, cwd: Optional[str] = None, timeout: Optional[float] = None, check: bool = False, **kwargs) -> subprocess.CompletedProcess:
+    """
+    Run a command with captured text output and an explicit working directory.
+
+    Args:
+        args: Command and arguments
+        cwd: Working directory (never inherited from the worker)
+        timeout: Optional timeout in seconds
+        check: Raise CalledProcessError on a non-zero exit code
+        **kwargs: Passed to subprocess.run (env, input, ...), plus 'priority'
+            and 'deadline' for Docker commands (see DockerCommandPool.run)
+
+    Raises:
+        DockerUnavailable: Docker command while the daemon circuit breaker is open
+    """
+    kwargs.setdefault("capture_output", True)
+    kwargs.setdefault("text", True)
+    if args and args[0] in DOCKER_BINARIES:
+        if timeout is None and is_probe(args):
+            timeout = DOCKER_PROBE_TIMEOUT
+        # Daemon calls pass the circuit breaker and share the node-wide slots of the Docker scheduler
+        return docker_breaker.call(
+            args,
+            lambda: docker_pool.run(args, cwd=cwd or get_project_root(), timeout=timeout, check=check, **kwargs),
+        )
+    return subprocess.run(args, cwd=cwd or get_project_root(), timeout=timeout, check=check, **kwargs)
+
+
+def popen(args: list, cwd: Optional[str] = None, **kwargs) -> subprocess.Popen:
+    """
+    Start a command without waiting (streams, interactive sessions).
+
+    Raises:
+        DockerUnavailable: Docker command while the daemon circuit breaker is open
+    """
+    if args and args[0] in DOCKER_BINARIES:
+        # Admitted like any daemon call, but a stream's outcome says nothing about daemon health
+        docker_breaker.release(docker_breaker.before_call())
+    return subprocess.Popen(args, cwd=cwd or get_project_root(), **kwargs)
+
+
+def compose_args(name: str, *args: str) -> list:
+    """docker-compose command line bound to a process project."""
+    directory = process_dir(name)
+    return [
+        "docker-compose",
+        "--project-directory", directory,
+        "-f", os.path.join(directory, "docker-compose.yml"),
+        *args,
+    ]
+
+
+def compose(name: str, *args: str, **kwargs) -> subprocess.CompletedProcess:
+    """
+    Run docker-compose for a process.
+
+    Example:
+        compose(name, "up", "-d", check=True)
+    """
+    return run(compose_args(name, *args), cwd=process_dir(name), **kwargs)
+
+
+def compose_popen(name: str, *args: str, **kwargs) -> subprocess.Popen:
+    """Start docker-compose for a process without waiting (for streamed output)."""
+    return popen(compose_args(name, *args), cwd=process_dir(name), **kwargs)
+
+
+def docker(*args: str, **kwargs) -> subprocess.CompletedProcess:
+    """Run a docker CLI command."""
+    return run(["docker", *args], **kwargs)
+
+
+def get_container_id(name: str, check: bool = False) -> str:
+    """Container ID of a process service, or '' when it has no container."""
+    return compose(name, "ps", "-q", name, check=check).stdout.strip()
+
+
+def get_container_status(container_id: str) -> Optional[str]:
+    """Docker state of a container (running, exited, ...), or None when inspect fails."""
+    result = docker("inspect", "--format", "{{.State.Status}}", container_id)
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip()
+
+
+def get_container_env(container_id: str) -> list:
+    """Environment entries (KEY=value) of a container."""
+    result = docker("inspect", "--format", "{{range .Config.Env}}{{println .}}{{end}}", container_id)
+    return [line for line in result.stdout.split("\n") if line]
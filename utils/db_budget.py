@@ -0,0 +1,379 @@
+"""
+Database connection budget.
+
+Every gunicorn worker has its own SQLAlchemy pool, so the pool settings
+multiply by the worker count: 32 workers with pool_size=20 and
+max_overflow=40 could open 1,920 connections, far above MariaDB's
+max_connections. :func:`engine_options` instead sizes each worker's pool
+from a shared budget:
+
+    budget per worker = (max_connections * DB_CONNECTION_SHARE - DB_RESERVED_CONNECTIONS) / workers
+
+Background work (the activity log writer, retention archives) and activity
+exports don't use the request pool but :func:`background_engine`, a separate
+pool of DB_BACKGROUND_POOL_SIZE connections per worker that is paid for out
+of the reserve, so a long export can't take a request's connection. When
+the per-worker budget falls below DB_MIN_POOL_PER_WORKER, startup fails
+with a message instead of running with pools too small to serve requests.
+
+All of this only applies to gunicorn. flask CLI commands (migrations,
+retention, query plan checks) and the development server are a single
+process: they get a small fixed pool without asking the server for its
+limits, so an undersized server can still be migrated.
+
+max_connections is read from the server once at startup (or taken from
+DB_MAX_CONNECTIONS). The pool is LIFO, so connections beyond the current
+need sit idle and are recycled, and pool_pre_ping is off by default:
+connections are recycled before the server's wait_timeout instead, which
+saves a round-trip on every checkout.
+
+With DB_PROXY_URI set (a local ProxySQL or MaxScale that multiplexes all
+workers over a few server connections, see :func:`database_uri`), workers
+connect to the proxy with a small fixed pool and the server-side limit is
+enforced by the proxy's backend pool instead.
+
+:class:`BudgetedQueuePool` records how long checkouts wait for a connection,
+see :func:`pool_metrics`. :func:`watch_connection_holds` warns about
+connections kept checked out for longer than DB_CONNECTION_HOLD_WARNING
+seconds, e.g. by a streaming response that still holds its request session.
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+DB_MAX_CONNECTIONS = os.getenv("DB_MAX_CONNECTIONS")
+# Share of max_connections this app may use (the rest is for roundcube, migrations, admin shells)
+DB_CONNECTION_SHARE = float(os.getenv("DB_CONNECTION_SHARE", "0.8"))
+# Connections set aside for background jobs and flask CLI commands (at least the background pools of all workers)
+DB_RESERVED_CONNECTIONS = int(os.getenv("DB_RESERVED_CONNECTIONS", "10"))
+# Connections per worker for background jobs and exports (see background_engine)
+DB_BACKGROUND_POOL_SIZE = int(os.getenv("DB_BACKGROUND_POOL_SIZE", "1"))
+# Smallest usable request pool per worker; below it startup fails
+DB_MIN_POOL_PER_WORKER = int(os.getenv("DB_MIN_POOL_PER_WORKER", "2"))
+# Upper bound of the always-open part of a worker's pool
+DB_POOL_SIZE_MAX = int(os.getenv("DB_POOL_SIZE_MAX", "5"))
+# Seconds a request waits for a connection before failing
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+DB_PROXY_URI = os.getenv("DB_PROXY_URI")
+# Connections per worker when going through DB_PROXY_URI
+DB_PROXY_POOL_SIZE = int(os.getenv("DB_PROXY_POOL_SIZE", "4"))
+GUNICORN_WORKERS = int(os.getenv("GUNICORN_WORKERS", "32"))
+# Pool of a single process outside gunicorn (flask CLI, development server)
+CLI_POOL_SIZE = 2
+CLI_MAX_OVERFLOW = 3
+
+# Seconds background jobs wait for a connection of the background pool
+DB_BACKGROUND_POOL_TIMEOUT = 30
+# Seconds a connection may stay checked out before it is reported
+DB_CONNECTION_HOLD_WARNING = int(os.getenv("DB_CONNECTION_HOLD_WARNING", "60"))
+
+# MariaDB defaults, used when the server can't be asked
+DEFAULT_MAX_CONNECTIONS = 151
+DEFAULT_WAIT_TIMEOUT = 28800
+
+# Checkout wait samples kept for the percentiles
+WAIT_SAMPLES = 1000
+
+
+class BudgetedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    stats = {"checkouts": 0, "timeouts": 0, "wait_total": 0.0, "wait_max": 0.0}
+    samples = collections.deque(maxlen=WAIT_SAMPLES)
+    _stats_lock = threading.Lock()
+
+    def _do_get(self):
+        start = time.monotonic()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.stats["timeouts"] += 1
+            raise
+        finally:
+            waited = time.monotonic() - start
+            with self._stats_lock:
+                self.stats["checkouts"] += 1
+                self.stats["wait_total"] += waited
+                self.stats["wait_max"] = max(self.stats["wait_max"], waited)
+                self.samples.append(waited)
+
+
+def _server_limits(uri: str) -> tuple:
+    """(max_connections, wait_timeout) of the server, defaults when unreachable."""
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.pool import NullPool
+
+    try:
+        engine = create_engine(uri, poolclass=NullPool)
+        with engine.connect() as connection:
+            rows = dict(connection.execute(text(
+                "SHOW GLOBAL VARIABLES WHERE Variable_name IN ('max_connections', 'wait_timeout')"
+            )).all())
+        engine.dispose()
+        return (
+            int(rows.get("max_connections", DEFAULT_MAX_CONNECTIONS)),
+            int(rows.get("wait_timeout", DEFAULT_WAIT_TIMEOUT)),
+        )
+    except Exception as e:
+        print(f"[db-budget] Could not read server limits, using defaults: {e}")
+        return DEFAULT_MAX_CONNECTIONS, DEFAULT_WAIT_TIMEOUT
+
+
+def plan(max_connections: int, workers: int = GUNICORN_WORKERS) -> dict:
+    """
+    Pool size and overflow per worker for a server limit.
+
+    Returns:
+        dict with 'budget' (connections for all workers), 'reserved',
+        'per_worker', 'pool_size' and 'max_overflow'
+
+    Raises:
+        RuntimeError: Fewer than DB_MIN_POOL_PER_WORKER connections per worker
+    """
+    workers = max(1, workers)
+    # The background pools are part of the reserve
+    reserved = max(DB_RESERVED_CONNECTIONS, workers * DB_BACKGROUND_POOL_SIZE)
+    budget = int(max_connections * DB_CONNECTION_SHARE) - reserved
+    per_worker = max(0, budget) // workers
+    if per_worker < DB_MIN_POOL_PER_WORKER:
+        raise RuntimeError(
+            f"Database connection budget too small: max_connections={max_connections} leaves {per_worker} "
+            f"connections per worker for {workers} workers ({reserved} reserved), at least "
+            f"{DB_MIN_POOL_PER_WORKER} are needed. Raise max_connections, lower GUNICORN_WORKERS or "
+            f"DB_RESERVED_CONNECTIONS, or set DB_PROXY_URI."
+        )
+    pool_size = min(per_worker, DB_POOL_SIZE_MAX)
+    return {
+        "budget": budget,
+        "reserved": reserved,
+        "per_worker": per_worker,
+        "pool_size": pool_size,
+        "max_overflow": per_worker - pool_size,
+    }
+
+
+_plan = {}
+
+# Options of the per-worker background pool, set by engine_options
+_background_options = {}
+
+
+def _serving() -> bool:
+    """Whether this process is the gunicorn server (not flask CLI, migrations or scripts)."""
+    return "gunicorn" in (sys.argv[0] if sys.argv else "")
+
+
+def database_uri(uri: str) -> str:
+    """The URI workers connect to: DB_PROXY_URI when set, otherwise uri."""
+    return DB_PROXY_URI or uri
+
+
+def engine_options(uri: str) -> dict:
+    """
+    SQLALCHEMY_ENGINE_OPTIONS sized from the connection budget.
+
+    Args:
+        uri: Database URI, used to read the server limits
+
+    Returns:
+        Engine options
+    """
+    _background_options.update(
+        pool_size=DB_BACKGROUND_POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=DB_BACKGROUND_POOL_TIMEOUT,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+    if DB_PROXY_URI:
+        _background_options.update(pool_recycle=3600)
+        _plan.update(mode="proxy", pool_size=DB_PROXY_POOL_SIZE, max_overflow=0, background_pool_size=DB_BACKGROUND_POOL_SIZE)
+        print(f"[db-budget] Using connection proxy, {DB_PROXY_POOL_SIZE} connections per worker")
+        return {
+            "poolclass": BudgetedQueuePool,
+            "pool_size": DB_PROXY_POOL_SIZE,
+            "max_overflow": 0,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": 3600,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+        }
+
+    if not _serving():
+        _background_options.update(pool_recycle=3600)
+        _plan.update(mode="cli", pool_size=CLI_POOL_SIZE, max_overflow=CLI_MAX_OVERFLOW, background_pool_size=DB_BACKGROUND_POOL_SIZE)
+        return {
+            "poolclass": BudgetedQueuePool,
+            "pool_size": CLI_POOL_SIZE,
+            "max_overflow": CLI_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": 3600,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+        }
+
+    if DB_MAX_CONNECTIONS:
+        max_connections, wait_timeout = int(DB_MAX_CONNECTIONS), DEFAULT_WAIT_TIMEOUT
+    elif uri:
+        max_connections, wait_timeout = _server_limits(uri)
+    else:
+        max_connections, wait_timeout = DEFAULT_MAX_CONNECTIONS, DEFAULT_WAIT_TIMEOUT
+
+    sizes = plan(max_connections)
+    _plan.update(
+        sizes, mode="budget", max_connections=max_connections, workers=GUNICORN_WORKERS,
+        background_pool_size=DB_BACKGROUND_POOL_SIZE,
+    )
+    _background_options.update(pool_recycle=max(60, min(3600, wait_timeout - 60)), pool_use_lifo=True)
+    print(
+        f"[db-budget] max_connections={max_connections}, {GUNICORN_WORKERS} workers: "
+        f"pool_size={sizes['pool_size']} max_overflow={sizes['max_overflow']} "
+        f"background_pool_size={DB_BACKGROUND_POOL_SIZE} per worker"
+    )
+    return {
+        "poolclass": BudgetedQueuePool,
+        "pool_size": sizes["pool_size"],
+        "max_overflow": sizes["max_overflow"],
+        "pool_timeout": DB_POOL_TIMEOUT,
+        # Close idle connections before the server drops them
+        "pool_recycle": max(60, min(3600, wait_timeout - 60)),
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_use_lifo": True,
+    }
+
+
+_background = {"engine": None, "pid": None}
+_background_lock = threading.Lock()
+
+
+def background_engine():
+    """
+    Engine of this worker's background pool, for the activity log writer,
+    retention jobs and exports. Needs an app context on first use.
+    """
+    if _background["pid"] == os.getpid():
+        return _background["engine"]
+    with _background_lock:
+        if _background["pid"] != os.getpid():
+            from sqlalchemy import create_engine
+            from db import db
+
+            engine = create_engine(db.engine.url, poolclass=QueuePool, **_background_options)
+            watch_connection_holds(engine)
+            _background.update(engine=engine, pid=os.getpid())
+    return _background["engine"]
+
+
+def pool_metrics(engine=None) -> dict:
+    """Pool plan, current usage and checkout wait times of this worker."""
+    with BudgetedQueuePool._stats_lock:
+        stats = dict(BudgetedQueuePool.stats)
+        samples = sorted(BudgetedQueuePool.samples)
+
+    metrics = dict(_plan)
+    metrics.update(
+        checkouts=stats["checkouts"],
+        timeouts=stats["timeouts"],
+        wait_avg_ms=round(stats["wait_total"] / stats["checkouts"] * 1000, 2) if stats["checkouts"] else 0.0,
+        wait_max_ms=round(stats["wait_max"] * 1000, 2),
+        wait_p95_ms=round(samples[int(len(samples) * 0.95) - 1] * 1000, 2) if samples else 0.0,
+    )
+    if engine is not None and isinstance(engine.pool, QueuePool):
+        metrics.update(
+            checked_out=engine.pool.checkedout(),
+            idle=engine.pool.checkedin(),
+            overflow=max(0, engine.pool.overflow()),
+        )
+    if _background["pid"] == os.getpid():
+        metrics["background_checked_out"] = _background["engine"].pool.checkedout()
+    metrics["long_held"] = long_held_connections()
+    return metrics
+
+
+def dispose_after_fork(engine):
+    """
+    Drop connections inherited from the gunicorn master in forked workers.
+
+    preload_app opens connections in the master (db.create_all); a worker
+    must not reuse those sockets, so its pool starts empty.
+    """
+    def reset():
+        engine.dispose(close=False)
+        _held.clear()
+
+    os.register_at_fork(after_in_child=reset)
+
+
+# Checked-out connection records of this worker: id -> (record, checked out at, request)
+_held = {}
+_watcher_pid = None
+_watcher_lock = threading.Lock()
+
+
+def mark_long_lived(connection):
+    """Exempt a connection that is expected to stay checked out (e.g. an export cursor) from the hold warnings."""
+    connection.info["long_lived"] = True
+
+
+def long_held_connections(threshold: float = DB_CONNECTION_HOLD_WARNING) -> list:
+    """Connections of this worker checked out for longer than threshold seconds."""
+    now = time.monotonic()
+    held = []
+    for record, since, endpoint in list(_held.values()):
+        if now - since >= threshold and not record.info.get("long_lived"):
+            held.append({"seconds": round(now - since), "endpoint": endpoint})
+    return held
+
+
+def _watch():
+    warned = set()
+    while True:
+        time.sleep(max(5, DB_CONNECTION_HOLD_WARNING // 2))
+        now = time.monotonic()
+        for key, (record, since, endpoint) in list(_held.items()):
+            if (key, since) in warned or record.info.get("long_lived"):
+                continue
+            if now - since >= DB_CONNECTION_HOLD_WARNING:
+                warned.add((key, since))
+                print(f"[db-budget] Connection held for {round(now - since)}s by {endpoint or 'a background task'}")
+        # Forget checkouts that have ended
+        warned &= {(key, since) for key, (_, since, _) in list(_held.items())}
+
+
+def watch_connection_holds(engine):
+    """
+    Track how long connections stay checked out and warn about long holds.
+
+    The warnings are printed by a background thread, started per worker on
+    the first checkout (threads don't survive gunicorn's fork).
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, record, proxy):
+        global _watcher_pid
+        endpoint = None
+        try:
+            from flask import has_request_context, request
+            if has_request_context():
+                endpoint = f"{request.method} {request.path}"
+        except Exception:
+            pass
+        _held[id(record)] = (record, time.monotonic(), endpoint)
+
+        if _watcher_pid != os.getpid():
+            with _watcher_lock:
+                if _watcher_pid != os.getpid():
+                    _watcher_pid = os.getpid()
+                    threading.Thread(target=_watch, daemon=True).start()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, record):
+        _held.pop(id(record), None)
+        record.info.pop("long_lived", None)
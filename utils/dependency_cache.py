@@ -0,0 +1,276 @@
+"""
+Shared host dependency caches.
+
+Every process used to download its dependencies from scratch. The compose
+templates now bind mount one host cache directory per ecosystem into the
+container and point the package manager at it, so installs in any process
+(on create, on rebuild or from the console) reuse what other processes on
+the node already fetched:
+
+    <DEPENDENCY_CACHE_DIR>/pip     PIP_CACHE_DIR
+    <DEPENDENCY_CACHE_DIR>/npm     npm_config_cache
+    <DEPENDENCY_CACHE_DIR>/go      GOCACHE
+    <DEPENDENCY_CACHE_DIR>/maven   maven.repo.local
+
+The caches are bounded by DEPENDENCY_CACHE_MAX_SIZE_MB and pruned least
+recently used first. Pruning works on whole entries (a Go module version,
+a Maven artifact version, a single pip/npm cache file) so a partially
+deleted package can never be picked up by a tool. Pruning walks the whole
+cache, so it runs from a background job of the first worker (in a native
+thread, see :func:`start_prune_job`) or the ``prune-dependency-caches``
+CLI command, never in a request.
+
+Go modules stay in the image's ``/go/pkg/mod``, which the Go Dockerfile
+pre-populates from go.sum (:mod:`utils.dockerfiles`); the shared Go cache
+only holds the build cache, which is what compiling at start needs.
+"""
+
+import os
+import shutil
+import stat
+import threading
+import time
+from typing import Iterable, Optional
+
+DEPENDENCY_CACHE_DIR = os.getenv("DEPENDENCY_CACHE_DIR", "/var/cache/server-manager/deps")
+
+# Combined size limit for all ecosystems (MB), pruned down to the low watermark
+DEPENDENCY_CACHE_MAX_SIZE_MB = int(os.getenv("DEPENDENCY_CACHE_MAX_SIZE_MB", "10240"))
+PRUNE_LOW_WATERMARK = 0.9
+
+# Minimum seconds between automatic prunes (shared between workers via a stamp file)
+DEPENDENCY_CACHE_PRUNE_INTERVAL = int(os.getenv("DEPENDENCY_CACHE_PRUNE_INTERVAL", "3600"))
+
+CONTAINER_CACHE_ROOT = "/cache"
+
+ECOSYSTEMS = {
+    "pip": {"PIP_CACHE_DIR": "/cache/pip"},
+    "npm": {"npm_config_cache": "/cache/npm"},
+    "go": {"GOCACHE": "/cache/go/build"},
+    "maven": {"MAVEN_OPTS": "-Dmaven.repo.local=/cache/maven"},
+}
+
+PRUNE_STAMP = ".last-prune"
+
+
+def cache_path(ecosystem: str) -> str:
+    """Host directory of an ecosystem cache."""
+    if ecosystem not in ECOSYSTEMS:
+        raise ValueError(f"Unknown dependency cache: {ecosystem}")
+    return os.path.join(DEPENDENCY_CACHE_DIR, ecosystem)
+
+
+def ensure_cache_dirs(ecosystems: Optional[Iterable[str]] = None) -> None:
+    """Create the host cache directories (world writable, containers run as various users)."""
+    for ecosystem in ecosystems or ECOSYSTEMS:
+        path = cache_path(ecosystem)
+        try:
+            os.makedirs(path, exist_ok=True)
+            os.chmod(path, 0o1777)
+        except OSError as e:
+            print(f"[dependency-cache] Failed to prepare {path}: {e}")
+
+
+def compose_cache_volumes(*ecosystems: str, indent: int = 12) -> str:
+    """
+    Volume entries for a compose service, one per ecosystem.
+
+    Example:
+        volumes:
+            - .:/app
+        {compose_cache_volumes("pip")}
+    """
+    ensure_cache_dirs(ecosystems)
+    pad = " " * indent
+    return "\n".join(
+        f"{pad}- {cache_path(ecosystem)}:{CONTAINER_CACHE_ROOT}/{ecosystem}"
+        for ecosystem in ecosystems
+    )
+
+
+def compose_cache_environment(*ecosystems: str, indent: int = 12) -> str:
+    """Environment entries pointing the package managers at the mounted caches."""
+    pad = " " * indent
+    return "\n".join(
+        f"{pad}- {key}={value}"
+        for ecosystem in ecosystems
+        for key, value in ECOSYSTEMS[ecosystem].items()
+    )
+
+
+def _make_writable(path: str) -> None:
+    # Go marks module directories read-only
+    try:
+        os.chmod(path, os.stat(path).st_mode | stat.S_IWUSR)
+    except OSError:
+        pass
+
+
+def _remove_entry(path: str) -> None:
+    parent = os.path.dirname(path)
+    _make_writable(parent)
+    if os.path.isdir(path) and not os.path.islink(path):
+        for root, dirs, _files in os.walk(path):
+            _make_writable(root)
+            for name in dirs:
+                _make_writable(os.path.join(root, name))
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _entry_stats(path: str) -> tuple:
+    """Return (size, file count, last used) for a file or directory entry."""
+    if not os.path.isdir(path):
+        try:
+            st = os.lstat(path)
+        except OSError:
+            return 0, 0, 0.0
+        return st.st_size, 1, max(st.st_atime, st.st_mtime)
+
+    size, files, last_used = 0, 0, 0.0
+    for root, _dirs, names in os.walk(path):
+        for name in names:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            size += st.st_size
+            files += 1
+            last_used = max(last_used, st.st_atime, st.st_mtime)
+    return size, files, last_used
+
+
+def _iter_entries(ecosystem: str, root: str):
+    """Yield the paths that are pruned as a unit for an ecosystem."""
+    for current, dirs, files in os.walk(root):
+        if ecosystem == "go" and current != root:
+            # module@version directories are one entry
+            versioned = [d for d in dirs if "@" in d]
+            for name in versioned:
+                yield os.path.join(current, name)
+            dirs[:] = [d for d in dirs if "@" not in d]
+        elif ecosystem == "maven" and any(name.endswith(".pom") for name in files):
+            # an artifact version directory is one entry
+            yield current
+            dirs[:] = []
+            continue
+
+        for name in files:
+            if name == PRUNE_STAMP:
+                continue
+            yield os.path.join(current, name)
+
+
+def collect_entries(ecosystems: Optional[Iterable[str]] = None) -> list:
+    """
+    Collect all cache entries with their size and last use.
+
+    Returns:
+        list of dicts with 'ecosystem', 'path', 'size', 'files' and 'last_used'
+    """
+    entries = []
+    for ecosystem in ecosystems or ECOSYSTEMS:
+        root = cache_path(ecosystem)
+        if not os.path.isdir(root):
+            continue
+        for path in _iter_entries(ecosystem, root):
+            size, files, last_used = _entry_stats(path)
+            entries.append({
+                "ecosystem": ecosystem,
+                "path": path,
+                "size": size,
+                "files": files,
+                "last_used": last_used,
+            })
+    return entries
+
+
+def get_cache_usage() -> dict:
+    """
+    Size accounting per ecosystem.
+
+    Returns:
+        dict with per-ecosystem 'bytes', 'files' and 'entries', plus totals
+        and the configured limit
+    """
+    usage = {ecosystem: {"bytes": 0, "files": 0, "entries": 0} for ecosystem in ECOSYSTEMS}
+    for entry in collect_entries():
+        stats = usage[entry["ecosystem"]]
+        stats["bytes"] += entry["size"]
+        stats["files"] += entry["files"]
+        stats["entries"] += 1
+
+    return {
+        "path": DEPENDENCY_CACHE_DIR,
+        "ecosystems": usage,
+        "total_bytes": sum(stats["bytes"] for stats in usage.values()),
+        "limit_bytes": DEPENDENCY_CACHE_MAX_SIZE_MB * 1024 * 1024,
+    }
+
+
+def prune_caches(max_bytes: Optional[int] = None) -> dict:
+    """
+    Remove least recently used entries until the caches fit the limit.
+
+    Args:
+        max_bytes: Size limit (default: DEPENDENCY_CACHE_MAX_SIZE_MB). Once
+            exceeded, entries are removed down to 90% of the limit.
+
+    Returns:
+        dict with 'success', 'removed' entries, 'freed_bytes' and 'total_bytes'
+    """
+    limit = DEPENDENCY_CACHE_MAX_SIZE_MB * 1024 * 1024 if max_bytes is None else max_bytes
+
+    entries = collect_entries()
+    total = sum(entry["size"] for entry in entries)
+    removed, freed = 0, 0
+
+    if total > limit:
+        target = int(limit * PRUNE_LOW_WATERMARK)
+        for entry in sorted(entries, key=lambda e: e["last_used"]):
+            if total - freed <= target:
+                break
+            _remove_entry(entry["path"])
+            freed += entry["size"]
+            removed += 1
+        print(f"[dependency-cache] Pruned {removed} entries ({freed // (1024 * 1024)} MB)")
+
+    try:
+        os.makedirs(DEPENDENCY_CACHE_DIR, exist_ok=True)
+        with open(os.path.join(DEPENDENCY_CACHE_DIR, PRUNE_STAMP), "w") as f:
+            f.write(str(int(time.time())))
+    except OSError:
+        pass
+
+    return {"success": True, "removed": removed, "freed_bytes": freed, "total_bytes": total - freed}
+
+
+def maybe_prune_caches() -> Optional[dict]:
+    """Prune when the last prune (by any worker) is older than DEPENDENCY_CACHE_PRUNE_INTERVAL."""
+    try:
+        last = os.path.getmtime(os.path.join(DEPENDENCY_CACHE_DIR, PRUNE_STAMP))
+    except OSError:
+        last = 0
+    if time.time() - last < DEPENDENCY_CACHE_PRUNE_INTERVAL:
+        return None
+    return prune_caches()
+
+
+def start_prune_job():
+    """Prune periodically in a background thread (one worker)."""
+    from utils.performance import run_blocking
+
+    def loop():
+        while True:
+            try:
+                # The walk isn't cooperative under gevent: keep it off the worker's hub
+                run_blocking(maybe_prune_caches)
+            except Exception as e:
+                print(f"[dependency-cache] Prune failed: {e}")
+            time.sleep(DEPENDENCY_CACHE_PRUNE_INTERVAL)
+
+    threading.Thread(target=loop, daemon=True).start()
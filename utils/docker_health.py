@@ -0,0 +1,363 @@
+"""
+Docker daemon health tracking and circuit breaker.
+
+When dockerd stalls (large image pulls, disk pressure) every probe used to
+hang until gunicorn killed the worker. All docker/docker-compose commands of
+the execution layer pass through :data:`docker_breaker`, which tracks their
+latency and daemon errors over a rolling window:
+
+- closed:    calls go through; slow or timed out daemon calls (ps, inspect,
+             ...) and daemon connection errors count as failures. Latency
+             is the run time once a scheduler slot is held, and the output
+             of commands run in a container (exec) is never judged
+- open:      tripped by the failure rate, calls fail fast with
+             DockerUnavailable until the cooldown passes
+- half_open: a small, doubling number of probe calls is let through; enough
+             successes close the breaker, a failure reopens it with a longer
+             cooldown
+
+A trip is shared with the other workers through Redis so they fail fast too.
+Status callers serve the last known state marked ``stale`` meanwhile (see
+:func:`remember_status` / :func:`last_known_status`).
+"""
+
+import collections
+import json
+import os
+import subprocess
+import threading
+import time
+from typing import Callable, Optional
+
+# Rolling window of recent calls the failure rate is computed over
+DOCKER_BREAKER_WINDOW = int(os.getenv("DOCKER_BREAKER_WINDOW", "20"))
+DOCKER_BREAKER_MIN_CALLS = int(os.getenv("DOCKER_BREAKER_MIN_CALLS", "5"))
+DOCKER_BREAKER_FAILURE_RATE = float(os.getenv("DOCKER_BREAKER_FAILURE_RATE", "0.5"))
+
+# Daemon calls (ps, inspect, ...) slower than this count as failures
+DOCKER_SLOW_CALL_SECONDS = float(os.getenv("DOCKER_SLOW_CALL_SECONDS", "5"))
+
+# Seconds the breaker stays open before probing (doubles on failed probes)
+DOCKER_BREAKER_COOLDOWN = float(os.getenv("DOCKER_BREAKER_COOLDOWN", "15"))
+DOCKER_BREAKER_MAX_COOLDOWN = float(os.getenv("DOCKER_BREAKER_MAX_COOLDOWN", "120"))
+
+# Successful probes needed in half-open state before closing again
+HALF_OPEN_SUCCESSES = 4
+
+# Default timeout for probes (ps, inspect, exec, ...) that don't pass their own timeout
+DOCKER_PROBE_TIMEOUT = float(os.getenv("DOCKER_PROBE_TIMEOUT", "10"))
+
+PROBE_SUBCOMMANDS = {"ps", "inspect", "stats", "top", "port", "logs", "exec", "version", "info", "images"}
+
+# Daemon-only calls whose latency reflects daemon health (exec/logs depend on the container)
+HEALTH_SUBCOMMANDS = {"ps", "inspect", "stats", "top", "port", "version", "info", "images"}
+
+# Subcommands that run a user's command in a container; their exit status and stderr are the command's, not the daemon's
+USER_COMMAND_SUBCOMMANDS = {"exec", "run"}
+
+# stderr fragments that point at the daemon rather than the command
+DAEMON_ERROR_MARKERS = (
+    "cannot connect to the docker daemon",
+    "error during connect",
+    "is the docker daemon running",
+    "context deadline exceeded",
+    "i/o timeout",
+    "connection refused",
+    "connection reset by peer",
+    "read timeout",
+    "timed out",
+)
+
+REDIS_OPEN_KEY = "docker_breaker:open_until"
+REDIS_STATUS_KEY = "docker_breaker:last_known_status"
+
+# How often the shared trip flag is read from Redis (seconds)
+SHARED_STATE_REFRESH = 1.0
+
+
+class DockerUnavailable(RuntimeError):
+    """Raised instead of calling Docker while the circuit breaker is open."""
+
+
+def subcommand(args: list) -> Optional[str]:
+    """Subcommand of a docker/docker-compose command line."""
+    rest = list(args[1:])
+    # Skip the project options added by utils.commands.compose_args
+    while rest and rest[0] in ("--project-directory", "-f"):
+        rest = rest[2:]
+    return rest[0] if rest else None
+
+
+def is_probe(args: list) -> bool:
+    """Whether a docker/docker-compose command line is a status probe."""
+    return subcommand(args) in PROBE_SUBCOMMANDS
+
+
+def is_daemon_error(stderr) -> bool:
+    text = (stderr or "")
+    if isinstance(text, bytes):
+        text = text.decode(errors="replace")
+    text = text.lower()
+    return any(marker in text for marker in DAEMON_ERROR_MARKERS)
+
+
+class DockerCircuitBreaker:
+    """Circuit breaker in front of Docker daemon calls."""
+
+    def __init__(self):
+        self.state = "closed"
+        self._outcomes = collections.deque(maxlen=DOCKER_BREAKER_WINDOW)
+        self._latencies = collections.deque(maxlen=DOCKER_BREAKER_WINDOW)
+        self._lock = threading.Lock()
+        self._opened_at = 0.0
+        self._cooldown = DOCKER_BREAKER_COOLDOWN
+        self._probe_budget = 1
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._shared_checked_at = 0.0
+        self._shared_open_until = 0.0
+        self._stats = {"calls": 0, "failures": 0, "rejected": 0, "trips": 0}
+
+    # Shared state
+
+    def _redis(self):
+        from utils.redis_client import get_redis
+        return get_redis()
+
+    def _shared_open(self) -> bool:
+        now = time.time()
+        if now - self._shared_checked_at >= SHARED_STATE_REFRESH:
+            self._shared_checked_at = now
+            client = self._redis()
+            if client is not None:
+                try:
+                    self._shared_open_until = float(client.get(REDIS_OPEN_KEY) or 0)
+                except Exception:
+                    self._shared_open_until = 0.0
+        return self._shared_open_until > now
+
+    def _publish_open(self):
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            client.set(REDIS_OPEN_KEY, time.time() + self._cooldown, ex=max(1, int(self._cooldown)))
+        except Exception:
+            pass
+
+    def _publish_closed(self):
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            client.delete(REDIS_OPEN_KEY)
+        except Exception:
+            pass
+
+    # State machine
+
+    def _trip(self):
+        if self.state == "half_open":
+            self._cooldown = min(self._cooldown * 2, DOCKER_BREAKER_MAX_COOLDOWN)
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._probe_budget = 1
+        self._probe_successes = 0
+        self._stats["trips"] += 1
+        print(f"[docker-breaker] Docker daemon unhealthy, failing fast for {self._cooldown:.0f}s")
+        self._publish_open()
+
+    def _close(self):
+        self.state = "closed"
+        self._cooldown = DOCKER_BREAKER_COOLDOWN
+        self._outcomes.clear()
+        print("[docker-breaker] Docker daemon recovered")
+        self._publish_closed()
+
+    def before_call(self) -> bool:
+        """
+        Admit a call or raise DockerUnavailable.
+
+        Returns:
+            True when the call is a half-open probe (pass it to after_call)
+        """
+        with self._lock:
+            if self.state == "closed" and self._shared_open():
+                # Another worker tripped: follow it without waiting for our own failures
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self._cooldown:
+                    self._stats["rejected"] += 1
+                    raise DockerUnavailable("Docker daemon is not responding, try again shortly")
+                self.state = "half_open"
+                self._probes_in_flight = 0
+
+            if self.state == "half_open":
+                if self._probes_in_flight >= self._probe_budget:
+                    self._stats["rejected"] += 1
+                    raise DockerUnavailable("Docker daemon is recovering, try again shortly")
+                self._probes_in_flight += 1
+                return True
+
+            return False
+
+    def after_call(self, probe: bool, ok: bool, latency: float):
+        """Record the outcome of an admitted call."""
+        with self._lock:
+            self._stats["calls"] += 1
+            if not ok:
+                self._stats["failures"] += 1
+            self._outcomes.append(ok)
+            self._latencies.append(latency)
+
+            if probe:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if self.state != "half_open":
+                    return
+                if not ok:
+                    self._trip()
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= HALF_OPEN_SUCCESSES:
+                    self._close()
+                else:
+                    # Let traffic back in gradually
+                    self._probe_budget *= 2
+                return
+
+            if self.state == "closed" and len(self._outcomes) >= DOCKER_BREAKER_MIN_CALLS:
+                failures = self._outcomes.count(False)
+                if failures / len(self._outcomes) >= DOCKER_BREAKER_FAILURE_RATE:
+                    self._trip()
+
+    def release(self, probe: bool):
+        """Give back a probe slot for a call that never reached the daemon."""
+        if probe:
+            with self._lock:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def call(self, args: list, fn: Callable[[], subprocess.CompletedProcess]) -> subprocess.CompletedProcess:
+        """
+        Run a Docker command through the breaker.
+
+        Args:
+            args: Command line (for error classification)
+            fn: Runs the command and returns its CompletedProcess
+
+        Raises:
+            DockerUnavailable: The breaker is open
+        """
+        from utils.performance import DockerSlotTimeout
+
+        # Only daemon calls are judged by latency; builds and user commands may legitimately be slow
+        health_call = subcommand(args) in HEALTH_SUBCOMMANDS
+        # A failing 'docker exec' is the user's command failing, whatever it printed
+        user_command = subcommand(args) in USER_COMMAND_SUBCOMMANDS
+
+        probe = self.before_call()
+        started = time.monotonic()
+
+        def run_time(outcome) -> float:
+            # Time the command ran once it held a Docker slot; the queue wait says nothing about the daemon
+            seconds = getattr(outcome, "run_seconds", None)
+            return time.monotonic() - started if seconds is None else seconds
+
+        try:
+            result = fn()
+        except DockerSlotTimeout:
+            # Never reached the daemon
+            self.release(probe)
+            raise
+        except subprocess.TimeoutExpired as e:
+            if health_call:
+                self.after_call(probe, False, run_time(e))
+            else:
+                self.release(probe)
+            raise
+        except subprocess.CalledProcessError as e:
+            latency = run_time(e)
+            ok = user_command or not is_daemon_error(e.stderr)
+            self.after_call(probe, ok and not (health_call and latency >= DOCKER_SLOW_CALL_SECONDS), latency)
+            raise
+        except Exception:
+            self.release(probe)
+            raise
+
+        latency = run_time(result)
+        ok = user_command or result.returncode == 0 or not is_daemon_error(result.stderr)
+        if health_call and latency >= DOCKER_SLOW_CALL_SECONDS:
+            ok = False
+        self.after_call(probe, ok, latency)
+        return result
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != "closed"
+
+    def metrics(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "state": self.state,
+                "cooldown": self._cooldown,
+                "failure_rate": round(self._outcomes.count(False) / len(self._outcomes), 2) if self._outcomes else 0.0,
+                "p50_latency_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else 0.0,
+                "max_latency_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+                **self._stats,
+            }
+
+
+docker_breaker = DockerCircuitBreaker()
+
+# Last known status per process, served (marked stale) while Docker is unavailable
+_last_known_status = {}
+
+
+def remember_status(name: str, status: dict) -> dict:
+    """Store a fresh status result as the last known state of a process."""
+    if "error" in status:
+        return status
+    entry = dict(status, checked_at=time.time())
+    _last_known_status[name] = entry
+    client = docker_breaker._redis()
+    if client is not None:
+        try:
+            client.hset(REDIS_STATUS_KEY, name, json.dumps(entry))
+        except Exception:
+            pass
+    return status
+
+
+def last_known_status(name: str) -> Optional[dict]:
+    """
+    Last known status of a process marked as stale.
+
+    Returns:
+        dict with the cached status plus 'stale': True and 'checked_at', or
+        None when nothing is known
+    """
+    entry = _last_known_status.get(name)
+    if entry is None:
+        client = docker_breaker._redis()
+        if client is not None:
+            try:
+                raw = client.hget(REDIS_STATUS_KEY, name)
+                entry = json.loads(raw) if raw else None
+            except Exception:
+                entry = None
+    if entry is None:
+        return None
+    return dict(entry, stale=True)
+
+
+def forget_status(name: str):
+    """Drop the last known status of a deleted or renamed process."""
+    _last_known_status.pop(name, None)
+    client = docker_breaker._redis()
+    if client is not None:
+        try:
+            client.hdel(REDIS_STATUS_KEY, name)
+        except Exception:
+            pass
@@ -0,0 +1,169 @@
+"""
+Dockerfile templates for the create handlers.
+
+Every template is multi-stage: dependencies are resolved in a builder stage
+from the manifest/lockfile alone, so editing application code never
+invalidates the dependency layer, and the runtime stage starts from a slim
+base with only the resolved dependencies copied in. Each handler also gets a
+generated ``.dockerignore`` so local artefacts (node_modules, venvs, the
+supervisor state directory, logs) never enter the build context.
+
+Runtime images must keep ``sh`` because the supervisor runs on it, which
+rules out distroless bases; the ``-slim``/``-alpine`` variants are used
+instead.
+
+Dependencies are installed outside the source directory (``/opt/venv``,
+``/node_modules``, ``/go/pkg/mod``) because compose bind mounts the process
+directory over the application directory at runtime.
+"""
+
+import os
+
+from utils.rebuild import DOCKERFILE_SYNTAX
+
+PYTHON_TEMPLATE = """{syntax}
+# Stage 1: resolve dependencies into a virtualenv
+FROM python:3.13-slim AS deps
+RUN python -m venv /opt/venv
+ENV PATH="/opt/venv/bin:$PATH"
+COPY requirements.txt /tmp/requirements.txt
+RUN --mount=type=cache,target=/root/.cache/pip \\
+    pip install -r /tmp/requirements.txt
+
+# Stage 2: slim runtime with only the virtualenv
+FROM python:3.13-slim
+ENV PATH="/opt/venv/bin:$PATH" \\
+    PYTHONDONTWRITEBYTECODE=1 \\
+    PYTHONUNBUFFERED=1
+COPY --from=deps /opt/venv /opt/venv
+WORKDIR /app
+COPY . /app
+CMD ["sh", "-c", "python -u $MAIN_COMMAND"]
+"""
+
+NODEJS_TEMPLATE = """{syntax}
+# Stage 1: install node_modules from the manifest (npm ci when a lockfile exists)
+FROM node:lts-slim AS deps
+WORKDIR /deps
+COPY package.json package-lock.json* ./
+RUN --mount=type=cache,target=/root/.npm \\
+    if [ -f package-lock.json ]; then npm ci; else npm install; fi
+
+# Stage 2: slim runtime, modules live in /node_modules so the /app bind mount does not hide them
+FROM node:lts-slim
+ENV PATH="/node_modules/.bin:$PATH"
+COPY --from=deps /deps/node_modules /node_modules
+WORKDIR /app
+COPY . /app
+CMD ["sh", "-c", "$MAIN_COMMAND"]
+"""
+
+GO_TEMPLATE = """{syntax}
+# Stage 1: download modules from go.mod/go.sum only
+FROM golang:1-alpine AS deps
+WORKDIR /deps
+COPY go.mod go.sum* ./
+RUN --mount=type=cache,target=/root/.cache/go-build \\
+    go mod download
+
+# Stage 2: toolchain runtime (commands compile at start) with the module cache preloaded
+FROM golang:1-alpine
+COPY --from=deps /go/pkg/mod /go/pkg/mod
+WORKDIR /app
+COPY . /app
+CMD ["sh", "-c", "$COMMAND"]
+"""
+
+VITE_TEMPLATE = """{syntax}
+# Stage 1: build the Vite project
+FROM node:lts-slim AS build
+WORKDIR /app
+COPY package.json package-lock.json* ./
+RUN --mount=type=cache,target=/root/.npm \\
+    if [ -f package-lock.json ]; then npm ci; else npm install; fi
+COPY . .
+RUN npm run build
+
+# Stage 2: serve using Apache
+FROM httpd:alpine
+
+# Copy the build output to the Apache document root
+COPY --from=build /app/dist/ /usr/local/apache2/htdocs/
+
+# Copy .htaccess files
+COPY .htaccess /usr/local/apache2/htdocs/
+
+# Enable mod_rewrite, allow .htaccess overrides and set the server name
+RUN echo "LoadModule rewrite_module modules/mod_rewrite.so" >> /usr/local/apache2/conf/httpd.conf && \\
+    echo "<Directory /usr/local/apache2/htdocs>" >> /usr/local/apache2/conf/httpd.conf && \\
+    echo "  AllowOverride All" >> /usr/local/apache2/conf/httpd.conf && \\
+    echo "  Require all granted" >> /usr/local/apache2/conf/httpd.conf && \\
+    echo "</Directory>" >> /usr/local/apache2/conf/httpd.conf && \\
+    echo "ServerName localhost" >> /usr/local/apache2/conf/httpd.conf
+
+EXPOSE 80
+"""
+
+TEMPLATES = {
+    "python": PYTHON_TEMPLATE,
+    "nodejs": NODEJS_TEMPLATE,
+    "go": GO_TEMPLATE,
+    "vite": VITE_TEMPLATE,
+}
+
+# Never part of any build context
+COMMON_IGNORES = [
+    ".git",
+    ".gitignore",
+    ".supervisor",
+    ".dockerignore",
+    "Dockerfile",
+    "docker-compose.yml",
+    "*.log",
+    ".env",
+]
+
+IGNORES = {
+    "python": ["__pycache__", "*.pyc", ".venv", "venv", ".pytest_cache"],
+    "nodejs": ["node_modules", "npm-debug.log*", ".npm"],
+    "go": ["bin", "*.exe", "*.test"],
+    "vite": ["node_modules", "dist", "npm-debug.log*", ".npm"],
+}
+
+
+def render_dockerfile(process_type: str, **context) -> str:
+    """
+    Render the Dockerfile template for a process type.
+
+    Args:
+        process_type: Handler type (python, nodejs, go, vite)
+        **context: Extra template fields
+
+    Returns:
+        Dockerfile content
+    """
+    template = TEMPLATES.get(process_type)
+    if template is None:
+        raise ValueError(f"No Dockerfile template for process type '{process_type}'")
+    return template.format(syntax=DOCKERFILE_SYNTAX, **context)
+
+
+def render_dockerignore(process_type: str) -> str:
+    """Render the .dockerignore for a process type."""
+    entries = COMMON_IGNORES + IGNORES.get(process_type, [])
+    return "\n".join(entries) + "\n"
+
+
+def write_dockerfile(process_type: str, dockerfile_path: str, **context) -> None:
+    """
+    Write the Dockerfile and a matching .dockerignore next to it.
+
+    Example:
+        write_dockerfile("python", os.path.join(process_dir, "Dockerfile"))
+    """
+    with open(dockerfile_path, "w") as f:
+        f.write(render_dockerfile(process_type, **context))
+
+    dockerignore_path = os.path.join(os.path.dirname(dockerfile_path), ".dockerignore")
+    with open(dockerignore_path, "w") as f:
+        f.write(render_dockerignore(process_type))
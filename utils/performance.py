@@ -2,22 +2,56 @@
 Performance monitoring and optimization utilities for Server Manager.
 Provides caching, async operations, and monitoring helpers.
 """
+import contextlib
+import fcntl
 import functools
+import os
+import threading
 import time
-import asyncio
+import uuid
 from concurrent.futures import ThreadPoolExecutor
 import subprocess
 from typing import Callable, Optional
 
-# Thread pool for running blocking I/O operations asynchronously
-# Size matches the number of gevent workers to handle subprocess calls efficiently
-executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="perf_")
+# Thread pool for blocking work that is not cooperative under gevent.
+# Created on first use; subprocess calls are already cooperative and don't need it.
+EXECUTOR_THREADS = int(os.getenv("PERF_EXECUTOR_THREADS", "4"))
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the shared thread pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=EXECUTOR_THREADS, thread_name_prefix="perf_")
+    return _executor
+
+
+def run_blocking(fn: Callable, *args, **kwargs):
+    """
+    Run filesystem-heavy work (e.g. walking large directories) in a native
+    thread of the gevent hub's threadpool. Monkey-patched threads are
+    greenlets, so the same work in a threading.Thread would still stall the
+    whole worker. Without gevent fn is just called.
+    """
+    try:
+        from gevent import get_hub
+        from gevent.monkey import is_module_patched
+    except ImportError:
+        return fn(*args, **kwargs)
+    if not is_module_patched("threading"):
+        return fn(*args, **kwargs)
+    return get_hub().threadpool.apply(fn, args, kwargs)
 
 
 def timed_cache(timeout: int = 60):
     """
     Decorator to cache function results with custom timeout.
-    Uses Flask-Caching if available, otherwise falls back to simple dict cache.
+    Uses the two-tier cache in utils/cache.py (see ``cached`` there for
+    tags, key functions and negative caching).
     
     Args:
         timeout: Cache timeout in seconds (default: 60)
@@ -27,36 +61,21 @@ def timed_cache(timeout: int = 60):
         def expensive_operation():
             return compute_something()
     """
-    def decorator(func: Callable) -> Callable:
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            try:
-                from app import cache
-                # Create cache key from function name and arguments
-                cache_key = f"{func.__name__}_{str(args)}_{str(kwargs)}"
-                result = cache.get(cache_key)
-                
-                if result is None:
-                    result = func(*args, **kwargs)
-                    cache.set(cache_key, result, timeout=timeout)
-                
-                return result
-            except (ImportError, AttributeError):
-                # Fallback if cache not available
-                return func(*args, **kwargs)
-        
-        return wrapper
-    return decorator
+    from utils.cache import cached
+
+    return cached(ttl=timeout)
 
 
-def async_subprocess(cmd: list, cwd: Optional[str] = None, timeout: int = 30) -> dict:
+def async_subprocess(cmd: list, cwd: Optional[str] = None, timeout: int = 30, priority: Optional[int] = None) -> dict:
     """
-    Run subprocess command asynchronously without blocking gevent workers.
+    Run a subprocess command without blocking gevent workers.
+    Docker commands are scheduled through docker_pool.
     
     Args:
         cmd: Command to run as list of strings
         cwd: Working directory for command
         timeout: Command timeout in seconds
+        priority: Scheduling class for Docker commands (default: current context)
     
     Returns:
         dict with 'returncode', 'stdout', 'stderr'
@@ -66,37 +85,7 @@ def async_subprocess(cmd: list, cwd: Optional[str] = None, timeout: int = 30) ->
         if result['returncode'] == 0:
             print(result['stdout'])
     """
-    def _run():
-        try:
-            result = subprocess.run(
-                cmd,
-                cwd=cwd,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-                check=False
-            )
-            return {
-                'returncode': result.returncode,
-                'stdout': result.stdout,
-                'stderr': result.stderr
-            }
-        except subprocess.TimeoutExpired:
-            return {
-                'returncode': -1,
-                'stdout': '',
-                'stderr': f'Command timed out after {timeout} seconds'
-            }
-        except Exception as e:
-            return {
-                'returncode': -1,
-                'stdout': '',
-                'stderr': str(e)
-            }
-    
-    # Submit to thread pool and wait for result
-    future = executor.submit(_run)
-    return future.result(timeout=timeout + 5)
+    return docker_pool.run_docker_command(cmd, cwd=cwd, timeout=timeout, priority=priority)
 
 
 def performance_monitor(func: Callable) -> Callable:
@@ -150,59 +139,359 @@ def memoize_with_user(timeout: int = 300):
     
     Example:
         @memoize_with_user(timeout=60)
-        def get_user_processes(user_id):
-            return Process.query.filter_by(owner_id=user_id).all()
+        def get_user_process_names(user_id):
+            return [name for (name,) in Process.query.with_entities(Process.name).filter_by(owner_id=user_id)]
     """
-    def decorator(func: Callable) -> Callable:
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            try:
-                from app import cache
-                from flask import session
-                
-                user_id = session.get('user_id', 'anonymous')
-                cache_key = f"{func.__name__}_user_{user_id}_{str(args)}_{str(kwargs)}"
-                result = cache.get(cache_key)
-                
-                if result is None:
-                    result = func(*args, **kwargs)
-                    cache.set(cache_key, result, timeout=timeout)
-                
-                return result
-            except (ImportError, AttributeError):
-                return func(*args, **kwargs)
-        
-        return wrapper
-    return decorator
+    from utils.cache import cached
+
+    return cached(ttl=timeout, per_user=True)
+
+
+# Scheduling classes for Docker commands, lower value wins
+PRIORITY_INTERACTIVE = 0
+PRIORITY_POLLING = 1
+PRIORITY_BACKGROUND = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_POLLING: "polling",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# Concurrent Docker daemon calls allowed per node (shared by all workers)
+DOCKER_MAX_CONCURRENT = int(os.getenv("DOCKER_MAX_CONCURRENT", "12"))
+
+# Seconds a command may wait for a slot before giving up
+DOCKER_QUEUE_TIMEOUT = float(os.getenv("DOCKER_QUEUE_TIMEOUT", "30"))
+
+# 'redis' (falls back to 'file' when Redis is unreachable) or 'file'
+DOCKER_SCHEDULER_BACKEND = os.getenv("DOCKER_SCHEDULER_BACKEND", "redis")
+DOCKER_SEMAPHORE_DIR = os.getenv("DOCKER_SEMAPHORE_DIR", "/tmp/server-manager-docker-slots")
+
+# Slot lease for commands without a timeout; expired leases of crashed workers are reclaimed
+DOCKER_SLOT_LEASE = 600
+
+REDIS_HOLDERS_KEY = "docker_scheduler:holders"
+REDIS_WAITERS_KEY = "docker_scheduler:waiters"
+
+POLL_INTERVALS = {
+    PRIORITY_INTERACTIVE: 0.02,
+    PRIORITY_POLLING: 0.05,
+    PRIORITY_BACKGROUND: 0.1,
+}
+
+# Atomically: drop expired leases/waiters, refuse while a more important
+# class is waiting or the class limit is reached, otherwise take a slot.
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local priority = tonumber(ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+for _, member in ipairs(redis.call('ZRANGE', KEYS[2], 0, -1)) do
+    if tonumber(string.sub(member, 1, 1)) < priority then
+        return 0
+    end
+end
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[5])
+redis.call('ZREM', KEYS[2], ARGV[6])
+return 1
+"""
+
+
+class DockerSlotTimeout(subprocess.TimeoutExpired):
+    """Raised when no Docker slot became available before the deadline."""
+
+
+def class_limits(max_concurrent: int) -> dict:
+    """
+    Slots each class may occupy.
+
+    Interactive commands may use every slot; polling leaves a quarter free
+    for interactive work and background jobs never take more than half, so
+    a polling spike cannot starve a user's start button.
+    """
+    reserve = max(1, max_concurrent // 4)
+    return {
+        PRIORITY_INTERACTIVE: max_concurrent,
+        PRIORITY_POLLING: max(1, max_concurrent - reserve),
+        PRIORITY_BACKGROUND: max(1, max_concurrent // 2),
+    }
+
+
+_priority_context = threading.local()
+
+
+@contextlib.contextmanager
+def docker_priority(priority: int):
+    """
+    Set the scheduling class for Docker commands in the current greenlet.
+    Works as a context manager and as a decorator.
+
+    Example:
+        @docker_priority(PRIORITY_POLLING)
+        def get_process():
+            ...
+    """
+    previous = getattr(_priority_context, "priority", None)
+    _priority_context.priority = priority
+    try:
+        yield
+    finally:
+        _priority_context.priority = previous
+
+
+def current_docker_priority() -> int:
+    priority = getattr(_priority_context, "priority", None)
+    return PRIORITY_INTERACTIVE if priority is None else priority
 
 
 class DockerCommandPool:
     """
-    Pool for managing Docker commands efficiently.
-    Prevents overwhelming Docker daemon with concurrent requests.
+    Node-wide bounded concurrency for Docker daemon calls.
+
+    Slots are held in Redis (a sorted set of leases shared by every worker)
+    or, without Redis, as flock()ed slot files. Waiters are ordered by
+    class: a command only takes a slot while no more important class is
+    waiting (across workers with Redis, within the worker otherwise) and
+    its class limit is not reached.
     """
     
-    def __init__(self, max_concurrent: int = 10):
-        self.semaphore = asyncio.Semaphore(max_concurrent)
-        self.executor = ThreadPoolExecutor(max_workers=max_concurrent)
+    def __init__(self, max_concurrent: int = 10, backend: str = "redis"):
+        self.max_concurrent = max_concurrent
+        self.limits = class_limits(max_concurrent)
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._acquire_script = None
+        self._waiting = {priority: 0 for priority in PRIORITY_NAMES}
+        self._in_flight = 0
+        self._stats = {"acquired": 0, "timeouts": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+    def _redis(self):
+        if self.backend != "redis":
+            return None
+        from utils.redis_client import get_redis
+        return get_redis()
+
+    def _higher_priority_waiting_locally(self, priority: int) -> bool:
+        with self._lock:
+            return any(count for p, count in self._waiting.items() if p < priority)
+
+    def _try_acquire_redis(self, client, token: str, waiter: str, priority: int, lease: float) -> bool:
+        if self._acquire_script is None:
+            self._acquire_script = client.register_script(ACQUIRE_SCRIPT)
+        now = time.time()
+        return bool(self._acquire_script(
+            keys=[REDIS_HOLDERS_KEY, REDIS_WAITERS_KEY],
+            args=[now, now + lease, self.limits[priority], priority, token, waiter],
+        ))
+
+    def _try_acquire_file(self, priority: int):
+        os.makedirs(DOCKER_SEMAPHORE_DIR, exist_ok=True)
+        for index in range(self.limits[priority]):
+            fd = os.open(os.path.join(DOCKER_SEMAPHORE_DIR, f"slot-{index}.lock"), os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except OSError:
+                os.close(fd)
+        return None
+
+    @contextlib.contextmanager
+    def slot(self, priority: Optional[int] = None, wait_timeout: Optional[float] = None, lease: Optional[float] = None, cmd=None):
+        """
+        Hold one Docker slot for the duration of the block.
+
+        Args:
+            priority: Scheduling class (default: current context)
+            wait_timeout: Seconds to wait for a slot (default: DOCKER_QUEUE_TIMEOUT)
+            lease: Seconds after which a slot of a crashed worker is reclaimed
+            cmd: Command for error messages
+
+        Raises:
+            DockerSlotTimeout: No slot became available in time
+        """
+        priority = current_docker_priority() if priority is None else priority
+        wait_timeout = DOCKER_QUEUE_TIMEOUT if wait_timeout is None else wait_timeout
+        lease = (lease or DOCKER_SLOT_LEASE) + 30
+        token = uuid.uuid4().hex
+        waiter = f"{priority}:{token}"
+        started = time.monotonic()
+        deadline = started + wait_timeout
+
+        client = self._redis()
+        file_slot = None
+        acquired = False
+
+        with self._lock:
+            self._waiting[priority] += 1
+        try:
+            if client is not None:
+                try:
+                    client.zadd(REDIS_WAITERS_KEY, {waiter: time.time() + wait_timeout + 5})
+                except Exception:
+                    client = None
+
+            while True:
+                if not self._higher_priority_waiting_locally(priority):
+                    if client is not None:
+                        try:
+                            acquired = self._try_acquire_redis(client, token, waiter, priority, lease)
+                        except Exception as e:
+                            print(f"[docker-scheduler] Redis unavailable, falling back to slot files: {e}")
+                            client = None
+                            continue
+                    else:
+                        file_slot = self._try_acquire_file(priority)
+                        acquired = file_slot is not None
+                if acquired:
+                    break
+                if time.monotonic() >= deadline:
+                    with self._lock:
+                        self._stats["timeouts"] += 1
+                    raise DockerSlotTimeout(cmd or "docker", wait_timeout)
+                time.sleep(POLL_INTERVALS[priority])
+        finally:
+            with self._lock:
+                self._waiting[priority] -= 1
+            if client is not None and not acquired:
+                try:
+                    client.zrem(REDIS_WAITERS_KEY, waiter)
+                except Exception:
+                    pass
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self._in_flight += 1
+            self._stats["acquired"] += 1
+            self._stats["wait_total"] += waited
+            self._stats["wait_max"] = max(self._stats["wait_max"], waited)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            if file_slot is not None:
+                try:
+                    fcntl.flock(file_slot, fcntl.LOCK_UN)
+                finally:
+                    os.close(file_slot)
+            elif client is not None:
+                try:
+                    client.zrem(REDIS_HOLDERS_KEY, token)
+                except Exception:
+                    pass
+
+    def run(self, cmd: list, timeout: Optional[float] = None, priority: Optional[int] = None, deadline: Optional[float] = None, **kwargs) -> subprocess.CompletedProcess:
+        """
+        subprocess.run() for Docker commands, holding a slot while it runs.
+
+        Args:
+            cmd: Docker command as list
+            timeout: Timeout for the command itself
+            priority: Scheduling class (default: current context)
+            deadline: Total budget in seconds for waiting plus running
+            **kwargs: Passed to subprocess.run
+
+        The time the command ran once its slot was held (without the queue
+        wait) is set as ``run_seconds`` on the result, or on the
+        TimeoutExpired/CalledProcessError raised by subprocess.run.
+
+        Raises:
+            DockerSlotTimeout: No slot became available in time
+            subprocess.TimeoutExpired: The command itself timed out
+        """
+        started = time.monotonic()
+        wait_timeout = DOCKER_QUEUE_TIMEOUT if deadline is None else min(deadline, DOCKER_QUEUE_TIMEOUT)
+        with self.slot(priority=priority, wait_timeout=wait_timeout, lease=timeout or deadline, cmd=cmd):
+            if deadline is not None:
+                remaining = max(0.1, deadline - (time.monotonic() - started))
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            run_started = time.monotonic()
+            try:
+                result = subprocess.run(cmd, timeout=timeout, **kwargs)
+            except subprocess.SubprocessError as e:
+                e.run_seconds = time.monotonic() - run_started
+                raise
+            result.run_seconds = time.monotonic() - run_started
+            return result
     
-    def run_docker_command(self, cmd: list, cwd: Optional[str] = None, timeout: int = 30) -> dict:
+    def run_docker_command(self, cmd: list, cwd: Optional[str] = None, timeout: int = 30, priority: Optional[int] = None) -> dict:
         """
         Run Docker command through the pool to prevent overwhelming the daemon.
         
         Args:
             cmd: Docker command as list
             cwd: Working directory
-            timeout: Command timeout
+            timeout: Command timeout (also the per-call deadline)
+            priority: Scheduling class (default: current context)
         
         Returns:
             Command result dict
         """
-        return async_subprocess(cmd, cwd=cwd, timeout=timeout)
+        try:
+            result = self.run(cmd, cwd=cwd, priority=priority, deadline=timeout, capture_output=True, text=True, check=False)
+            return {
+                'returncode': result.returncode,
+                'stdout': result.stdout,
+                'stderr': result.stderr
+            }
+        except DockerSlotTimeout:
+            return {
+                'returncode': -1,
+                'stdout': '',
+                'stderr': f'No Docker slot available within {timeout} seconds'
+            }
+        except subprocess.TimeoutExpired:
+            return {
+                'returncode': -1,
+                'stdout': '',
+                'stderr': f'Command timed out after {timeout} seconds'
+            }
+        except Exception as e:
+            return {
+                'returncode': -1,
+                'stdout': '',
+                'stderr': str(e)
+            }
+
+    def metrics(self) -> dict:
+        """Queue depth, slot usage and wait times."""
+        with self._lock:
+            waiting = {PRIORITY_NAMES[p]: count for p, count in self._waiting.items()}
+            acquired = self._stats["acquired"]
+            data = {
+                "backend": self.backend,
+                "max_concurrent": self.max_concurrent,
+                "limits": {PRIORITY_NAMES[p]: limit for p, limit in self.limits.items()},
+                "in_flight_worker": self._in_flight,
+                "waiting_worker": waiting,
+                "acquired": acquired,
+                "timeouts": self._stats["timeouts"],
+                "avg_wait_ms": round(self._stats["wait_total"] / acquired * 1000, 1) if acquired else 0.0,
+                "max_wait_ms": round(self._stats["wait_max"] * 1000, 1),
+            }
+
+        client = self._redis()
+        if client is not None:
+            try:
+                now = time.time()
+                data["in_use_node"] = client.zcount(REDIS_HOLDERS_KEY, now, "+inf")
+                waiting_node = {name: 0 for name in PRIORITY_NAMES.values()}
+                for member in client.zrangebyscore(REDIS_WAITERS_KEY, now, "+inf"):
+                    name = PRIORITY_NAMES.get(int(member.split(":", 1)[0]))
+                    if name:
+                        waiting_node[name] += 1
+                data["waiting_node"] = waiting_node
+            except Exception as e:
+                data["redis_error"] = str(e)
+        return data
 
 
 # Global Docker command pool
-docker_pool = DockerCommandPool(max_concurrent=15)
+docker_pool = DockerCommandPool(max_concurrent=DOCKER_MAX_CONCURRENT, backend=DOCKER_SCHEDULER_BACKEND)
 
 
 def get_metrics():
@@ -210,16 +499,27 @@ def get_metrics():
     Get current performance metrics for monitoring.
     
     Returns:
-        dict with worker count, cache hit rate, etc.
+        dict with worker count, Docker scheduler and circuit breaker state,
+        database pool usage, etc.
     """
     try:
         import psutil
+        from db import db
+        from utils.activity_writer import activity_writer
+        from utils.cache import cache_metrics
+        from utils.db_budget import pool_metrics
+        from utils.docker_health import docker_breaker
         
         return {
             'workers': 32,
             'cpu_percent': psutil.cpu_percent(interval=0.1),
             'memory_percent': psutil.virtual_memory().percent,
-            'thread_pool_active': executor._threads.__len__() if hasattr(executor, '_threads') else 0,
+            'thread_pool_active': len(_executor._threads) if _executor is not None else 0,
+            'docker_scheduler': docker_pool.metrics(),
+            'docker_breaker': docker_breaker.metrics(),
+            'activity_log_writer': activity_writer.metrics(),
+            'db_pool': pool_metrics(db.engine),
+            'caches': cache_metrics(),
         }
     except Exception as e:
         return {'error': str(e)}
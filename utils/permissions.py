@@ -0,0 +1,192 @@
+"""
+Request-scoped permission resolver.
+
+``owner_or_subuser_required`` and ``has_permission`` used to query the user,
+the process owner and the sub-user grants on every call, and templates call
+``has_permission`` once per menu entry. The resolver loads everything a user
+may access once per request (kept on ``flask.g``), after which every check is
+a set lookup:
+
+- the names of the processes the user owns
+- the sub-user grants of the user, compiled to a :class:`Permission`
+  bitmask per process
+
+Routes declare the permission they need (``@owner_or_subuser_required(
+Permission.CONSOLE)``), so a sub-user check is a single AND.
+
+The loaded data is also cached in Redis for PERMISSION_CACHE_TTL seconds
+under a global generation number. Any change to ownership or grants calls
+:func:`invalidate_permissions`, which bumps the generation so every worker
+reloads on its next request.
+"""
+
+import enum
+import json
+import os
+from typing import Iterable, Optional, Union
+
+from flask import g, has_app_context, session
+
+from models.process import Process
+from models.subuser import SubUser
+from models.user import User
+from utils.cache import invalidate_tags
+from utils.redis_client import get_redis
+
+# Seconds a user's resolved permissions are cached in Redis
+PERMISSION_CACHE_TTL = int(os.getenv("PERMISSION_CACHE_TTL", "300"))
+
+REDIS_GENERATION_KEY = "permissions:generation"
+REDIS_KEY_PREFIX = "permissions:mask"
+
+# Cache tag (utils/cache.py) of entries that depend on who can see which process
+PERMISSIONS_TAG = "permissions"
+
+
+class Permission(enum.IntFlag):
+    """Sub-user permissions; values match the options of the sub-user invite form."""
+
+    CONSOLE = 1
+    SETTINGS = 2
+    FILE = 4
+    NGINX = 8
+    GIT = 16
+    SCHEDULE = 32
+    SUB_USERS = 64
+    EMAIL = 128
+
+
+def compile_permissions(names: Iterable[str]) -> int:
+    """Bitmask of a stored permission list (unknown names are ignored)."""
+    mask = 0
+    for name in names or []:
+        member = Permission.__members__.get(str(name).upper())
+        if member is not None:
+            mask |= member
+    return mask
+
+
+class PermissionResolver:
+    """Everything one user may access, loaded once."""
+
+    def __init__(self, user_id: int, email: Optional[str], owned: set, grants: dict):
+        # grants: process name -> Permission bitmask
+        self.user_id = user_id
+        self.email = email
+        self.owned = owned
+        self.grants = grants
+
+    @property
+    def exists(self) -> bool:
+        return self.email is not None
+
+    @classmethod
+    def load(cls, user_id: int) -> "PermissionResolver":
+        """Load a user's owned processes and grants from the database."""
+        user = User.query.get(user_id)
+        if not user:
+            return cls(user_id, None, set(), {})
+
+        owned = {name for (name,) in Process.query.with_entities(Process.name).filter_by(owner_id=user_id)}
+        grants = {}
+        for subuser in SubUser.query.filter_by(email=user.email):
+            grants[subuser.process] = grants.get(subuser.process, 0) | compile_permissions(subuser.permissions)
+        return cls(user_id, user.email, owned, grants)
+
+    def as_dict(self) -> dict:
+        return {
+            "email": self.email,
+            "owned": sorted(self.owned),
+            "grants": self.grants,
+        }
+
+    @classmethod
+    def from_dict(cls, user_id: int, data: dict) -> "PermissionResolver":
+        return cls(
+            user_id,
+            data.get("email"),
+            set(data.get("owned", [])),
+            {name: int(mask) for name, mask in data.get("grants", {}).items()},
+        )
+
+    def is_owner(self, name: str) -> bool:
+        return name in self.owned
+
+    def has_permission(self, name: str, permission: Union[Permission, str, None]) -> bool:
+        """
+        Owner of the process, or sub-user of it with the permission.
+
+        Args:
+            name: Process name
+            permission: Required Permission (or its name, as used in
+                templates); None allows owners only
+        """
+        if self.is_owner(name):
+            return True
+        if isinstance(permission, str):
+            permission = Permission.__members__.get(permission.upper())
+        if not permission:
+            return False
+        return bool(self.grants.get(name, 0) & permission)
+
+    def delegable(self, name: str) -> int:
+        """Permissions the user may grant to others on a process: all for the owner, otherwise their own."""
+        if self.is_owner(name):
+            return ~Permission(0)
+        return self.grants.get(name, 0)
+
+
+def _cache_key(user_id: int, generation: str) -> str:
+    return f"{REDIS_KEY_PREFIX}:{user_id}:{generation}"
+
+
+def _load_cached(user_id: int) -> PermissionResolver:
+    client = get_redis()
+    if client is None:
+        return PermissionResolver.load(user_id)
+
+    try:
+        generation = client.get(REDIS_GENERATION_KEY) or "0"
+        raw = client.get(_cache_key(user_id, generation))
+        if raw:
+            return PermissionResolver.from_dict(user_id, json.loads(raw))
+    except Exception:
+        return PermissionResolver.load(user_id)
+
+    resolver = PermissionResolver.load(user_id)
+    try:
+        client.set(_cache_key(user_id, generation), json.dumps(resolver.as_dict()), ex=PERMISSION_CACHE_TTL)
+    except Exception:
+        pass
+    return resolver
+
+
+def get_permission_resolver() -> Optional[PermissionResolver]:
+    """
+    Resolver of the logged in user for the current request.
+
+    Returns:
+        PermissionResolver, or None when nobody is logged in
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return None
+
+    resolver = g.get("permission_resolver")
+    if resolver is None or resolver.user_id != user_id:
+        resolver = _load_cached(user_id)
+        g.permission_resolver = resolver
+    return resolver
+
+
+def invalidate_permissions():
+    """Drop resolved permissions everywhere after an ownership or grant change."""
+    invalidate_tags(PERMISSIONS_TAG)
+    if has_app_context():
+        g.pop("permission_resolver", None)
+    client = get_redis()
+    if client is not None:
+        try:
+            client.incr(REDIS_GENERATION_KEY)
+        except Exception:
+            pass
@@ -12,6 +12,9 @@ from models.process import Process
 from models.user import User
 from utils import get_process_status
 from utils.discord import DiscordNotifier, get_user_discord_settings
+from utils.docker_health import docker_breaker
+from utils.performance import PRIORITY_BACKGROUND, docker_priority
+from utils.process_registry import process_registry
 
 
 class ProcessMonitor:
@@ -62,11 +65,16 @@ class ProcessMonitor:
             
     def _check_all_processes(self):
         """Check all processes for status changes."""
+        # Monitor probes yield to interactive and dashboard Docker calls
+        with docker_priority(PRIORITY_BACKGROUND):
+            self._check_processes()
+
+    def _check_processes(self):
         try:
             from db import db
             
-            # Get all processes from database
-            processes = Process.query.all()
+            # Served from the process registry, no query per cycle
+            processes = process_registry.all()
             
             for process in processes:
                 try:
@@ -88,6 +96,9 @@ class ProcessMonitor:
         
         # Get current status
         status_response = get_process_status(process_name)
+        if status_response.get("stale") or ("error" in status_response and docker_breaker.is_open):
+            # Docker is unavailable: keep the previous status rather than reporting a crash
+            return
         if "error" in status_response:
             current_status = "Error"
         else:
@@ -141,22 +152,15 @@ class ProcessMonitor:
         # Try to get error logs
         error_message = None
         try:
-            import subprocess
             import os
-            from extra import get_project_root
-            
-            BASE_DIR = get_project_root()
-            ACTIVE_SERVERS_DIR = os.path.join(BASE_DIR, 'active-servers')
-            process_dir = os.path.join(ACTIVE_SERVERS_DIR, process_name)
+            from utils.commands import compose, process_dir
             
-            if os.path.exists(process_dir):
+            if os.path.exists(process_dir(process_name)):
                 # Get last 10 lines of logs for error context
-                result = subprocess.run(
-                    ['docker-compose', 'logs', '--tail', '10', '--no-log-prefix'],
-                    capture_output=True,
-                    text=True,
-                    cwd=process_dir,
-                    timeout=5
+                result = compose(
+                    process_name, 'logs', '--tail', '10', '--no-log-prefix',
+                    timeout=5,
+                    priority=PRIORITY_BACKGROUND,
                 )
                 if result.stdout:
                     error_message = result.stdout.strip()
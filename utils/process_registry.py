@@ -0,0 +1,210 @@
+"""
+Per-worker registry of Process rows.
+
+A single request used to look the same process up several times (route,
+helpers, status), each a query. The registry loads every process once per
+worker and serves lookups by name, owner and domain from memory.
+
+Changes are picked up through Redis pub/sub: every commit that inserts,
+updates, renames or deletes a Process publishes the affected names (see the
+session hooks at the bottom), and each worker reloads just those rows on its
+next lookup. Without Redis there is no way to hear about other workers'
+changes, so lookups go to the database as before.
+
+Cached rows are detached copies. Lookups merge them into the current session
+without loading (``merge(load=False)``), so callers get normal persistent
+instances they can modify and commit, and no SQL is emitted.
+"""
+
+import json
+import threading
+import time
+from typing import Iterable, List, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from db import db
+from models.process import Process
+from utils.redis_client import get_pubsub, get_redis
+
+REDIS_CHANNEL = "process_registry:changes"
+
+# Seconds before retrying the subscription after it failed
+RESUBSCRIBE_INTERVAL = 30
+
+SESSION_CHANGES_KEY = "process_registry_changes"
+
+# Published instead of names when the changed rows are unknown: reload everything
+RELOAD_ALL = "*"
+
+
+def _snapshot(row: Process) -> Process:
+    """Detached copy of a loaded row, safe to share between sessions."""
+    copy = Process(**{column.key: getattr(row, column.key) for column in Process.__table__.columns})
+    make_transient_to_detached(copy)
+    return copy
+
+
+class ProcessRegistry:
+    """In-memory Process rows of this worker, kept current through pub/sub."""
+
+    def __init__(self):
+        self._by_name = {}
+        self._by_owner = {}
+        self._by_domain = {}
+        self._loaded = False
+        self._stale = set()
+        self._lock = threading.RLock()
+        self._listening = False
+        self._listen_failed_at = 0.0
+
+    # Pub/sub
+
+    def _listen(self, pubsub):
+        try:
+            for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    names = json.loads(message["data"])
+                except ValueError:
+                    names = [RELOAD_ALL]
+                with self._lock:
+                    if RELOAD_ALL in names:
+                        self._loaded = False
+                    else:
+                        self._stale.update(names)
+        except Exception as e:
+            print(f"[process-registry] Subscription lost, using the database: {e}")
+        with self._lock:
+            self._listening = False
+            self._loaded = False
+            self._listen_failed_at = time.monotonic()
+
+    def _ensure_listening(self) -> bool:
+        if self._listening:
+            return True
+        if self._listen_failed_at and time.monotonic() - self._listen_failed_at < RESUBSCRIBE_INTERVAL:
+            return False
+
+        pubsub = get_pubsub()
+        if pubsub is None:
+            self._listen_failed_at = time.monotonic()
+            return False
+        try:
+            pubsub.subscribe(REDIS_CHANNEL)
+        except Exception as e:
+            print(f"[process-registry] Could not subscribe, using the database: {e}")
+            self._listen_failed_at = time.monotonic()
+            return False
+
+        # Subscribed before loading, so no change can slip in between
+        self._listening = True
+        self._loaded = False
+        threading.Thread(target=self._listen, args=(pubsub,), daemon=True).start()
+        return True
+
+    # Loading
+
+    def _reindex(self):
+        self._by_owner = {}
+        self._by_domain = {}
+        for process in self._by_name.values():
+            self._by_owner.setdefault(process.owner_id, []).append(process)
+            if process.domain:
+                self._by_domain.setdefault(process.domain, []).append(process)
+
+    def _sync(self) -> bool:
+        """Bring the registry up to date; False when it can't be used."""
+        if not self._ensure_listening():
+            return False
+
+        with self._lock:
+            if not self._loaded:
+                self._by_name = {row.name: _snapshot(row) for row in Process.query.all()}
+                self._stale.clear()
+                self._loaded = True
+                self._reindex()
+            elif self._stale:
+                names = list(self._stale)
+                self._stale.clear()
+                for name in names:
+                    self._by_name.pop(name, None)
+                for row in Process.query.filter(Process.name.in_(names)).all():
+                    self._by_name[row.name] = _snapshot(row)
+                self._reindex()
+        return True
+
+    def _attach(self, process: Optional[Process]) -> Optional[Process]:
+        if process is None:
+            return None
+        return db.session.merge(process, load=False)
+
+    # Lookups
+
+    def get(self, name: str) -> Optional[Process]:
+        if not self._sync():
+            return Process.query.filter_by(name=name).first()
+        return self._attach(self._by_name.get(name))
+
+    def by_owner(self, owner_id: int) -> List[Process]:
+        if not self._sync():
+            return Process.query.filter_by(owner_id=owner_id).all()
+        return [self._attach(process) for process in self._by_owner.get(owner_id, [])]
+
+    def by_domain(self, domain: str) -> List[Process]:
+        if not self._sync():
+            return Process.query.filter(Process.domain == domain).all()
+        return [self._attach(process) for process in self._by_domain.get(domain, [])]
+
+    def all(self) -> List[Process]:
+        if not self._sync():
+            return Process.query.all()
+        return [self._attach(process) for process in list(self._by_name.values())]
+
+    # Changes
+
+    def invalidate(self, names: Iterable[str]):
+        """Reload the given processes here and in every other worker."""
+        names = sorted(set(names))
+        if not names:
+            return
+        with self._lock:
+            if RELOAD_ALL in names:
+                self._loaded = False
+            else:
+                self._stale.update(names)
+        client = get_redis()
+        if client is not None:
+            try:
+                client.publish(REDIS_CHANNEL, json.dumps(names))
+            except Exception as e:
+                # Other workers would keep serving the old rows
+                print(f"[process-registry] Failed to publish change of {names}: {e}")
+
+
+process_registry = ProcessRegistry()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_process_changes(session, flush_context):
+    # Attribute history still holds the pre-flush state here, so renames yield the old name too
+    changes = session.info.setdefault(SESSION_CHANGES_KEY, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Process):
+            continue
+        names = [name for name in inspect(obj).attrs.name.history.sum() if name]
+        changes.update(names or [RELOAD_ALL])
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_process_changes(session):
+    changes = session.info.pop(SESSION_CHANGES_KEY, None)
+    if changes:
+        process_registry.invalidate(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_process_changes(session):
+    session.info.pop(SESSION_CHANGES_KEY, None)
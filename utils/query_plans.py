@@ -0,0 +1,81 @@
+"""
+Query plan check for the hot query paths.
+
+Runs EXPLAIN for the queries behind the decorators, load_process, the domain
+uniqueness check and the activity log, and verifies that the index added by
+the ``add_hot_path_indexes`` migration is used, or at least considered, for
+each. On tiny tables MariaDB may still prefer a full scan, so a scan with
+the index among the candidates counts as a pass; a missing candidate means
+the index is missing or the query can't use it.
+
+Usage:
+    flask check-query-plans
+"""
+
+from sqlalchemy import desc, text
+
+from db import db
+from models.activity_log import ActivityLog
+from models.git import GitIntegration
+from models.process import Process
+from models.subuser import SubUser
+from models.user import User
+
+
+def hot_queries():
+    """(description, query, table, expected index) of every checked query."""
+    return [
+        ("owned process names", Process.query.with_entities(Process.name).filter(Process.owner_id == 1),
+         "processes", "ix_processes_owner_id_name"),
+        ("sub-user grants of a user", SubUser.query.filter(SubUser.email == "user@example.com"),
+         "sub_users", "ix_sub_users_email_process"),
+        ("sub-users of a process", SubUser.query.filter(SubUser.process == "example"),
+         "sub_users", "ix_sub_users_process"),
+        ("domain uniqueness", Process.query.filter(Process.domain == "example.com"),
+         "processes", "ix_processes_domain"),
+        ("activity of a user", ActivityLog.query.filter(ActivityLog.user_id == 1).order_by(desc(ActivityLog.timestamp)).limit(50),
+         "activity_logs", "ix_activity_logs_user_id_timestamp"),
+        ("activity by action", ActivityLog.query.filter(ActivityLog.action == "started_process").order_by(desc(ActivityLog.timestamp)).limit(50),
+         "activity_logs", "ix_activity_logs_action_timestamp"),
+        ("activity by username prefix", ActivityLog.query.filter(ActivityLog.username.like("adm%")).order_by(desc(ActivityLog.timestamp)).limit(50),
+         "activity_logs", "ix_activity_logs_username_timestamp"),
+        ("git integrations of a process", GitIntegration.query.filter(GitIntegration.process_name == "example"),
+         "git_integrations", "ix_git_integrations_process_name"),
+        ("reset token lookup", User.query.filter(User.reset_token == "token"),
+         "users", "ix_users_reset_token"),
+    ]
+
+
+def explain(query) -> list:
+    """EXPLAIN rows (as dicts) of a Flask-SQLAlchemy query."""
+    sql = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True})
+    result = db.session.execute(text(f"EXPLAIN {sql}"))
+    return [dict(row._mapping) for row in result]
+
+
+def check_query_plans() -> list:
+    """
+    Explain every hot query.
+
+    Returns:
+        list of dicts with 'query', 'index', 'ok', 'key', 'type' and 'rows'
+    """
+    results = []
+    for description, query, table, index in hot_queries():
+        try:
+            rows = [row for row in explain(query) if row.get("table") == table]
+        except Exception as e:
+            results.append({"query": description, "index": index, "ok": False, "error": str(e)})
+            continue
+
+        row = rows[0] if rows else {}
+        candidates = (row.get("possible_keys") or "").split(",")
+        results.append({
+            "query": description,
+            "index": index,
+            "ok": row.get("key") == index or index in candidates,
+            "key": row.get("key"),
+            "type": row.get("type"),
+            "rows": row.get("rows"),
+        })
+    return results
@@ -0,0 +1,243 @@
+"""
+Readiness detection for process starts.
+
+Replaces the fixed ``time.sleep(2)`` waits after ``docker-compose up`` and
+``docker exec`` with a waiter that combines container events, optional
+compose healthchecks and a TCP probe on the process port. It returns as soon
+as the process is reachable and fails fast when the container or process
+exits, bounded by a configurable deadline.
+
+Every process has a published port, but bots, workers and scripts never
+listen on it, so the port probe only decides until the settle time has
+passed; a process that is still alive then counts as started.
+"""
+
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from utils.commands import docker, popen
+
+# Upper bound for a single readiness wait (seconds)
+DEFAULT_READY_TIMEOUT = float(os.getenv("PROCESS_READY_TIMEOUT", "30"))
+
+# How long a process without healthcheck or listener must stay alive to count as started
+DEFAULT_SETTLE_TIME = float(os.getenv("PROCESS_READY_SETTLE", "1.0"))
+
+POLL_INTERVAL = 0.25
+ALIVE_CHECK_INTERVAL = 1.0
+HEALTH_POLL_INTERVAL = 2.0
+
+EXIT_ACTIONS = {"die", "oom", "kill", "stop", "destroy"}
+
+
+class ContainerEventWatcher:
+    """Follow ``docker events`` for a single container in the background."""
+
+    def __init__(self, container_id: str):
+        self.container_id = container_id
+        self.exited = False
+        self.exit_code: Optional[str] = None
+        self.health: Optional[str] = None
+        self._process = None
+        self._thread = None
+
+    def start(self):
+        try:
+            self._process = popen(
+                [
+                    "docker", "events",
+                    "--filter", f"container={self.container_id}",
+                    "--filter", "type=container",
+                    "--format", "{{json .}}",
+                ],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                bufsize=1,
+            )
+        except Exception as e:
+            print(f"[readiness] Failed to follow events for {self.container_id}: {e}")
+            return self
+
+        self._thread = threading.Thread(target=self._read_events, daemon=True)
+        self._thread.start()
+        return self
+
+    def _read_events(self):
+        if self._process is None or self._process.stdout is None:
+            return
+        for line in iter(self._process.stdout.readline, ""):
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+            action = event.get("Action") or event.get("status") or ""
+            if action in EXIT_ACTIONS:
+                self.exited = True
+                attributes = event.get("Actor", {}).get("Attributes", {})
+                self.exit_code = attributes.get("exitCode", self.exit_code)
+            elif action.startswith("health_status:"):
+                self.health = action.split(":", 1)[1].strip()
+
+    def stop(self):
+        if self._process is None:
+            return
+        try:
+            self._process.terminate()
+            self._process.wait(timeout=2)
+        except Exception:
+            try:
+                self._process.kill()
+            except Exception:
+                pass
+
+
+def get_container_health(container_id: str) -> Optional[str]:
+    """Return the compose healthcheck status, or None when no healthcheck is defined."""
+    try:
+        result = docker("inspect", "--format", "{{if .State.Health}}{{.State.Health.Status}}{{end}}", container_id, timeout=5)
+    except Exception:
+        return None
+    status = result.stdout.strip()
+    return status or None
+
+
+def is_container_running(container_id: str) -> bool:
+    """Check whether the container itself is still in the running state."""
+    try:
+        result = docker("inspect", "--format", "{{.State.Status}}", container_id, timeout=5)
+    except Exception:
+        return False
+    return result.returncode == 0 and result.stdout.strip() == "running"
+
+
+def resolve_probe_address(container_id: str, host_port: int) -> Tuple[str, int]:
+    """
+    Resolve the address to probe for a published host port.
+
+    Docker's userland proxy accepts connections on the host port even when
+    nothing listens inside the container, so the probe targets the container
+    IP and the container-side port instead. Falls back to the host port.
+    """
+    try:
+        result = docker("inspect", "--format", "{{json .NetworkSettings}}", container_id, timeout=5)
+        settings = json.loads(result.stdout or "{}")
+    except Exception:
+        return "127.0.0.1", host_port
+
+    container_port = None
+    for port_spec, bindings in (settings.get("Ports") or {}).items():
+        for binding in bindings or []:
+            if str(binding.get("HostPort")) == str(host_port):
+                container_port = int(port_spec.split("/")[0])
+                break
+        if container_port:
+            break
+
+    container_ip = None
+    for network in (settings.get("Networks") or {}).values():
+        if network.get("IPAddress"):
+            container_ip = network["IPAddress"]
+            break
+
+    if container_ip and container_port:
+        return container_ip, container_port
+    return "127.0.0.1", host_port
+
+
+def probe_tcp(host: str, port: int, timeout: float = 0.5) -> bool:
+    """Return True when a TCP connection to host:port succeeds."""
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def wait_for_ready(
+    container_id: str,
+    port: Optional[int] = None,
+    is_alive: Optional[Callable[[], bool]] = None,
+    timeout: Optional[float] = None,
+    settle: Optional[float] = None,
+) -> dict:
+    """
+    Wait until a started process is ready, has exited, or the deadline passes.
+
+    Args:
+        container_id: Container the process runs in
+        port: Published host port to probe (e.g. 8000 + port_id)
+        is_alive: Optional liveness check for a process inside an always-running container
+        timeout: Deadline in seconds (default: PROCESS_READY_TIMEOUT)
+        settle: Time a process without healthcheck or listener must survive (default: PROCESS_READY_SETTLE)
+
+    Returns:
+        dict with 'ready' (bool), 'reason' and 'elapsed' seconds
+
+    Example:
+        result = wait_for_ready(container_id, port=8000 + process.port_id)
+        if not result['ready']:
+            print(result['reason'])
+    """
+    timeout = DEFAULT_READY_TIMEOUT if timeout is None else timeout
+    settle = DEFAULT_SETTLE_TIME if settle is None else settle
+
+    started = time.monotonic()
+    deadline = started + timeout
+
+    def _result(ready, reason):
+        return {"ready": ready, "reason": reason, "elapsed": round(time.monotonic() - started, 2)}
+
+    watcher = ContainerEventWatcher(container_id).start()
+    try:
+        health = get_container_health(container_id)
+        probe_host, probe_port = resolve_probe_address(container_id, port) if port else (None, None)
+
+        last_alive_check = 0.0
+        last_health_check = time.monotonic()
+
+        while True:
+            now = time.monotonic()
+
+            if watcher.exited:
+                code = f" (exit code {watcher.exit_code})" if watcher.exit_code is not None else ""
+                return _result(False, f"Container exited during startup{code}")
+
+            if now - last_alive_check >= ALIVE_CHECK_INTERVAL:
+                last_alive_check = now
+                if not is_container_running(container_id):
+                    return _result(False, "Container is not running")
+                if is_alive is not None and not is_alive():
+                    return _result(False, "Process exited during startup")
+
+            if health is not None:
+                if watcher.health:
+                    health = watcher.health
+                elif now - last_health_check >= HEALTH_POLL_INTERVAL:
+                    last_health_check = now
+                    health = get_container_health(container_id) or health
+
+                if health == "healthy":
+                    return _result(True, "Healthcheck passed")
+                if health == "unhealthy":
+                    return _result(False, "Healthcheck reported unhealthy")
+            else:
+                if probe_port and probe_tcp(probe_host, probe_port):
+                    return _result(True, f"Accepting connections on port {port}")
+                if now - started >= settle:
+                    # Not listening (yet): many processes never bind their port
+                    return _result(True, "Process is running")
+
+            if now >= deadline:
+                # Still alive but never reported ready: slow starters are not crashes
+                return _result(True, "Process is running (not yet accepting connections)")
+
+            time.sleep(POLL_INTERVAL)
+    finally:
+        watcher.stop()
@@ -0,0 +1,214 @@
+"""
+BuildKit-backed rebuild pipeline.
+
+The previous rebuild ran ``docker-compose down`` followed by a plain
+``docker-compose build``, so a process was offline for the whole build and
+every build started without layer or dependency cache. This pipeline builds
+the new image with BuildKit while the old container keeps serving, streams
+the build as structured events and only swaps containers after a successful
+build, so downtime is limited to the swap itself.
+
+Both the build and the swap go through the execution layer
+(:mod:`utils.commands`) as background work of the Docker scheduler, so a
+rebuild can't crowd out status polls and user actions.
+
+Processes created from the warm pool (:mod:`utils.warm_pool`) have no
+``build:`` section: there is nothing to build, and their dependencies are
+installed by SM_PREPARE once per container. For those the rebuild skips the
+build and recreates the container, so the new one installs the current
+dependencies again.
+"""
+
+import os
+import re
+import subprocess
+from typing import Callable, Optional
+
+import yaml
+
+from utils.commands import compose, compose_popen, process_dir
+from utils.performance import PRIORITY_BACKGROUND, DockerSlotTimeout, docker_pool
+
+# BuildKit for both compose v1 (via the docker CLI) and compose v2, with line based progress
+BUILDKIT_ENV = {
+    "DOCKER_BUILDKIT": "1",
+    "COMPOSE_DOCKER_CLI_BUILD": "1",
+    "BUILDKIT_PROGRESS": "plain",
+}
+
+# Header that enables RUN --mount cache mounts in generated Dockerfiles
+DOCKERFILE_SYNTAX = "# syntax=docker/dockerfile:1"
+
+STEP_RE = re.compile(r"^#(\d+) \[(?:(\S+) )?(\d+)/(\d+)\] (.+)$")
+CACHED_RE = re.compile(r"^#(\d+) CACHED$")
+DONE_RE = re.compile(r"^#(\d+) DONE ([\d.]+)s$")
+ERROR_RE = re.compile(r"^#(\d+) ERROR:? (.*)$")
+OUTPUT_RE = re.compile(r"^#(\d+) [\d.]+ (.*)$")
+
+# Seconds a build holds its Docker slot before the lease may be reclaimed
+BUILD_SLOT_LEASE = 1800
+
+
+def buildkit_env() -> dict:
+    """Environment for docker/docker-compose commands that should build with BuildKit."""
+    env = os.environ.copy()
+    env.update(BUILDKIT_ENV)
+    return env
+
+
+def parse_build_line(line: str) -> Optional[dict]:
+    """
+    Turn one line of BuildKit plain progress output into a structured event.
+
+    Returns:
+        dict with a 'type' of step, cached, done, error, output or log, or
+        None for blank lines
+    """
+    line = line.rstrip()
+    if not line:
+        return None
+
+    match = STEP_RE.match(line)
+    if match:
+        return {
+            "type": "step",
+            "id": int(match.group(1)),
+            "stage": match.group(2),
+            "step": int(match.group(3)),
+            "total": int(match.group(4)),
+            "instruction": match.group(5),
+        }
+
+    match = CACHED_RE.match(line)
+    if match:
+        return {"type": "cached", "id": int(match.group(1))}
+
+    match = DONE_RE.match(line)
+    if match:
+        return {"type": "done", "id": int(match.group(1)), "seconds": float(match.group(2))}
+
+    match = ERROR_RE.match(line)
+    if match:
+        return {"type": "error", "id": int(match.group(1)), "message": match.group(2)}
+
+    match = OUTPUT_RE.match(line)
+    if match:
+        return {"type": "output", "id": int(match.group(1)), "message": match.group(2)}
+
+    return {"type": "log", "message": line}
+
+
+def format_build_event(event: dict) -> str:
+    """Render a build event as a console line."""
+    kind = event.get("type")
+    if kind == "phase":
+        return f"[rebuild] {event['message']}"
+    if kind == "step":
+        stage = f"{event['stage']} " if event.get("stage") else ""
+        return f"[rebuild] [{stage}{event['step']}/{event['total']}] {event['instruction']}"
+    if kind == "cached":
+        return f"[rebuild] #{event['id']} cached"
+    if kind == "done":
+        return f"[rebuild] #{event['id']} done in {event['seconds']:.1f}s"
+    if kind == "error":
+        return f"[rebuild error] #{event['id']} {event['message']}"
+    if kind == "output":
+        return f"[rebuild] #{event['id']} {event['message']}"
+    return f"[rebuild] {event.get('message', '')}"
+
+
+def uses_prebuilt_image(name: str) -> bool:
+    """Whether a process runs a pre-built (warm pool) image instead of building its own."""
+    try:
+        with open(os.path.join(process_dir(name), "docker-compose.yml")) as f:
+            services = (yaml.safe_load(f) or {}).get("services") or {}
+    except Exception:
+        return False
+    return any("image" in service and "build" not in service for service in services.values() if isinstance(service, dict))
+
+
+def rebuild_process_image(name: str, emit: Callable[[dict], None], after_swap: Optional[Callable[[], None]] = None) -> dict:
+    """
+    Build a process image with BuildKit and swap the running container on success.
+
+    Args:
+        name: Process name
+        emit: Called with every structured build event (phase, step, cached, ...)
+        after_swap: Optional callback run once the new container is up
+
+    Returns:
+        dict with 'success' and 'message' or 'error'
+
+    Example:
+        rebuild_process_image(name, emit=lambda e: print(format_build_event(e)))
+    """
+    env = buildkit_env()
+
+    if uses_prebuilt_image(name):
+        emit({"type": "phase", "phase": "swap", "message": "Process uses a warm pool image, recreating the container to reinstall dependencies..."})
+        return _swap(name, env, emit, after_swap, recreate=True)
+
+    emit({"type": "phase", "phase": "build", "message": "Building new image (current container keeps running)..."})
+
+    steps_total = 0
+    steps_cached = 0
+    try:
+        with docker_pool.slot(priority=PRIORITY_BACKGROUND, lease=BUILD_SLOT_LEASE, cmd=["docker-compose", "build"]):
+            build = compose_popen(
+                name, "build",
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+            )
+            if build.stdout is not None:
+                with build.stdout:
+                    for line in iter(build.stdout.readline, ""):
+                        event = parse_build_line(line)
+                        if event is None:
+                            continue
+                        if event["type"] == "step":
+                            steps_total += 1
+                        elif event["type"] == "cached":
+                            steps_cached += 1
+                        emit(event)
+            build.wait()
+    except DockerSlotTimeout:
+        emit({"type": "phase", "phase": "failed", "message": "Docker is busy, the build could not start. Try again later."})
+        return {"success": False, "error": "No Docker slot available for the build"}
+    except Exception as e:
+        emit({"type": "phase", "phase": "failed", "message": f"Failed to start build: {e}"})
+        return {"success": False, "error": str(e)}
+
+    if build.returncode != 0:
+        emit({"type": "phase", "phase": "failed", "message": "Build failed, the running container was left untouched."})
+        return {"success": False, "error": f"Build exited with code {build.returncode}"}
+
+    emit({
+        "type": "phase",
+        "phase": "swap",
+        "message": f"Build finished ({steps_cached}/{steps_total} steps cached), swapping container...",
+    })
+
+    return _swap(name, env, emit, after_swap)
+
+
+def _swap(name: str, env: dict, emit: Callable[[dict], None], after_swap: Optional[Callable[[], None]], recreate: bool = False) -> dict:
+    """Start the process on its current image; recreate also replaces an unchanged container."""
+    args = ["up", "-d", "--no-build", "--remove-orphans"]
+    if recreate:
+        args.append("--force-recreate")
+    swap = compose(name, *args, env=env, priority=PRIORITY_BACKGROUND)
+    if swap.returncode != 0:
+        emit({"type": "phase", "phase": "failed", "message": f"Container swap failed: {swap.stderr.strip()}"})
+        return {"success": False, "error": swap.stderr.strip()}
+
+    if after_swap is not None:
+        try:
+            after_swap()
+        except Exception as e:
+            emit({"type": "phase", "phase": "swap", "message": f"Post-swap step failed: {e}"})
+
+    emit({"type": "phase", "phase": "done", "message": "Build process finished."})
+    return {"success": True, "message": "Rebuild completed"}
@@ -0,0 +1,85 @@
+"""
+Shared Redis connection for cross-worker coordination.
+
+Uses the same REDIS_HOST/REDIS_PORT as the worker lock and Flask-Caching in
+app.py. The client is created lazily, once per worker, and callers are
+expected to degrade gracefully when it returns None (Redis not installed or
+not reachable).
+"""
+
+import os
+import threading
+import time
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+
+# Database for coordination data (worker lock uses 0, Flask-Caching uses 1)
+REDIS_COORDINATION_DB = int(os.getenv("REDIS_COORDINATION_DB", "0"))
+
+# Seconds to wait before trying again after Redis was unreachable
+RETRY_INTERVAL = 30
+
+_client = None
+_unavailable_since = 0.0
+_lock = threading.Lock()
+
+
+def _connect(socket_timeout):
+    import redis
+
+    return redis.StrictRedis(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=REDIS_COORDINATION_DB,
+        decode_responses=True,
+        socket_timeout=socket_timeout,
+        socket_connect_timeout=2,
+    )
+
+
+def get_redis():
+    """
+    Return the shared Redis client, or None when Redis is unavailable.
+
+    Example:
+        client = get_redis()
+        if client is not None:
+            client.incr("counter")
+    """
+    global _client, _unavailable_since
+
+    if _client is not None:
+        return _client
+    if _unavailable_since and time.monotonic() - _unavailable_since < RETRY_INTERVAL:
+        return None
+
+    with _lock:
+        if _client is not None:
+            return _client
+        try:
+            client = _connect(socket_timeout=2)
+            client.ping()
+        except Exception as e:
+            if not _unavailable_since:
+                print(f"[redis] Unavailable, using local fallbacks: {e}")
+            _unavailable_since = time.monotonic()
+            return None
+
+        _client = client
+        _unavailable_since = 0.0
+        return _client
+
+
+def get_pubsub():
+    """
+    Return a new PubSub on its own connection (no read timeout, so listen()
+    can block), or None when Redis is unavailable.
+    """
+    if get_redis() is None:
+        return None
+    try:
+        return _connect(socket_timeout=None).pubsub()
+    except Exception as e:
+        print(f"[redis] Could not create pub/sub connection: {e}")
+        return None
@@ -0,0 +1,295 @@
+"""
+Process status engine.
+
+Status used to be determined in two places (``utils.get_process_status`` and
+the ``Process.status`` model property) with slightly different rules, and a
+single status read could run four to six docker subprocesses. All status
+determination now goes through :data:`status_engine`, which probes in tiers
+and stops at the first one that answers:
+
+1. cache:     a result younger than PROCESS_STATUS_TTL (dropped in every
+               worker when the process tag is invalidated, see process_tag)
+2. supervisor: supervised containers publish their state in a file, no
+               docker call at all
+3. container: one ``docker inspect`` returning the container state and its
+              environment (the container ID is remembered between probes)
+4. liveness:  ``docker exec ps aux`` for always-running containers whose
+              main process can die while the container keeps running
+
+:meth:`StatusEngine.peek` never calls Docker. It is what ``Process.status``
+uses, so templates and serializers can touch the attribute freely.
+"""
+
+import os
+import subprocess
+import threading
+import time
+from typing import Optional
+
+from utils.cache import ensure_subscribed, on_invalidate
+from utils.commands import docker, get_container_id, process_dir
+from utils.docker_health import DockerUnavailable, docker_breaker, forget_status, last_known_status, remember_status
+from utils.supervisor import get_supervisor_state, is_supervised, supervisor_alive
+
+# Seconds a probed status is served from the cache
+PROCESS_STATUS_TTL = float(os.getenv("PROCESS_STATUS_TTL", "5"))
+
+PROCESS_TAG_PREFIX = "process:"
+
+
+def process_tag(name: str) -> str:
+    """Cache tag of everything derived from a process' status (see utils/cache.py)."""
+    return f"{PROCESS_TAG_PREFIX}{name}"
+
+
+def owner_tag(owner_id) -> str:
+    """Cache tag of everything derived from the processes of one owner."""
+    return f"owner:{owner_id}"
+
+
+# Container state and environment in a single inspect call
+INSPECT_FORMAT = "{{.State.Status}}\n{{range .Config.Env}}{{println .}}{{end}}"
+
+# Map MAIN_COMMAND words to the process names that actually run
+PROCESS_NAME_MAPPINGS = {
+    "apache2-foreground": ["apache2", "httpd"],
+    "php-fpm": ["php-fpm"],
+    "nginx": ["nginx"],
+    "vite": ["node", "vite"],
+    "npm": ["node", "npm"],
+    "node": ["node"],
+    "nodejs": ["node", "npm"],
+    "minecraft": ["java"],
+    "java": ["java"],
+    "python": ["python", "python3"],
+    "python3": ["python3"],
+}
+
+# Types whose main process is the container itself, so the container state is enough
+CONTAINER_STATE_TYPES = {"python"}
+
+
+def get_supervised_status(directory: str) -> dict:
+    """Status of a supervised process, read from the supervisor's shared state"""
+    if not supervisor_alive(directory):
+        return {"status": "Exited", "container_running": False, "process_running": False}
+
+    state = get_supervisor_state(directory) or {}
+    process_running = state.get("state") in ("running", "stopping")
+    return {
+        "status": "Running" if process_running else "Process Stopped",
+        "container_running": True,
+        "process_running": process_running,
+        "exit_code": state.get("exit_code"),
+        "restarts": state.get("restarts", 0),
+    }
+
+
+def main_process_running(ps_output: str, main_command: str) -> bool:
+    """Whether `ps aux` output contains the main command (zombies excluded)."""
+    command_parts = main_command.split()
+
+    search_terms = []
+    for part in command_parts:
+        if part in PROCESS_NAME_MAPPINGS:
+            search_terms.extend(PROCESS_NAME_MAPPINGS[part])
+        elif len(part) > 2:  # Only use meaningful parts
+            search_terms.append(part)
+
+    for line in ps_output.split("\n")[1:]:  # Skip header
+        if not line.strip():
+            continue
+        # Skip ps/grep themselves and zombie processes
+        if "ps aux" in line or "grep" in line:
+            continue
+        if "<defunct>" in line or " Z " in line:
+            continue
+        if any(term in line for term in search_terms):
+            return True
+    return False
+
+
+class StatusEngine:
+    """Tiered, cached status determination for process containers."""
+
+    def __init__(self, ttl: float = PROCESS_STATUS_TTL):
+        self.ttl = ttl
+        self._cache = {}
+        self._container_ids = {}
+        self._lock = threading.Lock()
+        on_invalidate(self._on_invalidate)
+
+    # Cache
+
+    def _on_invalidate(self, tags):
+        # Power actions in any worker invalidate process_tag(name)
+        if tags is None:
+            self.invalidate()
+            return
+        for tag in tags:
+            if tag.startswith(PROCESS_TAG_PREFIX):
+                self.invalidate(tag[len(PROCESS_TAG_PREFIX):])
+
+    def _cached(self, name: str, max_age: float) -> Optional[dict]:
+        ensure_subscribed()
+        entry = self._cache.get(name)
+        if entry and time.monotonic() - entry["cached_at"] < max_age:
+            return dict(entry["status"])
+        return None
+
+    def _store(self, name: str, status: dict) -> dict:
+        if "error" not in status:
+            with self._lock:
+                self._cache[name] = {"status": dict(status), "cached_at": time.monotonic()}
+        return status
+
+    def invalidate(self, name: Optional[str] = None):
+        """
+        Drop cached results of this worker (all processes when no name is
+        given); invalidate_tags(process_tag(name)) does so in every worker.
+        The last known status of a named process is dropped as well, it
+        predates the power action that caused the invalidation.
+        """
+        with self._lock:
+            if name is None:
+                self._cache.clear()
+                self._container_ids.clear()
+            else:
+                self._cache.pop(name, None)
+                self._container_ids.pop(name, None)
+        if name is not None:
+            forget_status(name)
+
+    # Probes
+
+    def _inspect(self, name: str) -> Optional[dict]:
+        """
+        Container state and main command of a process.
+
+        Returns:
+            dict with 'id', 'state' and 'main_command' (None for legacy
+            containers), or None when the process has no container
+        """
+        container_id = self._container_ids.get(name)
+        for attempt in range(2):
+            if not container_id:
+                container_id = get_container_id(name, check=True)
+                if not container_id:
+                    self._container_ids.pop(name, None)
+                    return None
+
+            result = docker("inspect", "--format", INSPECT_FORMAT, container_id)
+            if result.returncode == 0:
+                break
+            # Remembered ID belongs to a removed container: look it up again
+            container_id = None
+        else:
+            raise subprocess.CalledProcessError(result.returncode, result.args, result.stdout, result.stderr)
+
+        self._container_ids[name] = container_id
+        lines = result.stdout.split("\n")
+        main_command = None
+        for line in lines[1:]:
+            if line.startswith("MAIN_COMMAND="):
+                main_command = line.split("=", 1)[1].strip('"')
+                break
+        return {"id": container_id, "state": lines[0].strip(), "main_command": main_command}
+
+    def _probe(self, name: str, process_type: Optional[str], liveness: Optional[bool]) -> dict:
+        directory = process_dir(name)
+        if is_supervised(directory):
+            return {"process": name, **get_supervised_status(directory)}
+
+        info = self._inspect(name)
+        if info is None or info["state"] != "running":
+            return {"process": name, "status": "Exited", "container_running": False, "process_running": False}
+
+        running = {"process": name, "status": "Running", "container_running": True, "process_running": True}
+        if not info["main_command"]:
+            # Legacy container: the container is the process
+            return running
+        if liveness is None:
+            liveness = process_type not in CONTAINER_STATE_TYPES
+        if not liveness:
+            return running
+
+        result = docker("exec", info["id"], "ps", "aux")
+        if result.returncode == 0 and main_process_running(result.stdout, info["main_command"]):
+            return running
+        return {"process": name, "status": "Process Stopped", "container_running": True, "process_running": False}
+
+    def get(self, name: str, process_type: Optional[str] = None, max_age: Optional[float] = None, liveness: Optional[bool] = None) -> dict:
+        """
+        Status of a process, probing only as deep as needed.
+
+        Args:
+            name: Process name
+            process_type: Handler type (python containers skip the liveness tier)
+            max_age: Accept cached results up to this age (default PROCESS_STATUS_TTL, 0 forces a probe)
+            liveness: Force (True) or skip (False) the in-container process check
+
+        Returns:
+            dict with 'process', 'status', 'container_running' and
+            'process_running'; the last known status marked 'stale' while
+            Docker is unavailable; or a dict with 'error'
+        """
+        cached = self._cached(name, self.ttl if max_age is None else max_age)
+        if cached is not None:
+            return cached
+
+        try:
+            status = self._probe(name, process_type, liveness)
+        except DockerUnavailable as e:
+            status = {"error": str(e)}
+        except subprocess.CalledProcessError as e:
+            status = {"error": f"Failed to get process status: {e.stderr}"}
+        except Exception as e:
+            status = {"error": str(e)}
+
+        if "error" in status and docker_breaker.is_open:
+            # Docker is not answering: serve the last known state instead of an error
+            stale = last_known_status(name)
+            return stale if stale is not None else status
+
+        return self._store(name, remember_status(name, status))
+
+    def peek(self, name: str) -> dict:
+        """
+        Status without calling Docker when possible: cache of any age,
+        supervisor state, then the last status known by any worker. When
+        nothing is known (e.g. right after a power action) the process is
+        probed once.
+
+        Returns:
+            dict with at least 'status' ('Unknown' when the probe failed)
+        """
+        ensure_subscribed()
+        entry = self._cache.get(name)
+        if entry:
+            return dict(entry["status"])
+
+        directory = process_dir(name)
+        if is_supervised(directory):
+            return {"process": name, **get_supervised_status(directory)}
+
+        known = last_known_status(name)
+        if known is not None:
+            return known
+
+        status = self.get(name)
+        if "error" in status:
+            return {"process": name, "status": "Unknown"}
+        return status
+
+    def is_always_running(self, name: str) -> bool:
+        """Whether the container keeps running independently of its main process (MAIN_COMMAND set)."""
+        if is_supervised(process_dir(name)):
+            return True
+        try:
+            info = self._inspect(name)
+        except Exception:
+            return False
+        return bool(info and info["main_command"])
+
+
+status_engine = StatusEngine()
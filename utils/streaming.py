@@ -0,0 +1,39 @@
+"""
+Helpers for long-lived streaming responses.
+
+A request's SQLAlchemy session keeps its pool connection until the request
+context is torn down, and with ``stream_with_context`` that only happens
+when the stream ends, which for a console can be hours later. Streaming
+endpoints resolve everything they need from the database first and then
+return through :func:`event_stream`, which ends the session so the
+connection goes back to the pool before the first byte is sent.
+"""
+
+from flask import Response, stream_with_context
+
+
+def release_db_connection():
+    """End the current session and return its connection to the pool."""
+    from db import db
+
+    db.session.remove()
+
+
+def event_stream(generator, headers: dict = None) -> Response:
+    """
+    Server-sent events response that doesn't hold a database connection.
+
+    The generator keeps the request context (session, request args), but
+    must not use the database; a query would check out a connection again
+    for the rest of the stream.
+    """
+    release_db_connection()
+    return Response(
+        stream_with_context(generator),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # for Nginx
+            **(headers or {}),
+        }
+    )
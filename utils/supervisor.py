@@ -0,0 +1,319 @@
+"""
+In-container process supervisor.
+
+Always-running containers used to keep ``tail -f /dev/null`` as PID 1 and
+start the real process through ``docker exec``, with status derived from
+``ps aux`` substring matching. Supervised containers instead run a small
+POSIX sh supervisor (under ``init: true`` for zombie reaping) that owns the
+main process, captures its output, applies a restart policy and publishes
+its state in a directory shared with the host:
+
+    <process_dir>/.supervisor/supervisor.sh   the supervisor itself
+    <process_dir>/.supervisor/control         FIFO accepting start/stop/restart
+    <process_dir>/.supervisor/state.json      state, pid, exit code, restarts
+    <process_dir>/.supervisor/process.log     captured stdout/stderr
+
+When SM_PREPARE is set (warm pool images, see :mod:`utils.warm_pool`) the
+supervisor runs it once per container before the first start and reports
+the ``preparing`` state meanwhile.
+
+Handler images share no runtime beyond ``sh``, so the control channel is a
+FIFO rather than a unix socket: the supervisor holds it open for reading,
+which means a non-blocking open for writing from the host fails with ENXIO
+exactly when the supervisor (and therefore the container) is down. Status
+and control are a file read or a single write, with no docker exec.
+"""
+
+import errno
+import json
+import os
+import stat
+import time
+from typing import Optional
+
+SUPERVISOR_DIRNAME = ".supervisor"
+CONTAINER_SUPERVISOR_DIR = "/run/supervisor"
+
+SUPERVISOR_SCRIPT = r"""#!/bin/sh
+# Server Manager process supervisor. Generated file, do not edit.
+STATE_DIR="${SM_STATE_DIR:-/run/supervisor}"
+CONTROL="$STATE_DIR/control"
+STATE_FILE="$STATE_DIR/state.json"
+PGID_FILE="$STATE_DIR/pgid"
+STOP_FLAG="$STATE_DIR/stop-requested"
+# Container local on purpose: a recreated container must prepare again
+PREPARED_FLAG="/tmp/.supervisor-prepared"
+SM_LOG_FILE="${SM_LOG_FILE:-$STATE_DIR/process.log}"
+SM_WORKDIR="${SM_WORKDIR:-/app}"
+SM_RESTART="${SM_RESTART:-no}"
+SM_MAX_RESTARTS="${SM_MAX_RESTARTS:-5}"
+SM_STOP_GRACE="${SM_STOP_GRACE:-10}"
+STATE_TMP="$STATE_FILE.main"
+RUNNER_PID=""
+
+# Compose list-style environment keeps the JSON quotes around the command
+MAIN_COMMAND="${MAIN_COMMAND#\"}"
+MAIN_COMMAND="${MAIN_COMMAND%\"}"
+
+write_state() {
+    # state pid exit_code restarts started_at
+    printf '{"state": "%s", "pid": %s, "exit_code": %s, "restarts": %s, "started_at": %s, "updated_at": %s}\n' \
+        "$1" "${2:-null}" "${3:-null}" "${4:-0}" "${5:-null}" "$(date +%s)" > "$STATE_TMP" \
+        && mv -f "$STATE_TMP" "$STATE_FILE"
+}
+
+run_main() {
+    STATE_TMP="$STATE_FILE.runner"
+    restarts=0
+    delay=1
+    # Dependencies of warm pool images are installed once per container
+    if [ -n "$SM_PREPARE" ] && [ ! -f "$PREPARED_FLAG" ]; then
+        write_state preparing
+        echo "[supervisor] preparing: $SM_PREPARE" >> "$SM_LOG_FILE"
+        if (cd "$SM_WORKDIR" 2>/dev/null || cd /; sh -c "$SM_PREPARE") >> "$SM_LOG_FILE" 2>&1 < /dev/null; then
+            touch "$PREPARED_FLAG"
+        else
+            write_state crashed null 1 0
+            return
+        fi
+    fi
+    while :; do
+        rm -f "$STOP_FLAG"
+        cd "$SM_WORKDIR" 2>/dev/null || cd /
+        if command -v setsid >/dev/null 2>&1; then
+            setsid sh -c "exec $MAIN_COMMAND" >> "$SM_LOG_FILE" 2>&1 < /dev/null &
+        else
+            sh -c "exec $MAIN_COMMAND" >> "$SM_LOG_FILE" 2>&1 < /dev/null &
+        fi
+        pid=$!
+        started_at=$(date +%s)
+        echo "$pid" > "$PGID_FILE"
+        write_state running "$pid" null "$restarts" "$started_at"
+
+        wait "$pid"
+        code=$?
+        rm -f "$PGID_FILE"
+
+        if [ -f "$STOP_FLAG" ]; then
+            write_state stopped null "$code" "$restarts"
+            return
+        fi
+
+        case "$SM_RESTART" in
+            always) ;;
+            on-failure) [ "$code" -ne 0 ] || { write_state exited null "$code" "$restarts"; return; } ;;
+            *)
+                if [ "$code" -eq 0 ]; then write_state exited null "$code" "$restarts"; else write_state crashed null "$code" "$restarts"; fi
+                return
+                ;;
+        esac
+
+        restarts=$((restarts + 1))
+        if [ "$restarts" -gt "$SM_MAX_RESTARTS" ]; then
+            write_state crashed null "$code" "$restarts"
+            return
+        fi
+        echo "[supervisor] process exited with code $code, restarting in ${delay}s" >> "$SM_LOG_FILE"
+        write_state restarting null "$code" "$restarts"
+        sleep "$delay"
+        [ -f "$STOP_FLAG" ] && { write_state stopped null "$code" "$restarts"; return; }
+        delay=$((delay * 2))
+        [ "$delay" -gt 30 ] && delay=30
+    done
+}
+
+runner_alive() {
+    [ -n "$RUNNER_PID" ] && kill -0 "$RUNNER_PID" 2>/dev/null
+}
+
+start_main() {
+    runner_alive && return
+    if [ -z "$MAIN_COMMAND" ]; then
+        echo "[supervisor] MAIN_COMMAND is not set" >> "$SM_LOG_FILE"
+        return
+    fi
+    write_state starting
+    run_main &
+    RUNNER_PID=$!
+}
+
+stop_main() {
+    if ! runner_alive; then
+        RUNNER_PID=""
+        return
+    fi
+    touch "$STOP_FLAG"
+    pgid=$(cat "$PGID_FILE" 2>/dev/null)
+    if [ -n "$pgid" ]; then
+        write_state stopping "$pgid"
+        kill -TERM -"$pgid" 2>/dev/null || kill -TERM "$pgid" 2>/dev/null
+        waited=0
+        while kill -0 -"$pgid" 2>/dev/null || kill -0 "$pgid" 2>/dev/null; do
+            if [ "$waited" -ge $((SM_STOP_GRACE * 5)) ]; then
+                kill -KILL -"$pgid" 2>/dev/null || kill -KILL "$pgid" 2>/dev/null
+                break
+            fi
+            sleep 0.2
+            waited=$((waited + 1))
+        done
+    fi
+    wait "$RUNNER_PID" 2>/dev/null
+    RUNNER_PID=""
+}
+
+shutdown() {
+    stop_main
+    exit 0
+}
+
+mkdir -p "$STATE_DIR"
+[ -p "$CONTROL" ] || { rm -f "$CONTROL"; mkfifo -m 660 "$CONTROL"; }
+[ -n "$SM_NAME" ] && ln -sf "$SM_LOG_FILE" "/tmp/${SM_NAME}_process.log"
+rm -f "$STOP_FLAG" "$PGID_FILE"
+write_state stopped
+
+trap shutdown TERM INT
+
+# Holding the FIFO open read-write keeps a reader attached for host writers
+exec 3<>"$CONTROL"
+
+[ "${SM_AUTOSTART:-0}" = "1" ] && start_main
+
+while :; do
+    if read -r command <&3; then
+        case "$command" in
+            start) start_main ;;
+            stop) stop_main ;;
+            restart) stop_main; start_main ;;
+        esac
+    fi
+done
+"""
+
+# States in which the supervisor owns a live (or about to be live) main process
+ACTIVE_STATES = {"starting", "preparing", "running", "restarting", "stopping"}
+
+# Poll interval while waiting for the supervisor to confirm a state change
+STATE_POLL_INTERVAL = 0.1
+
+
+def supervisor_dir(process_dir: str) -> str:
+    """Host path of the directory shared with the supervisor."""
+    return os.path.join(process_dir, SUPERVISOR_DIRNAME)
+
+
+def install_supervisor(process_dir: str) -> str:
+    """
+    Write the supervisor script into a process directory.
+
+    Args:
+        process_dir: Host directory of the process (contains docker-compose.yml)
+
+    Returns:
+        Path of the installed script
+    """
+    directory = supervisor_dir(process_dir)
+    os.makedirs(directory, exist_ok=True)
+    script_path = os.path.join(directory, "supervisor.sh")
+    with open(script_path, "w", newline="\n") as f:
+        f.write(SUPERVISOR_SCRIPT)
+    os.chmod(script_path, 0o755)
+    return script_path
+
+
+def is_supervised(process_dir: str) -> bool:
+    """Return True when the process container runs the supervisor."""
+    return os.path.exists(os.path.join(supervisor_dir(process_dir), "supervisor.sh"))
+
+
+def _control_path(process_dir: str) -> str:
+    return os.path.join(supervisor_dir(process_dir), "control")
+
+
+def supervisor_alive(process_dir: str) -> bool:
+    """
+    Check whether the supervisor is running without touching the Docker daemon.
+
+    The supervisor keeps its control FIFO open, so opening it for writing only
+    succeeds while the supervisor (and therefore the container) is up.
+    """
+    path = _control_path(process_dir)
+    try:
+        if not stat.S_ISFIFO(os.stat(path).st_mode):
+            return False
+        fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+    except OSError:
+        return False
+    os.close(fd)
+    return True
+
+
+def get_supervisor_state(process_dir: str) -> Optional[dict]:
+    """
+    Read the state published by the supervisor.
+
+    Returns:
+        dict with 'state', 'pid', 'exit_code', 'restarts', 'started_at' and
+        'updated_at', or None when no state has been written yet
+    """
+    path = os.path.join(supervisor_dir(process_dir), "state.json")
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def send_supervisor_command(process_dir: str, command: str, wait_for: Optional[set] = None, timeout: float = 15) -> dict:
+    """
+    Send a control command to the supervisor.
+
+    Args:
+        process_dir: Host directory of the process
+        command: 'start', 'stop' or 'restart'
+        wait_for: Optional set of states to wait for after sending the command
+        timeout: Seconds to wait for one of the states in wait_for
+
+    Returns:
+        dict with 'success', and 'state' or 'error'
+
+    Example:
+        result = send_supervisor_command(process_dir, "stop", wait_for={"stopped", "exited", "crashed"})
+    """
+    if command not in ("start", "stop", "restart"):
+        return {"success": False, "error": f"Unknown supervisor command: {command}"}
+
+    previous = get_supervisor_state(process_dir) or {}
+
+    # Nothing to wait for when the command would not change anything
+    if wait_for and command == "start" and previous.get("state") in ACTIVE_STATES:
+        wait_for = None
+    if wait_for and command == "stop" and previous.get("state") not in ACTIVE_STATES:
+        wait_for = None
+
+    try:
+        fd = os.open(_control_path(process_dir), os.O_WRONLY | os.O_NONBLOCK)
+    except OSError as e:
+        if e.errno in (errno.ENXIO, errno.ENOENT):
+            return {"success": False, "error": "Supervisor is not running (container stopped?)"}
+        return {"success": False, "error": f"Failed to reach supervisor: {e}"}
+
+    try:
+        os.write(fd, f"{command}\n".encode())
+    except OSError as e:
+        return {"success": False, "error": f"Failed to send command to supervisor: {e}"}
+    finally:
+        os.close(fd)
+
+    if not wait_for:
+        return {"success": True, "state": previous}
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        state = get_supervisor_state(process_dir) or {}
+        changed = state.get("state") != previous.get("state") or state.get("pid") != previous.get("pid")
+        if changed and state.get("state") in wait_for:
+            return {"success": True, "state": state}
+        time.sleep(STATE_POLL_INTERVAL)
+
+    return {"success": False, "error": f"Supervisor did not confirm '{command}' within {timeout}s", "state": get_supervisor_state(process_dir)}
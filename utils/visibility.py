@@ -0,0 +1,112 @@
+"""
+Process visibility queries.
+
+Which processes a user can see used to take a User query, the owned process
+query and a sub-user join (plus ``Process.query.all()`` for admins), with
+filtering and sorting left to the browser. :func:`visible_processes` returns
+one filtered, sorted page in a single statement:
+
+    SELECT <columns>, count(*) OVER () AS total
+    FROM processes
+    WHERE name IN (SELECT name FROM processes WHERE owner_id = :user
+                   UNION
+                   SELECT sub_users.process FROM sub_users
+                   JOIN users ON users.email = sub_users.email
+                   WHERE users.id = :user)
+      AND <filters>
+    ORDER BY <sort> LIMIT :per_page OFFSET :offset
+
+Admins skip the visibility condition. The window count returns the total
+number of matches with the page, so no separate COUNT query is needed.
+"""
+
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select, union
+
+from models.process import Process
+from models.subuser import SubUser
+from models.user import User
+
+# Columns returned for process listings (no ORM instances are built)
+LISTING_COLUMNS = (
+    Process.id,
+    Process.name,
+    Process.type,
+    Process.command,
+    Process.file_location,
+    Process.owner_id,
+    Process.created_at,
+)
+
+SORT_COLUMNS = {
+    "name": Process.name,
+    "type": Process.type,
+    "created": Process.created_at,
+}
+
+MAX_PER_PAGE = 100
+
+
+def visible_names(user_id: int):
+    """Subquery of the process names a user owns or was granted."""
+    owned = select(Process.name).where(Process.owner_id == user_id)
+    granted = (
+        select(SubUser.process)
+        .join(User, User.email == SubUser.email)
+        .where(User.id == user_id)
+    )
+    return union(owned, granted)
+
+
+def visible_processes(
+    user_id: int,
+    is_admin: bool = False,
+    search: Optional[str] = None,
+    process_type: Optional[str] = None,
+    sort: str = "name",
+    order: str = "asc",
+    page: Optional[int] = None,
+    per_page: Optional[int] = None,
+) -> Tuple[List, int]:
+    """
+    Processes visible to a user, filtered, sorted and paginated in one query.
+
+    Args:
+        user_id: Logged in user
+        is_admin: Admins see every process
+        search: Case-insensitive name prefix
+        process_type: Only processes of this handler type
+        sort: 'name', 'type' or 'created' (unknown values sort by name)
+        order: 'asc' or 'desc'
+        page: 1-based page number; None returns every match
+        per_page: Page size (capped at MAX_PER_PAGE)
+
+    Returns:
+        (rows, total): rows with the LISTING_COLUMNS attributes and the
+        total number of matches
+    """
+    query = Process.query.with_entities(*LISTING_COLUMNS, func.count().over().label("total"))
+
+    if not is_admin:
+        query = query.filter(Process.name.in_(visible_names(user_id)))
+    if search:
+        escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.filter(Process.name.like(f"{escaped}%", escape="\\"))
+    if process_type:
+        query = query.filter(Process.type == process_type)
+
+    column = SORT_COLUMNS.get(sort, Process.name)
+    query = query.order_by(column.desc() if order == "desc" else column.asc(), Process.name.asc())
+
+    if page is not None:
+        per_page = max(1, min(per_page or 25, MAX_PER_PAGE))
+        query = query.limit(per_page).offset((max(page, 1) - 1) * per_page)
+
+    rows = query.all()
+    if rows:
+        return rows, rows[0].total
+    if page is not None and page > 1:
+        # Past the last page: the window count came back empty
+        return rows, query.limit(None).offset(None).order_by(None).count()
+    return rows, 0
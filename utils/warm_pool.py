@@ -0,0 +1,181 @@
+"""
+Warm pool of pre-built process images.
+
+Creating a process used to build a fresh image from its Dockerfile during
+``docker-compose up -d``, which takes minutes for Node.js and friends. The
+warm pool keeps one pre-built runtime image per configured handler type,
+rendered from the same templates as regular builds
+(:mod:`utils.dockerfiles`) with an empty dependency set. A new process
+claims the image: its compose service references the image instead of a
+build section and bind mounts the process directory as usual, so creation
+is just a container start.
+
+Dependencies that regular builds bake into the image are installed by the
+supervisor before the first start in each container instead (SM_PREPARE),
+which is fast because of the shared dependency caches
+(:mod:`utils.dependency_cache`).
+
+Images are tagged with a hash of their rendered Dockerfile, so a template
+change makes the pool rebuild rather than hand out stale images.
+"""
+
+import hashlib
+import os
+import subprocess
+import tempfile
+import threading
+from typing import Optional
+
+from utils.commands import run as run_command
+from utils.dockerfiles import TEMPLATES, render_dockerfile, render_dockerignore
+from utils.performance import PRIORITY_BACKGROUND
+from utils.rebuild import buildkit_env
+
+# Handler types served from the warm pool (comma separated, empty disables the pool)
+WARM_POOL_TYPES = [t.strip() for t in os.getenv("WARM_POOL_TYPES", "python,nodejs").split(",") if t.strip()]
+
+WARM_POOL_IMAGE_PREFIX = os.getenv("WARM_POOL_IMAGE_PREFIX", "server-manager/warm")
+
+# Seconds a warm image build may take before it is abandoned
+WARM_POOL_BUILD_TIMEOUT = int(os.getenv("WARM_POOL_BUILD_TIMEOUT", "900"))
+
+# Commands the supervisor runs once per container before the first start
+PREPARE_COMMANDS = {
+    "python": "[ -f requirements.txt ] && pip install -r requirements.txt || true",
+    "nodejs": "[ -f package.json ] && { [ -f package-lock.json ] && npm ci || npm install; } || true",
+    "go": "[ -f go.mod ] && go mod download || true",
+}
+
+# Placeholder manifests so the templates' dependency stages have something to copy
+PLACEHOLDER_FILES = {
+    "python": {"requirements.txt": ""},
+    "nodejs": {"package.json": '{"name": "warm-pool", "version": "1.0.0", "dependencies": {}}\n'},
+    "go": {"go.mod": "module warmpool\n\ngo 1.22\n"},
+}
+
+_build_lock = threading.Lock()
+
+
+def warm_image_tag(process_type: str) -> str:
+    """Image tag for a handler type, derived from its rendered Dockerfile."""
+    digest = hashlib.sha256(render_dockerfile(process_type).encode()).hexdigest()[:12]
+    return f"{WARM_POOL_IMAGE_PREFIX}-{process_type}:{digest}"
+
+
+def is_pool_type(process_type: str) -> bool:
+    return process_type in WARM_POOL_TYPES and process_type in PREPARE_COMMANDS and process_type in TEMPLATES
+
+
+def image_exists(tag: str, priority: Optional[int] = PRIORITY_BACKGROUND) -> bool:
+    try:
+        result = run_command(["docker", "image", "inspect", tag], timeout=10, priority=priority)
+    except Exception:
+        return False
+    return result.returncode == 0
+
+
+def build_warm_image(process_type: str) -> dict:
+    """
+    Build the warm image for a handler type.
+
+    Returns:
+        dict with 'success' and 'image' or 'error'
+    """
+    if not is_pool_type(process_type):
+        return {"success": False, "error": f"'{process_type}' is not a warm pool type"}
+
+    tag = warm_image_tag(process_type)
+    with tempfile.TemporaryDirectory(prefix=f"warm-{process_type}-") as context:
+        with open(os.path.join(context, "Dockerfile"), "w") as f:
+            f.write(render_dockerfile(process_type))
+        with open(os.path.join(context, ".dockerignore"), "w") as f:
+            f.write(render_dockerignore(process_type))
+        for filename, content in PLACEHOLDER_FILES.get(process_type, {}).items():
+            with open(os.path.join(context, filename), "w") as f:
+                f.write(content)
+
+        try:
+            result = run_command(
+                ["docker", "build", "-t", tag, context],
+                env=buildkit_env(),
+                timeout=WARM_POOL_BUILD_TIMEOUT,
+                priority=PRIORITY_BACKGROUND,
+            )
+        except subprocess.TimeoutExpired:
+            return {"success": False, "error": f"Build of {tag} timed out"}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    if result.returncode != 0:
+        return {"success": False, "error": result.stderr.strip()[-2000:]}
+    return {"success": True, "image": tag}
+
+
+def ensure_warm_pool() -> dict:
+    """
+    Build every missing warm image.
+
+    Returns:
+        dict mapping handler type to its image tag or error
+    """
+    results = {}
+    with _build_lock:
+        for process_type in WARM_POOL_TYPES:
+            if not is_pool_type(process_type):
+                results[process_type] = {"success": False, "error": "No warm pool template"}
+                continue
+            tag = warm_image_tag(process_type)
+            if image_exists(tag):
+                results[process_type] = {"success": True, "image": tag}
+                continue
+            print(f"[warm-pool] Building {tag}")
+            results[process_type] = build_warm_image(process_type)
+            if not results[process_type]["success"]:
+                print(f"[warm-pool] Failed to build {tag}: {results[process_type]['error']}")
+    return results
+
+
+def start_warm_pool_builder():
+    """Fill the pool in the background."""
+    if not WARM_POOL_TYPES:
+        return None
+    thread = threading.Thread(target=ensure_warm_pool, daemon=True)
+    thread.start()
+    return thread
+
+
+def claim_warm_image(process_type: str) -> Optional[str]:
+    """
+    Claim the warm image for a new process.
+
+    Returns:
+        Image tag, or None when the type is not pooled or the image is not
+        built yet (the caller falls back to a regular build)
+    """
+    if not is_pool_type(process_type):
+        return None
+    tag = warm_image_tag(process_type)
+    # Part of creating a process, so scheduled like the request that creates it
+    return tag if image_exists(tag, priority=None) else None
+
+
+def compose_image_source(process_type: str) -> tuple:
+    """
+    Compose lines selecting the image source for a new process.
+
+    Returns:
+        (source, environment): the ``image:``/``build:`` lines for the
+        service and extra environment entries ('' when not needed)
+    """
+    image = claim_warm_image(process_type)
+    if image is None:
+        return (
+            "        build:\n"
+            "            context: .\n"
+            "            dockerfile: Dockerfile",
+            "",
+        )
+    return (
+        f"        image: {image}",
+        f"            - SM_PREPARE={PREPARE_COMMANDS[process_type]}",
+    )